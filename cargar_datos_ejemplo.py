@@ -2,6 +2,8 @@
 # ===================================================================
 # Script para cargar datos de prueba en la aplicación 'tienda'
 # Ejecutar con: python cargar_datos_ejemplo.py
+# Para volúmenes de pruebas de carga y benchmarks usar en su lugar:
+#   python manage.py generar_datos --semilla 1 --escala 10
 # ===================================================================
 
 import os
@@ -106,6 +108,9 @@ except User.DoesNotExist:
 # 5️⃣ Crear Productos
 # ==========================
 print("\n🛒 Creando Productos...")
+# Mapas en memoria: una consulta por tabla en lugar de un .get() por producto
+categorias_por_nombre = {c.nombre: c for c in Categoria.objects.all()}
+proveedores_por_nombre = {p.nombre: p for p in Proveedor.objects.all()}
 productos_data = [
     # Electrónica
     {
@@ -113,16 +118,16 @@ productos_data = [
         "descripcion": "Laptop de alto rendimiento para ingenieros.",
         "precio_venta": Decimal("15000.00"),
         "stock": 15,
-        "categoria": Categoria.objects.get(nombre="Electrónica"),
-        "proveedor": Proveedor.objects.get(nombre="Juan Pérez"),
+        "categoria": categorias_por_nombre["Electrónica"],
+        "proveedor": proveedores_por_nombre["Juan Pérez"],
     },
     {
         "nombre": "Mouse Óptico Inalámbrico",
         "descripcion": "Mouse ergonómico y preciso.",
         "precio_venta": Decimal("350.50"),
         "stock": 50,
-        "categoria": Categoria.objects.get(nombre="Electrónica"),
-        "proveedor": Proveedor.objects.get(nombre="Juan Pérez"),
+        "categoria": categorias_por_nombre["Electrónica"],
+        "proveedor": proveedores_por_nombre["Juan Pérez"],
     },
     # Ropa
     {
@@ -130,16 +135,16 @@ productos_data = [
         "descripcion": "Camisa 100% algodón con logo de la universidad.",
         "precio_venta": Decimal("499.99"),
         "stock": 30,
-        "categoria": Categoria.objects.get(nombre="Ropa"),
-        "proveedor": Proveedor.objects.get(nombre="Laura Gómez"),
+        "categoria": categorias_por_nombre["Ropa"],
+        "proveedor": proveedores_por_nombre["Laura Gómez"],
     },
     {
         "nombre": "Pantalón Jeans Casual",
         "descripcion": "Jeans de mezclilla corte recto.",
         "precio_venta": Decimal("850.00"),
         "stock": 20,
-        "categoria": Categoria.objects.get(nombre="Ropa"),
-        "proveedor": Proveedor.objects.get(nombre="Laura Gómez"),
+        "categoria": categorias_por_nombre["Ropa"],
+        "proveedor": proveedores_por_nombre["Laura Gómez"],
     },
     # Hogar
     {
@@ -147,13 +152,16 @@ productos_data = [
         "descripcion": "Set de 5 cuchillos de acero inoxidable.",
         "precio_venta": Decimal("1200.75"),
         "stock": 10,
-        "categoria": Categoria.objects.get(nombre="Hogar"),
-        "proveedor": Proveedor.objects.get(nombre="Juan Pérez"),
+        "categoria": categorias_por_nombre["Hogar"],
+        "proveedor": proveedores_por_nombre["Juan Pérez"],
     },
 ]
 
 for data in productos_data:
-    prod, creado = Producto.objects.get_or_create(nombre=data["nombre"], defaults=data)
+    # Producto no tiene campo `proveedor`: la relación es el M2M `proveedores`
+    proveedor = data.pop("proveedor")
+    prod, creado = Producto.objects.get_or_create(nombre=data["nombre"], defaults={**data, "creado_por": creador})
+    prod.proveedores.add(proveedor)
     if creado:
         print(f"✅ Producto creado: {data['nombre']}")
     else:
@@ -1,3 +1,5 @@
+# Crea solo las cuentas de prueba. Para dar de alta un padrón completo (miles de
+# empleados o clientes) usar: python manage.py aprovisionar_usuarios padron.csv
 import os
 import django
 
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -44,20 +45,25 @@ INSTALLED_APPS = [
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 MIDDLEWARE = [
+    'tienda.middleware.MedicionMiddleware',  # 👈 Consultas y tiempos por petición (va primero)
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'tienda.middleware.RolMiddleware',   # 👈 Resuelve request.rol una vez por sesión
+    'tienda.middleware.ReplicaMiddleware',  # 👈 Reportes y listados leen de la réplica (si hay)
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'tienda.middleware.PerfiladorMiddleware',  # 👈 ?perfilar=1 para staff si TIENDA_PERFILADOR (va al final)
 ]
 
 ROOT_URLCONF = 'sistema_tienda.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates que cronometra cada render para MedicionMiddleware
+        'BACKEND': 'tienda.plantillas.DjangoTemplatesMedidas',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -91,6 +97,55 @@ DATABASES = {
     }
 }
 
+# Réplica de lectura opcional (DB_REPLICA_HOST): reportes y listados leen de ella,
+# ver tienda/routers.py. En los tests apunta a la misma base que 'default'.
+if os.environ.get('DB_REPLICA_HOST'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ['DB_REPLICA_HOST'],
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default']['PORT']),
+        'USER': os.environ.get('DB_REPLICA_USER', DATABASES['default']['USER']),
+        'PASSWORD': os.environ.get('DB_REPLICA_PASSWORD', DATABASES['default']['PASSWORD']),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['tienda.routers.RouterReplica']
+# Tras escribir, la sesión lee de la primaria durante estos segundos (> retraso de replicación)
+TIENDA_REPLICA_RETRASO_SEGUNDOS = 10
+# Si la réplica no responde, cuánto esperar antes de volver a intentarlo
+TIENDA_REPLICA_REINTENTO_SEGUNDOS = 30
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Debe ser compartido por todos los workers: en él viven los sellos de rol, la versión del
+# catálogo y los contadores del dashboard, y su invalidación tiene que llegar a todos los
+# procesos. Con REDIS_URL se usa Redis; si no, una tabla de la base
+# (crearla con `python manage.py createcachetable`). Un caché local al proceso
+# (LocMemCache, DummyCache) no pasa la revisión de arranque tienda.E001.
+
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+            'KEY_PREFIX': 'tienda',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'tienda_cache',
+        }
+    }
+
+# Segundos que vale el sello de versión del rol: aunque se pierda una invalidación,
+# un cambio de rol se aplica a más tardar en este tiempo
+TIENDA_ROL_VERSION_SEGUNDOS = 300
+# Segundos en que las lecturas (GET) confían en el rol guardado en la sesión sin consultar
+# el sello en el caché; las escrituras (POST) lo comparan siempre
+TIENDA_ROL_REVISION_SEGUNDOS = 15
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -135,4 +190,24 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = 'login'              # URL para redirigir si no está logueado
 LOGIN_REDIRECT_URL = 'home'      # URL después de login exitoso
-LOGOUT_REDIRECT_URL = 'login'    # URL después de logout
\ No newline at end of file
+LOGOUT_REDIRECT_URL = 'login'    # URL después de logout
+
+# Registro: 'tienda.rendimiento' escribe una línea JSON por petición (INFO) y avisa
+# cuando una vista excede su presupuesto de consultas (WARNING).
+# TIENDA_LOG_NIVEL=INFO activa las líneas por petición.
+# Perfiles bajo demanda (ver tienda/perfilador.py); se consultan en /admin/perfiles/
+TIENDA_PERFILADOR = os.environ.get('TIENDA_PERFILADOR') == '1'
+# Fuera del repositorio en producción (TIENDA_PERFILES_DIR); por defecto perfiles/, ignorado en git
+TIENDA_PERFILES_DIR = Path(os.environ.get('TIENDA_PERFILES_DIR', BASE_DIR / 'perfiles'))
+TIENDA_PERFILES_MAX = 50
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'consola': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'tienda': {'handlers': ['consola'], 'level': os.environ.get('TIENDA_LOG_NIVEL', 'WARNING')},
+    },
+}
\ No newline at end of file
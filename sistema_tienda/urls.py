@@ -1,8 +1,12 @@
 # sistema_tienda/urls.py
 from django.contrib import admin # Importa el módulo de administración de Django.
 from django.urls import path, include # Importa path y include.
+from tienda.admin import perfil_detalle, perfiles_lista
 
 urlpatterns = [
+    # Perfiles capturados (tienda.perfilador); van antes de admin.site.urls para no chocar con sus rutas
+    path('admin/perfiles/', admin.site.admin_view(perfiles_lista), name='perfiles_lista'),
+    path('admin/perfiles/<str:nombre>/', admin.site.admin_view(perfil_detalle), name='perfil_detalle'),
     path('admin/', admin.site.urls), # Mapea la URL '/admin/' al panel de administración de Django.
     path('', include('tienda.urls')), # <-- Incluye todas las URLs definidas en 'tienda/urls.py' bajo la ruta raíz ('/').
 ]
\ No newline at end of file
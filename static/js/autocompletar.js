@@ -0,0 +1,63 @@
+/* static/js/autocompletar.js */
+/* Selectores con autocompletado (productos y clientes) para el formulario de venta.
+   Cada resultado trae id, nombre y, opcionalmente, un texto de detalle. */
+(function () {
+    function iniciar(contenedor) {
+        var oculto = contenedor.querySelector('input[type=hidden]');
+        var buscador = contenedor.querySelector('[data-buscador]');
+        var lista = contenedor.querySelector('[data-resultados]');
+        var espera = null;
+        var ultimaConsulta = '';
+
+        function limpiar() {
+            lista.innerHTML = '';
+        }
+
+        function mostrar(resultados) {
+            limpiar();
+            resultados.forEach(function (resultado) {
+                var opcion = document.createElement('button');
+                opcion.type = 'button';
+                opcion.className = 'list-group-item list-group-item-action d-flex justify-content-between';
+                opcion.textContent = resultado.nombre;
+                var detalle = document.createElement('small');
+                detalle.className = 'text-muted';
+                detalle.textContent = resultado.detalle || '';
+                opcion.appendChild(detalle);
+                opcion.addEventListener('click', function () {
+                    oculto.value = resultado.id;
+                    buscador.value = resultado.nombre;
+                    limpiar();
+                });
+                lista.appendChild(opcion);
+            });
+        }
+
+        buscador.addEventListener('input', function () {
+            oculto.value = '';  // El texto cambió: hay que volver a elegir
+            clearTimeout(espera);
+            var texto = buscador.value.trim();
+            if (texto.length < 2) {
+                limpiar();
+                return;
+            }
+            // Espera a que el cajero deje de escribir para no lanzar una petición por tecla
+            espera = setTimeout(function () {
+                ultimaConsulta = texto;
+                fetch(contenedor.dataset.url + '?q=' + encodeURIComponent(texto))
+                    .then(function (respuesta) { return respuesta.json(); })
+                    .then(function (datos) {
+                        if (texto === ultimaConsulta) {
+                            mostrar(datos.resultados);
+                        }
+                    });
+            }, 200);
+        });
+
+        buscador.addEventListener('blur', function () {
+            setTimeout(limpiar, 200);
+        });
+    }
+
+    document.querySelectorAll('.autocompletar').forEach(iniciar);
+})();
@@ -1,6 +1,12 @@
 from django.contrib import admin
 # Importamos TODOS nuestros modelos, incluyendo Venta y DetalleVenta
 from .models import Categoria, Producto, Proveedor, Cliente, PerfilUsuario, Venta, DetalleVenta 
+from .models import MovimientoInventario, totales_diferidos
+from .reportes import reconstruir_ventas_diarias
+from .perfilador import listar_perfiles, perfilador_activo, resumen_perfil, ruta_de_perfil
+from django.http import FileResponse, Http404
+from django.template.response import TemplateResponse
+from django.utils import timezone
 # ↑↑↑ IMPORTACIÓN CORREGIDA/AMPLIADA ↑↑↑
 
 
@@ -64,12 +70,81 @@ class DetalleVentaInline(admin.TabularInline):
 
 @admin.register(Venta)
 class VentaAdmin(admin.ModelAdmin):
-    list_display = ('id', 'fecha_venta', 'total', 'cliente', 'vendido_por')
+    list_display = ('id', 'fecha_venta', 'total', 'cliente', 'vendido_por', 'folio')
     list_filter = ('fecha_venta',)
-    search_fields = ('cliente__nombre', 'cliente__apellido')
+    search_fields = ('cliente__nombre', 'cliente__apellido', 'folio')
     readonly_fields = ('total',) # El total se calcula automáticamente
     inlines = [DetalleVentaInline] # Muestra los detalles de venta
 
+    def save_related(self, request, form, formsets, change):
+        """Guarda los detalles del inline recalculando el total de la venta una sola vez."""
+        with totales_diferidos() as pendientes:
+            super().save_related(request, form, formsets, change)
+            # También cubre el caso en que solo se eliminaron líneas
+            pendientes.add(form.instance.pk)
+        # Las ediciones desde el admin no pasan por el cobro: se regenera el acumulado de ese día
+        dia = timezone.localdate(form.instance.fecha_venta)
+        reconstruir_ventas_diarias(dia, dia)
+
+    def delete_model(self, request, obj):
+        dia = timezone.localdate(obj.fecha_venta)
+        super().delete_model(request, obj)
+        reconstruir_ventas_diarias(dia, dia)
+
+    def delete_queryset(self, request, queryset):
+        dias = {timezone.localdate(fecha) for fecha in queryset.values_list('fecha_venta', flat=True)}
+        super().delete_queryset(request, queryset)
+        if dias:
+            reconstruir_ventas_diarias(min(dias), max(dias))
+
+
+# ============ CONFIGURACIÓN DEL ADMIN PARA EL KARDEX ============
+@admin.register(MovimientoInventario)
+class MovimientoInventarioAdmin(admin.ModelAdmin):
+    """Kardex de solo lectura: los movimientos no se editan ni se borran."""
+    list_display = ('id', 'fecha', 'producto', 'tipo', 'cantidad', 'venta', 'usuario')
+    list_filter = ('tipo', 'fecha')
+    search_fields = ('producto__nombre', 'nota')
+    list_select_related = ('producto', 'usuario')
+    raw_id_fields = ('producto', 'venta', 'usuario')
+    date_hierarchy = 'fecha'
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+# ============ PERFILES CAPTURADOS (tienda.perfilador) ============
+# Vistas sueltas del admin, sin modelo; se enlazan en sistema_tienda/urls.py con admin.site.admin_view
+def perfiles_lista(request):
+    """Lista los perfiles guardados en TIENDA_PERFILES_DIR, del más reciente al más viejo."""
+    contexto = {
+        **admin.site.each_context(request),
+        'title': 'Perfiles capturados',
+        'perfiles': listar_perfiles(),
+        'perfilador_activo': perfilador_activo(),
+    }
+    return TemplateResponse(request, 'admin/tienda/perfiles.html', contexto)
+
+
+def perfil_detalle(request, nombre):
+    """Resumen pstats de un perfil .prof; con ?descargar=1 (o si es .html) se descarga el archivo."""
+    ruta = ruta_de_perfil(nombre)
+    if ruta is None:
+        raise Http404('No existe el perfil.')
+    if request.GET.get('descargar') or ruta.suffix != '.prof':
+        return FileResponse(ruta.open('rb'), as_attachment=True, filename=nombre)
+    contexto = {
+        **admin.site.each_context(request),
+        'title': f'Perfil {nombre}',
+        'nombre': nombre,
+        'resumen': resumen_perfil(nombre, orden='tottime' if request.GET.get('orden') == 'tottime' else 'cumulative'),
+    }
+    return TemplateResponse(request, 'admin/tienda/perfil_detalle.html', contexto)
+
+
 # Si Venta y DetalleVenta no se registran en los decoradores, puedes usar esta alternativa:
 # admin.site.register(DetalleVenta) 
 # admin.site.register(Venta, VentaAdmin)
\ No newline at end of file
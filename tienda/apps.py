@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TiendaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'tienda'
+
+    def ready(self):
+        # Registra los receptores de señales (kardex de inventario)
+        from . import signals  # noqa: F401
+        # Revisiones de arranque (caché compartido entre workers)
+        from . import checks  # noqa: F401
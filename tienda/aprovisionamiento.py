@@ -0,0 +1,220 @@
+# tienda/aprovisionamiento.py
+# ===================================================================
+# Alta masiva de cuentas (empleados de una región, logins de clientes)
+# a partir de un padrón CSV o JSONL.
+# Lo caro de crear un usuario es el hash de su contraseña (PBKDF2 con
+# cientos de miles de iteraciones), así que se calcula en un pool de
+# procesos. Las escrituras van por bloques con inserciones masivas:
+# User, PerfilUsuario (empleados), grupos y Cliente (clientes).
+#
+# Es idempotente: los usuarios que ya existen no se vuelven a crear ni
+# se les cambia la contraseña; solo se completa lo que les falte
+# (perfil, grupo o cliente). Repetir el mismo padrón no cambia nada.
+# ===================================================================
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group, User
+from django.db import transaction
+
+from .busqueda import indexar_clientes
+from .contadores import invalidar_contadores
+from .middleware import ROL_CLIENTE, invalidar_rol
+from .models import Cliente, PerfilUsuario
+from .texto import clave_de_busqueda
+
+TAMANO_BLOQUE_USUARIOS = 1000
+ROLES_EMPLEADO = tuple(rol for rol, _ in PerfilUsuario.ROLES)
+
+
+class RegistroInvalido(ValueError):
+    """Una fila del padrón no se puede aprovisionar; se omite y se informa."""
+
+
+def _texto(fila, campo, largo):
+    """Valor de un campo opcional del padrón como texto limpio, recortado a `largo`."""
+    return str(fila.get(campo) or '').strip()[:largo]
+
+
+def normalizar_registro(fila):
+    """Valida una fila del padrón (username, rol, password y datos opcionales) y la devuelve limpia."""
+    if not isinstance(fila, dict):
+        raise RegistroInvalido('la línea no es un objeto JSON válido')
+    username = str(fila.get('username') or '').strip()
+    if not username or len(username) > 150:
+        raise RegistroInvalido('falta el username (máximo 150 caracteres)')
+    rol = str(fila.get('rol') or '').strip().lower()
+    if rol not in (*ROLES_EMPLEADO, ROL_CLIENTE):
+        raise RegistroInvalido(f'{username}: rol desconocido "{rol}"')
+
+    registro = {
+        'username': username,
+        'rol': rol,
+        # Sin contraseña la cuenta queda sin clave utilizable (se restablece por correo)
+        'password': str(fila.get('password') or '') or None,
+        'email': _texto(fila, 'email', 191),
+        'first_name': _texto(fila, 'first_name', 150),
+        'last_name': _texto(fila, 'last_name', 150),
+        'telefono': _texto(fila, 'telefono', 15),
+        'departamento': _texto(fila, 'departamento', 100),
+    }
+    if rol == ROL_CLIENTE and not registro['email']:
+        raise RegistroInvalido(f'{username}: los clientes necesitan email')
+    return registro
+
+
+def _iniciar_proceso():
+    """Inicializador de los procesos del pool: con el arranque 'spawn' Django no viene configurado."""
+    if not apps.ready:
+        django.setup()
+
+
+class Aprovisionador:
+    """
+    Crea cuentas por bloques. El pool de procesos se reutiliza entre bloques; úsese
+    como context manager para cerrarlo. Con procesos=1 se hashea en el proceso actual.
+    """
+
+    def __init__(self, procesos=None):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.pool = None
+        if self.procesos > 1:
+            self.pool = ProcessPoolExecutor(self.procesos, initializer=_iniciar_proceso)
+        self.grupos = {}
+        self.creados = 0
+        self.existentes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self.pool:
+            self.pool.shutdown()
+
+    def hashear(self, claves):
+        """make_password de cada clave, repartido en el pool. None produce una clave inutilizable."""
+        if self.pool is None:
+            return [make_password(clave) for clave in claves]
+        porcion = max(1, len(claves) // (self.procesos * 4))
+        return list(self.pool.map(make_password, claves, chunksize=porcion))
+
+    def _grupos(self, roles):
+        faltantes = set(roles) - set(self.grupos)
+        if faltantes:
+            Group.objects.bulk_create([Group(name=rol) for rol in faltantes], ignore_conflicts=True)
+            self.grupos.update(Group.objects.filter(name__in=faltantes).values_list('name', 'id'))
+        return self.grupos
+
+    def _separar_emails_ocupados(self, registros):
+        """
+        Aparta los clientes cuyo email ya es de otro cliente (en la base o antes en el bloque):
+        Cliente.email es único y, sin su Cliente, la cuenta quedaría sin rol.
+        Devuelve (aceptados, [RegistroInvalido]).
+        """
+        emails = [registro['email'] for registro in registros if registro['rol'] == ROL_CLIENTE]
+        if not emails:
+            return registros, []
+        duenos = {
+            email.lower(): username
+            for email, username in Cliente.objects.filter(email__in=emails).values_list('email', 'usuario__username')
+        }
+        aceptados, rechazados = [], []
+        for registro in registros:
+            if registro['rol'] != ROL_CLIENTE:
+                aceptados.append(registro)
+                continue
+            email = registro['email'].lower()
+            dueno = duenos.get(email)
+            if dueno is None:
+                duenos[email] = registro['username']
+                aceptados.append(registro)
+            elif dueno == registro['username']:
+                aceptados.append(registro)
+            else:
+                rechazados.append(RegistroInvalido(
+                    f'{registro["username"]}: el email {registro["email"]} ya es de otro cliente ({dueno or "sin usuario"})'
+                ))
+        return aceptados, rechazados
+
+    def aprovisionar_bloque(self, registros):
+        """
+        Da de alta un bloque de registros normalizados. Si un username se repite gana el último.
+        Devuelve los RegistroInvalido de las filas omitidas (email de cliente ya ocupado); de
+        esas filas no se crea nada.
+        """
+        registros = list({registro['username']: registro for registro in registros}.values())
+        registros, rechazados = self._separar_emails_ocupados(registros)
+        if not registros:
+            return rechazados
+        usernames = [registro['username'] for registro in registros]
+        existentes = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        nuevos = [registro for registro in registros if registro['username'] not in existentes]
+        # Solo se hashean las contraseñas de las cuentas nuevas: una reejecución no cuesta hashes
+        hashes = self.hashear([registro['password'] for registro in nuevos])
+        grupos = self._grupos(registro['rol'] for registro in registros if registro['rol'] in ROLES_EMPLEADO)
+
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(username=registro['username'], password=clave, email=registro['email'],
+                     first_name=registro['first_name'], last_name=registro['last_name'])
+                for registro, clave in zip(nuevos, hashes)
+            ], ignore_conflicts=True)
+            ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+            empleados = [registro for registro in registros if registro['rol'] in ROLES_EMPLEADO]
+            con_perfil = set(PerfilUsuario.objects.filter(
+                user_id__in=[ids[registro['username']] for registro in empleados]
+            ).values_list('user_id', flat=True))
+            perfiles = [
+                PerfilUsuario(user_id=ids[registro['username']], rol=registro['rol'],
+                              telefono=registro['telefono'] or None, departamento=registro['departamento'] or None)
+                for registro in empleados if ids[registro['username']] not in con_perfil
+            ]
+            PerfilUsuario.objects.bulk_create(perfiles, ignore_conflicts=True)
+            enlace = User.groups.through
+            enlace.objects.bulk_create([
+                enlace(user_id=ids[registro['username']], group_id=grupos[registro['rol']]) for registro in empleados
+            ], ignore_conflicts=True)
+
+            clientes = [registro for registro in registros if registro['rol'] == ROL_CLIENTE]
+            if clientes:
+                con_cliente = set(Cliente.objects.filter(
+                    usuario_id__in=[ids[registro['username']] for registro in clientes]
+                ).values_list('usuario_id', flat=True))
+                nuevos_clientes = []
+                for registro in clientes:
+                    if ids[registro['username']] in con_cliente:
+                        continue
+                    nombre = (registro['first_name'] or registro['username'])[:100]
+                    apellido = registro['last_name'][:100]
+                    nuevos_clientes.append(Cliente(
+                        usuario_id=ids[registro['username']], nombre=nombre, apellido=apellido,
+                        email=registro['email'], telefono=registro['telefono'], direccion='',
+                        # bulk_create no llama a save(): la clave de búsqueda se calcula aquí
+                        clave_busqueda=clave_de_busqueda(nombre, apellido, registro['email'], registro['telefono']),
+                    ))
+                # Los emails ocupados ya se apartaron; ignore_conflicts cubre un alta concurrente
+                Cliente.objects.bulk_create(nuevos_clientes, ignore_conflicts=True)
+                indexar_clientes(Cliente.objects.filter(
+                    usuario_id__in=[cliente.usuario_id for cliente in nuevos_clientes]
+                ).only('id', 'clave_busqueda'))
+            else:
+                nuevos_clientes = []
+
+            # Una cuenta existente que recibió perfil o cliente debe resolver de nuevo su rol en sesión
+            previos = {ids[username] for username in existentes}
+            for user_id in {perfil.user_id for perfil in perfiles} | {cliente.usuario_id for cliente in nuevos_clientes}:
+                if user_id in previos:
+                    invalidar_rol(user_id)
+
+        self.creados += len(nuevos)
+        self.existentes += len(existentes)
+        return rechazados
+
+    def terminar(self):
+        """Las inserciones masivas no disparan señales: se invalidan los contadores del dashboard."""
+        invalidar_contadores()
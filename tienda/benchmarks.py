@@ -0,0 +1,251 @@
+# tienda/benchmarks.py
+# ===================================================================
+# Benchmarks de las vistas de la tienda. Cada escenario es una
+# petición a una URL de tienda/urls.py (con el rol que la usa en la
+# operación real) que se repite contra un conjunto sintético generado
+# con datos_sinteticos (1k, 100k o 1M ventas). De cada escenario se
+# guardan los percentiles de latencia y el número de consultas; el
+# resultado se escribe en JSON y sirve de línea base para comparar la
+# siguiente versión (comparar() marca las regresiones).
+# ===================================================================
+
+import json
+import time
+import uuid
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .datos_sinteticos import GeneradorDatos, volumenes
+from .inventario import reabastecer
+from .models import Categoria, Cliente, PerfilUsuario, Producto, Proveedor, Venta
+from .urls import urlpatterns
+
+# Ventas de cada escala; el resto de los volúmenes se escala en proporción
+ESCALAS = {'1k': 1_000, '100k': 100_000, '1m': 1_000_000}
+# Fecha final fija: el mismo conjunto de datos sin importar el día en que se corra
+HASTA_BENCHMARK = date(2025, 12, 31)
+SEMILLA_BENCHMARK = 2025
+CLAVE_BENCHMARK = 'bench-clave-123'
+# Una regresión es un aumento relativo mayor que la tolerancia y mayor que este margen absoluto
+TOLERANCIA = 0.25
+MARGEN_MS = 2.0
+
+
+class Escenario:
+    """
+    Una petición a medir. `ruta` y `datos` son funciones del contexto (ids del conjunto de datos)
+    y del número de repetición, para que cada POST sea distinto (claves, folios).
+    """
+
+    def __init__(self, nombre, url, ruta=None, datos=None, metodo='get', rol='administrador', estado=200,
+                 content_type=None, reautenticar=False):
+        self.nombre = nombre
+        self.url = url
+        self.ruta = ruta or (lambda contexto: reverse(url))
+        self.datos = datos or (lambda contexto, i: None)
+        self.metodo = metodo
+        self.rol = rol
+        self.estado = estado
+        self.content_type = content_type
+        self.reautenticar = reautenticar
+
+
+def _por_pk(url, clave):
+    return lambda contexto: reverse(url, args=[contexto[clave]])
+
+
+def _venta(contexto, i):
+    return {
+        'cliente': contexto['cliente'], 'clave_idempotencia': uuid.uuid4().hex,
+        'detalles-TOTAL_FORMS': 2, 'detalles-INITIAL_FORMS': 0,
+        'detalles-0-producto': contexto['productos_venta'][0], 'detalles-0-cantidad': 1,
+        'detalles-1-producto': contexto['productos_venta'][1], 'detalles-1-cantidad': 2,
+    }
+
+
+def _lote(contexto, i):
+    lote = uuid.uuid4().hex[:12]
+    return json.dumps([
+        {'ticket': f'BENCH-{lote}-{n}', 'cliente': contexto['cliente'],
+         'lineas': [{'producto': contexto['productos_venta'][n % 2], 'cantidad': 1}]}
+        for n in range(20)
+    ])
+
+
+def _periodo(dias):
+    def ruta(contexto):
+        return f"{reverse('reporte_ventas')}?fecha_inicio={contexto['hasta'] - timedelta(days=dias - 1)}&fecha_fin={contexto['hasta']}"
+    return ruta
+
+
+ESCENARIOS = [
+    Escenario('login', 'login', metodo='post', rol=None, estado=302,
+              datos=lambda contexto, i: {'username': 'bench_administrador', 'password': CLAVE_BENCHMARK}),
+    Escenario('logout', 'logout', metodo='post', estado=302, reautenticar=True),
+    Escenario('home', 'home'),
+    Escenario('home_redirect', 'home_redirect'),
+    Escenario('dashboard', 'dashboard'),
+    Escenario('producto_lista', 'producto_lista'),
+    Escenario('producto_lista_filtrada', 'producto_lista',
+              ruta=lambda contexto: f"{reverse('producto_lista')}?categoria={contexto['categoria']}&orden=-precio&page=2"),
+    Escenario('producto_buscar', 'producto_buscar', ruta=lambda contexto: f"{reverse('producto_buscar')}?q=taza premium"),
+    Escenario('producto_autocompletar', 'producto_autocompletar', rol='vendedor',
+              ruta=lambda contexto: f"{reverse('producto_autocompletar')}?q=lam"),
+    Escenario('sincronizar_catalogo', 'sincronizar_catalogo', rol='vendedor'),
+    Escenario('producto_crear', 'producto_crear'),
+    Escenario('producto_editar', 'producto_editar', ruta=_por_pk('producto_editar', 'producto')),
+    Escenario('producto_eliminar', 'producto_eliminar', ruta=_por_pk('producto_eliminar', 'producto')),
+    Escenario('categoria_lista', 'categoria_lista'),
+    Escenario('categoria_crear', 'categoria_crear'),
+    Escenario('categoria_editar', 'categoria_editar', ruta=_por_pk('categoria_editar', 'categoria')),
+    Escenario('categoria_eliminar', 'categoria_eliminar', ruta=_por_pk('categoria_eliminar', 'categoria')),
+    Escenario('proveedor_lista', 'proveedor_lista'),
+    Escenario('proveedor_crear', 'proveedor_crear'),
+    Escenario('proveedor_editar', 'proveedor_editar', ruta=_por_pk('proveedor_editar', 'proveedor')),
+    Escenario('proveedor_eliminar', 'proveedor_eliminar', ruta=_por_pk('proveedor_eliminar', 'proveedor')),
+    Escenario('cliente_lista', 'cliente_lista'),
+    Escenario('cliente_buscar', 'cliente_buscar', rol='vendedor',
+              ruta=lambda contexto: f"{reverse('cliente_buscar')}?q=maria garcia"),
+    Escenario('cliente_crear', 'cliente_crear'),
+    Escenario('cliente_editar', 'cliente_editar', ruta=_por_pk('cliente_editar', 'cliente')),
+    Escenario('cliente_eliminar', 'cliente_eliminar', ruta=_por_pk('cliente_eliminar', 'cliente')),
+    Escenario('cliente_dashboard', 'cliente_dashboard', rol='cliente'),
+    Escenario('cliente_detalle_venta', 'cliente_detalle_venta', rol='cliente',
+              ruta=_por_pk('cliente_detalle_venta', 'venta_cliente')),
+    Escenario('registrar_venta_formulario', 'registrar_venta', rol='vendedor'),
+    Escenario('registrar_venta', 'registrar_venta', metodo='post', rol='vendedor', estado=302, datos=_venta),
+    Escenario('registrar_ventas_lote', 'registrar_ventas_lote', metodo='post', rol='vendedor', datos=_lote,
+              content_type='application/json'),
+    Escenario('reporte_ventas_dia', 'reporte_ventas', rol='vendedor', ruta=_periodo(1)),
+    Escenario('reporte_ventas_mes', 'reporte_ventas', rol='gerente', ruta=_periodo(30)),
+    Escenario('reporte_ventas_anio', 'reporte_ventas', rol='gerente', ruta=_periodo(365)),
+]
+
+
+def urls_sin_escenario(escenarios=ESCENARIOS):
+    """Nombres de tienda/urls.py que ningún escenario mide (una vista nueva sin benchmark)."""
+    return sorted({patron.name for patron in urlpatterns} - {escenario.url for escenario in escenarios})
+
+
+# ============ DATOS ============
+def generar_escala(escala, progreso=None):
+    """Genera el conjunto de la escala si la base aún no lo tiene (se reutiliza al conservar la base)."""
+    ventas = ESCALAS[escala]
+    generador = GeneradorDatos(semilla=SEMILLA_BENCHMARK, dias=365, hasta=HASTA_BENCHMARK, progreso=progreso)
+    if not generador.ya_generado():
+        generador.generar(volumenes(max(ventas / 100_000, 0.1), ventas=ventas))
+
+
+def preparar_contexto():
+    """Usuarios de cada rol y los ids que usan los escenarios; se crean una sola vez."""
+    clave = make_password(CLAVE_BENCHMARK)
+    usuarios = {}
+    for rol in ('administrador', 'gerente', 'vendedor', 'cliente'):
+        usuario, creado = User.objects.get_or_create(username=f'bench_{rol}', defaults={'password': clave})
+        if rol != 'cliente':
+            PerfilUsuario.objects.get_or_create(user=usuario, defaults={'rol': rol})
+        usuarios[rol] = usuario
+
+    cliente = Cliente.objects.filter(usuario=usuarios['cliente']).first()
+    if cliente is None:
+        # El cliente con más compras del conjunto queda ligado a la cuenta de prueba
+        cliente = Cliente.objects.filter(usuario__isnull=True).annotate(n=Count('ventas')).order_by('-n', 'pk').first()
+        cliente.usuario = usuarios['cliente']
+        cliente.save(update_fields=['usuario'])
+
+    productos = list(Producto.objects.filter(activo=True, precio_venta__isnull=False).order_by('-stock', 'pk')[:2])
+    for producto in productos:
+        if producto.stock < 100_000:
+            # Stock de sobra para todas las repeticiones de registrar_venta y del lote
+            reabastecer(producto, 100_000, usuario=usuarios['administrador'], nota='benchmark')
+
+    return {
+        'usuarios': usuarios,
+        'producto': productos[0].pk,
+        'productos_venta': [producto.pk for producto in productos],
+        'categoria': Categoria.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'proveedor': Proveedor.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'cliente': cliente.pk,
+        'venta_cliente': Venta.objects.filter(cliente=cliente).order_by('-pk').values_list('pk', flat=True).first(),
+        # Los reportes miran el periodo generado, no las ventas que registran los propios escenarios
+        'hasta': HASTA_BENCHMARK,
+    }
+
+
+# ============ MEDICIÓN ============
+def percentil(valores, p):
+    """Percentil por rango más cercano de una lista no vacía."""
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))]
+
+
+def medir(escenario, contexto, repeticiones=20, calentamiento=2):
+    """Repite la petición y devuelve {'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'consultas', 'estado'}."""
+    cliente = Client()
+    if escenario.rol:
+        cliente.force_login(contexto['usuarios'][escenario.rol])
+    latencias, consultas, estados = [], [], set()
+    for i in range(calentamiento + repeticiones):
+        if escenario.reautenticar and i:
+            cliente.force_login(contexto['usuarios'][escenario.rol])
+        ruta = escenario.ruta(contexto)
+        datos = escenario.datos(contexto, i)
+        extra = {'content_type': escenario.content_type} if escenario.content_type else {}
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            respuesta = getattr(cliente, escenario.metodo)(ruta, datos, **extra)
+            transcurrido = (time.perf_counter() - inicio) * 1000
+        if i >= calentamiento:
+            latencias.append(transcurrido)
+            consultas.append(len(capturadas))
+            estados.add(respuesta.status_code)
+    return {
+        'p50_ms': round(percentil(latencias, 50), 3),
+        'p90_ms': round(percentil(latencias, 90), 3),
+        'p99_ms': round(percentil(latencias, 99), 3),
+        'max_ms': round(max(latencias), 3),
+        'consultas': max(consultas),
+        'estado': escenario.estado if estados == {escenario.estado} else sorted(estados),
+    }
+
+
+def ejecutar(contexto, escenarios=ESCENARIOS, repeticiones=20, progreso=None):
+    """Mide cada escenario y devuelve {nombre: métricas}."""
+    resultados = {}
+    for escenario in escenarios:
+        resultados[escenario.nombre] = medir(escenario, contexto, repeticiones)
+        if progreso:
+            metricas = resultados[escenario.nombre]
+            progreso(f"{escenario.nombre:<28} p50 {metricas['p50_ms']:>9.2f} ms  p90 {metricas['p90_ms']:>9.2f} ms  "
+                     f"{metricas['consultas']:>4} consultas")
+    return resultados
+
+
+def comparar(base, actual, tolerancia=TOLERANCIA, margen_ms=MARGEN_MS):
+    """
+    Compara dos resultados {escala: {'escenarios': {nombre: métricas}}} y devuelve una lista de
+    regresiones en texto: latencia (p50 o p90) más lenta que la tolerancia, más consultas o un
+    código de respuesta distinto. Solo se comparan las escalas y escenarios presentes en ambos.
+    """
+    regresiones = []
+    for escala, medicion in actual.items():
+        anteriores = base.get(escala, {}).get('escenarios', {})
+        for nombre, metricas in medicion['escenarios'].items():
+            antes = anteriores.get(nombre)
+            if antes is None:
+                continue
+            for campo in ('p50_ms', 'p90_ms'):
+                if metricas[campo] > antes[campo] * (1 + tolerancia) and metricas[campo] - antes[campo] > margen_ms:
+                    regresiones.append(f'{escala} {nombre}: {campo} {antes[campo]:.2f} -> {metricas[campo]:.2f}')
+            if metricas['consultas'] > antes['consultas']:
+                regresiones.append(f"{escala} {nombre}: consultas {antes['consultas']} -> {metricas['consultas']}")
+            if metricas['estado'] != antes['estado']:
+                regresiones.append(f"{escala} {nombre}: estado {antes['estado']} -> {metricas['estado']}")
+    return regresiones
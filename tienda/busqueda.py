@@ -0,0 +1,139 @@
+# tienda/busqueda.py
+# ===================================================================
+# Búsqueda de productos con índice de texto completo:
+#   - MySQL: índice FULLTEXT (MATCH ... AGAINST en modo booleano).
+#   - SQLite: tabla virtual FTS5 (tienda_producto_fts) con ranking bm25.
+# Otros motores usan icontains como respaldo. El índice se crea en la
+# migración 0014_producto_busqueda.
+#
+# Búsqueda aproximada de clientes (nombre, apellido, email, teléfono)
+# con un índice de trigramas propio (ClienteTrigrama), portable entre
+# motores y tolerante a errores de tecleo.
+# ===================================================================
+
+import re
+
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Producto, Cliente, ClienteTrigrama
+from .texto import cobertura, es_telefono, normalizar, similitud, solo_digitos, trigramas
+
+# Máximo de resultados que devuelve una búsqueda
+LIMITE_BUSQUEDA = 50
+# Máximo de clientes candidatos (los que más trigramas comparten) que se puntúan en Python
+CANDIDATOS_CLIENTE = 200
+# Fracción mínima de los trigramas buscados que debe tener un cliente que no coincide por prefijo
+COBERTURA_MINIMA = 0.5
+
+_PALABRA = re.compile(r'\w+', re.UNICODE)
+
+
+def terminos(texto):
+    """Separa el texto en palabras; descarta signos para que no se interpreten como operadores."""
+    return _PALABRA.findall(texto or '')[:8]
+
+
+def _buscar_ids_sqlite(palabras, limite):
+    # Cada palabra entre comillas y con * para coincidir por prefijo: "lap"* "pro"*
+    consulta = ' '.join(f'"{palabra}"*' for palabra in palabras)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            # Las coincidencias en el nombre pesan 10 veces más que en la descripción
+            "SELECT rowid FROM tienda_producto_fts WHERE tienda_producto_fts MATCH %s "
+            "ORDER BY bm25(tienda_producto_fts, 10.0, 1.0) LIMIT %s",
+            [consulta, limite],
+        )
+        return [fila[0] for fila in cursor.fetchall()]
+
+
+def buscar_productos(texto, limite=LIMITE_BUSQUEDA, productos=None):
+    """
+    Devuelve una lista de productos que coinciden con `texto` (todas las palabras, por prefijo),
+    ordenados de mayor a menor relevancia. `productos` permite restringir el universo
+    (p. ej. solo activos); por defecto se busca en todo el catálogo.
+    """
+    palabras = terminos(texto)
+    if not palabras:
+        return []
+    productos = Producto.objects.all() if productos is None else productos
+
+    if connection.vendor == 'mysql':
+        consulta = ' '.join(f'+{palabra}*' for palabra in palabras)
+        return list(
+            productos.annotate(
+                relevancia=RawSQL(
+                    'MATCH (tienda_producto.nombre, tienda_producto.descripcion) AGAINST (%s IN BOOLEAN MODE)',
+                    [consulta],
+                )
+            ).filter(relevancia__gt=0).order_by('-relevancia', 'id')[:limite]
+        )
+
+    if connection.vendor == 'sqlite':
+        # Se piden más ids de los necesarios por si el filtro de `productos` descarta algunos
+        ids = _buscar_ids_sqlite(palabras, limite * 4)
+        encontrados = productos.in_bulk(ids)
+        return [encontrados[pk] for pk in ids if pk in encontrados][:limite]
+
+    filtro = Q()
+    for palabra in palabras:
+        filtro &= Q(nombre__icontains=palabra) | Q(descripcion__icontains=palabra)
+    return list(productos.filter(filtro).order_by('nombre', 'id')[:limite])
+
+
+# ============ BÚSQUEDA APROXIMADA DE CLIENTES ============
+def indexar_clientes(clientes):
+    """Regenera las filas de ClienteTrigrama de los clientes dados (tras crearlos o editarlos)."""
+    clientes = list(clientes)
+    filas = [
+        ClienteTrigrama(cliente_id=cliente.pk, trigrama=trigrama)
+        for cliente in clientes
+        for trigrama in trigramas(cliente.clave_busqueda.split())
+    ]
+    with transaction.atomic():
+        ClienteTrigrama.objects.filter(cliente_id__in=[cliente.pk for cliente in clientes]).delete()
+        ClienteTrigrama.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def _puntuar(consulta, tokens_consulta, cliente):
+    """(coincide_por_prefijo, cobertura, similitud) de un cliente frente a la consulta."""
+    tokens = cliente.clave_busqueda.split()
+    propios = trigramas(tokens)
+    prefijo = all(any(token.startswith(buscado) for token in tokens) for buscado in tokens_consulta)
+    return prefijo, cobertura(consulta, propios), similitud(consulta, propios)
+
+
+def buscar_clientes(texto, limite=10):
+    """
+    Clientes que se parecen a `texto` (nombre, apellido, email o teléfono, sin importar
+    acentos ni mayúsculas), del más al menos parecido. Primero van los que coinciden por
+    prefijo en todas las palabras; después los que solo se parecen (errores de tecleo).
+
+    El índice de trigramas reduce la búsqueda a unos cuantos candidatos con una consulta
+    agrupada; la puntuación final se calcula en Python sobre la clave ya normalizada.
+    """
+    # Un teléfono se busca como una sola palabra de dígitos, igual que se guarda en la clave
+    tokens_consulta = [solo_digitos(texto)] if es_telefono(texto) else normalizar(texto)
+    if sum(len(token) for token in tokens_consulta) < 2:
+        return []
+    consulta = trigramas(tokens_consulta, prefijo=True)
+
+    candidatos = list(
+        ClienteTrigrama.objects.filter(trigrama__in=consulta)
+        .values('cliente_id').annotate(coincidencias=Count('id'))
+        .order_by('-coincidencias', 'cliente_id')
+        .values_list('cliente_id', flat=True)[:CANDIDATOS_CLIENTE]
+    )
+    clientes = Cliente.objects.filter(pk__in=candidatos).only(
+        'id', 'nombre', 'apellido', 'email', 'telefono', 'clave_busqueda'
+    )
+
+    puntuados = []
+    for cliente in clientes:
+        prefijo, cubierto, parecido = _puntuar(consulta, tokens_consulta, cliente)
+        if prefijo or cubierto >= COBERTURA_MINIMA:
+            puntuados.append((not prefijo, -cubierto, -parecido, cliente.pk, cliente))
+    puntuados.sort(key=lambda fila: fila[:4])
+    return [fila[4] for fila in puntuados[:limite]]
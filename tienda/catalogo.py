@@ -0,0 +1,161 @@
+# tienda/catalogo.py
+# ===================================================================
+# Snapshot del catálogo en memoria de cada proceso: id -> (precio,
+# nombre, activo) en arreglos compactos, sin stock. El cobro y el
+# autocompletado lo consultan en lugar de pedir un producto por línea.
+#
+# Cada edición de producto incrementa un contador de versión en la
+# caché compartida; los workers comparan su versión con la de la caché
+# (como mucho una vez cada REVISION_SEGUNDOS) y reconstruyen el snapshot
+# si cambió, así no hace falta reiniciarlos tras cambiar un precio.
+# Las actualizaciones masivas (queryset.update, bulk_create) no disparan
+# señales: quien las haga debe llamar a invalidar_catalogo().
+# ===================================================================
+
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .models import Producto
+from .routers import usar_primaria
+
+CLAVE_VERSION = 'tienda:catalogo_version'
+# Cada cuántos segundos, como mucho, un worker consulta la versión en la caché
+REVISION_SEGUNDOS = getattr(settings, 'TIENDA_CATALOGO_REVISION_SEGUNDOS', 1)
+# Campos que guarda el snapshot; editar cualquier otro no invalida
+CAMPOS_CATALOGO = ('nombre', 'precio_venta', 'activo')
+
+_SIN_PRECIO = -1
+
+
+class Catalogo:
+    """
+    Snapshot inmutable del catálogo. Los ids van ordenados en un array('q') y se buscan
+    con bisect; precio (en centavos), activo y nombre se guardan en la misma posición.
+    """
+    __slots__ = ('version', '_ids', '_centavos', '_activos', '_nombres')
+
+    def __init__(self, version, filas):
+        """`filas`: tuplas (id, nombre, precio_venta, activo) ordenadas por id."""
+        self.version = version
+        self._ids = array('q')
+        self._centavos = array('q')
+        activos = bytearray()
+        nombres = []
+        for pk, nombre, precio, activo in filas:
+            self._ids.append(pk)
+            self._centavos.append(_SIN_PRECIO if precio is None else int(precio * 100))
+            activos.append(bool(activo))
+            nombres.append(nombre)
+        self._activos = bytes(activos)
+        self._nombres = tuple(nombres)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, pk):
+        return self._posicion(pk) is not None
+
+    def _posicion(self, pk):
+        try:
+            pk = int(pk)
+        except (TypeError, ValueError):
+            return None
+        i = bisect_left(self._ids, pk)
+        if i < len(self._ids) and self._ids[i] == pk:
+            return i
+        return None
+
+    def nombre(self, pk):
+        i = self._posicion(pk)
+        return None if i is None else self._nombres[i]
+
+    def precio(self, pk):
+        """Precio de venta como Decimal, o None si el producto no existe o no tiene precio."""
+        i = self._posicion(pk)
+        if i is None or self._centavos[i] == _SIN_PRECIO:
+            return None
+        return Decimal(self._centavos[i]).scaleb(-2)
+
+    def activo(self, pk):
+        i = self._posicion(pk)
+        return i is not None and bool(self._activos[i])
+
+    def producto(self, pk):
+        """
+        Instancia de Producto armada desde el snapshot (sin consultar la base) con id, nombre,
+        precio_venta y activo; el resto de campos quedan diferidos. None si no existe.
+        """
+        i = self._posicion(pk)
+        if i is None:
+            return None
+        return Producto.from_db(
+            connection.alias,
+            ['id', 'nombre', 'precio_venta', 'activo'],
+            [self._ids[i], self._nombres[i], self.precio(self._ids[i]), bool(self._activos[i])],
+        )
+
+
+_bloqueo = threading.Lock()
+_actual = None
+_revisado_en = 0.0
+
+
+def _version_inicial():
+    # Si la caché pierde la clave, la versión arranca en la hora actual (ms) y no en 1,
+    # para no coincidir por casualidad con un snapshot viejo de otro worker
+    return int(time.time() * 1000)
+
+
+def version_catalogo():
+    """Versión vigente en la caché compartida (la crea si no existe)."""
+    version = cache.get(CLAVE_VERSION)
+    if version is None:
+        cache.add(CLAVE_VERSION, _version_inicial(), None)
+        version = cache.get(CLAVE_VERSION)
+    # Sin caché real (DummyCache) cada revisión cuenta como una versión nueva
+    return version if version is not None else _version_inicial()
+
+
+def invalidar_catalogo():
+    """Sube la versión del catálogo: todos los workers reconstruirán su snapshot."""
+    global _actual
+    try:
+        cache.incr(CLAVE_VERSION)
+    except ValueError:
+        cache.add(CLAVE_VERSION, _version_inicial(), None)
+    _actual = None
+
+
+def construir_catalogo(version):
+    # Una réplica atrasada dejaría un snapshot viejo con la versión nueva: se lee de la primaria
+    with usar_primaria():
+        filas = Producto.objects.order_by('id').values_list('id', 'nombre', 'precio_venta', 'activo')
+        return Catalogo(version, filas.iterator(chunk_size=5000))
+
+
+def catalogo():
+    """Devuelve el snapshot vigente, reconstruyéndolo si otro proceso cambió la versión."""
+    global _actual, _revisado_en
+    snapshot = _actual
+    ahora = time.monotonic()
+    if snapshot is not None and ahora - _revisado_en < REVISION_SEGUNDOS:
+        return snapshot
+
+    version = version_catalogo()
+    if snapshot is not None and snapshot.version == version:
+        _revisado_en = ahora
+        return snapshot
+
+    with _bloqueo:
+        # Otro hilo pudo haberlo reconstruido mientras esperábamos
+        if _actual is None or _actual.version != version:
+            _actual = construir_catalogo(version)
+        _revisado_en = ahora
+        return _actual
@@ -0,0 +1,31 @@
+# tienda/checks.py
+# ===================================================================
+# Revisiones de arranque (manage.py check, runserver, migrate).
+# ===================================================================
+
+from django.conf import settings
+from django.core.checks import Error, register
+
+# Cachés que viven dentro de cada proceso: lo que un worker invalida los demás no lo ven
+CACHES_LOCALES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register()
+def revisar_cache_compartido(app_configs, **kwargs):
+    """
+    Los sellos de rol, la versión del catálogo y los contadores del dashboard se invalidan
+    en el caché 'default'. Si es local al proceso, los demás workers siguen con el rol y los
+    precios viejos hasta reiniciarse.
+    """
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend in CACHES_LOCALES and not getattr(settings, 'TIENDA_CACHE_LOCAL_PERMITIDO', False):
+        return [Error(
+            f'El caché "default" ({backend}) es local a cada proceso.',
+            hint='Usa un caché compartido (Redis, Memcached o DatabaseCache). Solo para un '
+                 'único proceso de desarrollo: TIENDA_CACHE_LOCAL_PERMITIDO = True.',
+            id='tienda.E001',
+        )]
+    return []
@@ -0,0 +1,44 @@
+# tienda/contadores.py
+# ===================================================================
+# Contadores del dashboard guardados en caché. Las señales post_save /
+# post_delete de los modelos contados borran la entrada, así que la
+# página de inicio solo consulta la base cuando algo cambió.
+# ===================================================================
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Producto, Categoria, Proveedor, Cliente
+from .routers import usar_primaria
+
+CLAVE_CONTADORES = 'tienda:dashboard:contadores'
+
+# Red de seguridad: aunque se escape una invalidación (update() o bulk_create no emiten señales),
+# los contadores no quedan desactualizados más de este tiempo
+DURACION_CONTADORES = getattr(settings, 'TIENDA_CACHE_DASHBOARD_SEGUNDOS', 300)
+
+MODELOS_CONTADOS = {
+    'total_productos': Producto,
+    'total_categorias': Categoria,
+    'total_proveedores': Proveedor,
+    'total_clientes': Cliente,
+}
+
+
+def contadores_dashboard():
+    """Totales de productos, categorías, proveedores y clientes, y los últimos productos creados."""
+    contadores = cache.get(CLAVE_CONTADORES)
+    if contadores is None:
+        # Van a la caché compartida: se leen de la primaria aunque la vista use la réplica
+        with usar_primaria():
+            contadores = {clave: modelo.objects.count() for clave, modelo in MODELOS_CONTADOS.items()}
+            contadores['productos_recientes'] = list(
+                Producto.objects.order_by('-id').only('id', 'nombre', 'precio_venta', 'stock')[:5]
+            )
+        cache.set(CLAVE_CONTADORES, contadores, DURACION_CONTADORES)
+    return contadores
+
+
+def invalidar_contadores():
+    """Descarta los contadores guardados; se recalculan en la siguiente visita al dashboard."""
+    cache.delete(CLAVE_CONTADORES)
@@ -0,0 +1,280 @@
+# tienda/datos_sinteticos.py
+# ===================================================================
+# Generador determinista de datos de prueba a escala (benchmarks y
+# pruebas de carga): categorías, proveedores, productos, clientes,
+# vendedores y ventas con estacionalidad (día de la semana, mes y
+# hora), todo con inserciones masivas. La misma semilla y la misma
+# fecha final producen exactamente los mismos datos.
+#
+# Las ventas generadas quedan consistentes con el resto del sistema:
+# salidas en el kardex, stock final de cada producto y acumulados
+# diarios (VentaDiaria) reconstruidos al terminar.
+#
+# Las tablas de alto volumen (ventas, detalles, kardex y trigramas de
+# clientes) se escriben con INSERT ... executemany sin instanciar
+# modelos: con millones de filas el costo de bulk_create está en
+# construir y preparar cada instancia, no en la base de datos.
+# ===================================================================
+
+import math
+import random
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .catalogo import invalidar_catalogo
+from .contadores import invalidar_contadores
+from .models import (
+    Categoria, Cliente, ClienteTrigrama, DetalleVenta, MovimientoInventario, PerfilUsuario, Producto, Proveedor, Venta,
+)
+from .reportes import reconstruir_ventas_diarias
+from .texto import clave_de_busqueda, trigramas
+
+# Volúmenes con escala 1; --escala los multiplica
+VOLUMENES_BASE = {
+    'categorias': 20,
+    'proveedores': 50,
+    'productos': 2000,
+    'clientes': 5000,
+    'vendedores': 20,
+    'ventas': 100_000,
+}
+TAMANO_LOTE_VENTAS = 5000
+# Filas por executemany en las inserciones directas
+TAMANO_LOTE_INSERCION = 5000
+
+# Estacionalidad: peso relativo por día de la semana (lunes=0), por mes y por hora del día
+PESO_DIA_SEMANA = (0.8, 0.85, 0.9, 0.95, 1.2, 1.5, 1.1)
+PESO_MES = (0.8, 0.75, 0.85, 0.9, 1.0, 0.95, 1.05, 1.1, 0.9, 0.95, 1.2, 1.7)
+HORAS = tuple(range(9, 22))
+PESO_HORA = (0.4, 0.6, 0.8, 1.0, 1.3, 1.2, 0.9, 0.8, 0.9, 1.1, 1.3, 1.0, 0.6)
+# Fracción de ventas con cliente registrado
+PROPORCION_CON_CLIENTE = 0.6
+
+_NOMBRES = ('Ana', 'Luis', 'María', 'José', 'Carmen', 'Jorge', 'Lucía', 'Pedro', 'Sofía', 'Miguel',
+            'Elena', 'Raúl', 'Paula', 'Diego', 'Laura', 'Andrés', 'Rosa', 'Javier', 'Isabel', 'Héctor')
+_APELLIDOS = ('García', 'López', 'Martínez', 'Hernández', 'González', 'Pérez', 'Rodríguez', 'Sánchez',
+              'Ramírez', 'Torres', 'Flores', 'Rivera', 'Gómez', 'Díaz', 'Cruz', 'Morales', 'Reyes', 'Ortiz')
+_ARTICULOS = ('Lápiz', 'Cuaderno', 'Mouse', 'Teclado', 'Camisa', 'Pantalón', 'Taza', 'Sartén', 'Lámpara',
+              'Mochila', 'Audífonos', 'Cargador', 'Toalla', 'Cuchillo', 'Botella', 'Silla', 'Reloj', 'Gorra')
+_ADJETIVOS = ('Básico', 'Pro', 'Deluxe', 'Compacto', 'Ecológico', 'Clásico', 'Premium', 'Mini', 'Max', 'Plus')
+
+
+def volumenes(escala=1.0, **ajustes):
+    """Volúmenes finales: los base multiplicados por `escala`, con ajustes explícitos por entidad."""
+    resultado = {nombre: max(1, int(valor * escala)) for nombre, valor in VOLUMENES_BASE.items()}
+    resultado.update({nombre: valor for nombre, valor in ajustes.items() if valor is not None})
+    return resultado
+
+
+def insertar_filas(modelo, campos, filas):
+    """
+    INSERT directo de tuplas (en el orden de `campos`) sin pasar por el ORM. Los valores
+    deben venir ya listos para la base: ids en lugar de instancias y fechas adaptadas con
+    connection.ops.adapt_datetimefield_value. No aplica defaults ni dispara señales.
+    """
+    columnas = ', '.join(connection.ops.quote_name(modelo._meta.get_field(campo).column) for campo in campos)
+    sql = (
+        f'INSERT INTO {connection.ops.quote_name(modelo._meta.db_table)} ({columnas}) '
+        f'VALUES ({", ".join(["%s"] * len(campos))})'
+    )
+    with connection.cursor() as cursor:
+        for inicio in range(0, len(filas), TAMANO_LOTE_INSERCION):
+            cursor.executemany(sql, filas[inicio:inicio + TAMANO_LOTE_INSERCION])
+
+
+class GeneradorDatos:
+    """
+    Genera un conjunto de datos completo. `prefijo` (derivado de la semilla) va en los campos
+    únicos (sku, email, folio...), así conjuntos con semillas distintas pueden convivir.
+    """
+
+    def __init__(self, semilla=1, dias=365, hasta=None, progreso=None):
+        self.semilla = semilla
+        self.rng = random.Random(semilla)
+        self.prefijo = f'GEN{semilla}'
+        self.dias = dias
+        self.hasta = hasta or timezone.localdate()
+        self.desde = self.hasta - timedelta(days=dias - 1)
+        self.progreso = progreso or (lambda mensaje: None)
+
+    def ya_generado(self):
+        return Venta.objects.filter(folio__startswith=f'{self.prefijo}-').exists() or \
+            Producto.objects.filter(sku__startswith=f'{self.prefijo}-').exists()
+
+    # ---------- Catálogo y personas ----------
+    def crear_catalogo(self, n_categorias, n_proveedores, n_productos):
+        rng = self.rng
+        Categoria.objects.bulk_create(
+            [Categoria(nombre=f'{self.prefijo} Categoría {i}') for i in range(n_categorias)], batch_size=1000
+        )
+        categorias = list(Categoria.objects.filter(nombre__startswith=f'{self.prefijo} ').values_list('id', flat=True))
+        Proveedor.objects.bulk_create([
+            Proveedor(nombre=f'{rng.choice(_NOMBRES)} {rng.choice(_APELLIDOS)}', empresa=f'{self.prefijo} Proveedor {i}',
+                      email=f'proveedor{i}@{self.prefijo.lower()}.example')
+            for i in range(n_proveedores)
+        ], batch_size=1000)
+        proveedores = list(Proveedor.objects.filter(empresa__startswith=f'{self.prefijo} ').values_list('id', flat=True))
+
+        productos = []
+        for i in range(n_productos):
+            # Precios con distribución log-normal (muchos baratos, pocos caros), redondeados a 0.50
+            precio = min(max(math.exp(rng.gauss(5.0, 1.1)), 5), 20000)
+            productos.append(Producto(
+                sku=f'{self.prefijo}-{i:07d}',
+                nombre=f'{rng.choice(_ARTICULOS)} {rng.choice(_ADJETIVOS)} {i}',
+                descripcion=f'Producto generado #{i}',
+                precio_venta=Decimal(round(precio * 2) / 2).quantize(Decimal('0.01')),
+                stock=0,
+                categoria_id=rng.choice(categorias),
+            ))
+        Producto.objects.bulk_create(productos, batch_size=1000)
+        self.productos = list(
+            Producto.objects.filter(sku__startswith=f'{self.prefijo}-').order_by('sku')
+            .values_list('id', 'precio_venta', 'categoria_id')
+        )
+        enlace = Producto.proveedores.through
+        enlace.objects.bulk_create([
+            enlace(producto_id=pk, proveedor_id=proveedor)
+            for pk, _, _ in self.productos
+            for proveedor in rng.sample(proveedores, k=min(len(proveedores), rng.randint(1, 2)))
+        ], batch_size=5000)
+        self.progreso(f'{len(self.productos)} productos')
+
+    def crear_personas(self, n_clientes, n_vendedores):
+        rng = self.rng
+        clientes = []
+        for i in range(n_clientes):
+            nombre, apellido = rng.choice(_NOMBRES), f'{rng.choice(_APELLIDOS)} {rng.choice(_APELLIDOS)}'
+            email = f'cliente{i}@{self.prefijo.lower()}.example'
+            telefono = f'662{rng.randint(0, 9_999_999):07d}'
+            clientes.append(Cliente(
+                nombre=nombre, apellido=apellido, email=email, telefono=telefono, direccion=f'Calle {i}',
+                # bulk_create no llama a save(): la clave de búsqueda se calcula aquí
+                clave_busqueda=clave_de_busqueda(nombre, apellido, email, telefono),
+            ))
+        Cliente.objects.bulk_create(clientes, batch_size=1000)
+        creados = list(
+            Cliente.objects.filter(email__endswith=f'@{self.prefijo.lower()}.example').order_by('email')
+            .values_list('id', 'clave_busqueda')
+        )
+        # Índice de búsqueda aproximada (lo que haría indexar_clientes, sin instanciar cada trigrama)
+        with transaction.atomic():
+            insertar_filas(ClienteTrigrama, ('cliente', 'trigrama'), [
+                (pk, trigrama) for pk, clave in creados for trigrama in trigramas(clave.split())
+            ])
+        self.clientes = [pk for pk, _ in creados]
+
+        # Una sola contraseña inutilizable para todos: los vendedores generados no inician sesión
+        sin_clave = make_password(None)
+        User.objects.bulk_create([
+            User(username=f'{self.prefijo.lower()}_vendedor{i}', password=sin_clave) for i in range(n_vendedores)
+        ], batch_size=1000)
+        vendedores = list(
+            User.objects.filter(username__startswith=f'{self.prefijo.lower()}_vendedor').values_list('id', flat=True)
+        )
+        PerfilUsuario.objects.bulk_create([PerfilUsuario(user_id=pk, rol='vendedor') for pk in vendedores])
+        self.vendedores = vendedores
+        self.progreso(f'{len(self.clientes)} clientes, {len(vendedores)} vendedores')
+
+    # ---------- Ventas ----------
+    def ventas_por_dia(self, n_ventas):
+        """Reparte `n_ventas` entre los días del periodo según la estacionalidad y una tendencia creciente."""
+        dias = [self.desde + timedelta(days=i) for i in range(self.dias)]
+        pesos = [
+            PESO_DIA_SEMANA[dia.weekday()] * PESO_MES[dia.month - 1] * (0.8 + 0.4 * i / max(self.dias - 1, 1))
+            for i, dia in enumerate(dias)
+        ]
+        total = sum(pesos)
+        conteos = [int(n_ventas * peso / total) for peso in pesos]
+        for i in self.rng.choices(range(self.dias), weights=pesos, k=n_ventas - sum(conteos)):
+            conteos[i] += 1
+        return list(zip(dias, conteos))
+
+    def crear_ventas(self, n_ventas):
+        rng = self.rng
+        # Popularidad tipo Zipf: unos cuantos productos concentran la mayoría de las ventas
+        popularidad = list(accumulate(1 / (rango + 1) ** 0.8 for rango in range(len(self.productos))))
+        horas_acumuladas = list(accumulate(PESO_HORA))
+        vendidos = [0] * len(self.productos)
+        # Ids asignados aquí: los detalles y el kardex se insertan sin volver a consultar las ventas
+        self.siguiente_id = (Venta.objects.aggregate(ultimo=Max('id'))['ultimo'] or 0) + 1
+        numero = 0
+        pendientes = []
+
+        for dia, cantidad in self.ventas_por_dia(n_ventas):
+            for _ in range(cantidad):
+                hora = rng.choices(HORAS, cum_weights=horas_acumuladas)[0]
+                fecha = timezone.make_aware(
+                    datetime.combine(dia, time(hora, rng.randrange(60), rng.randrange(60)))
+                )
+                lineas = {}
+                for indice in rng.choices(range(len(self.productos)), cum_weights=popularidad,
+                                          k=min(1 + int(rng.expovariate(0.8)), 8)):
+                    lineas[indice] = lineas.get(indice, 0) + rng.choice((1, 1, 1, 2, 2, 3))
+                cliente = rng.choice(self.clientes) if rng.random() < PROPORCION_CON_CLIENTE else None
+                pendientes.append((f'{self.prefijo}-{numero:09d}', fecha, cliente, rng.choice(self.vendedores), lineas))
+                numero += 1
+                if len(pendientes) == TAMANO_LOTE_VENTAS:
+                    self._insertar_ventas(pendientes, vendidos)
+                    pendientes = []
+                    self.progreso(f'{numero} ventas')
+        if pendientes:
+            self._insertar_ventas(pendientes, vendidos)
+        self._cerrar_inventario(vendidos)
+        self.progreso(f'{numero} ventas')
+
+    def _insertar_ventas(self, pendientes, vendidos):
+        adaptar = connection.ops.adapt_datetimefield_value
+        ventas, detalles, movimientos = [], [], []
+        for folio, fecha, cliente, vendedor, lineas in pendientes:
+            venta_id = self.siguiente_id
+            self.siguiente_id += 1
+            fecha = adaptar(fecha)
+            total = Decimal('0.00')
+            for indice, cantidad in lineas.items():
+                producto_id, precio, _ = self.productos[indice]
+                subtotal = precio * cantidad
+                total += subtotal
+                vendidos[indice] += cantidad
+                detalles.append((venta_id, producto_id, cantidad, precio, subtotal))
+                movimientos.append((producto_id, 'venta', -cantidad, fecha, venta_id, vendedor, ''))
+            ventas.append((venta_id, folio, fecha, cliente, vendedor, total))
+
+        with transaction.atomic():
+            insertar_filas(Venta, ('id', 'folio', 'fecha_venta', 'cliente', 'vendido_por', 'total'), ventas)
+            insertar_filas(DetalleVenta, ('venta', 'producto', 'cantidad', 'precio_unitario', 'subtotal'), detalles)
+            insertar_filas(
+                MovimientoInventario, ('producto', 'tipo', 'cantidad', 'fecha', 'venta', 'usuario', 'nota'), movimientos
+            )
+
+    def _cerrar_inventario(self, vendidos):
+        """Stock inicial (al comenzar el periodo) suficiente para lo vendido más un remanente; stock final coherente."""
+        rng = self.rng
+        inicio = timezone.make_aware(datetime.combine(self.desde, time.min))
+        iniciales = [vendido + rng.randint(0, 200) for vendido in vendidos]
+        with transaction.atomic():
+            MovimientoInventario.objects.bulk_create([
+                MovimientoInventario(producto_id=pk, tipo='inicial', cantidad=inicial, fecha=inicio, nota='generar_datos')
+                for (pk, _, _), inicial in zip(self.productos, iniciales) if inicial
+            ], batch_size=2000)
+            Producto.objects.bulk_update([
+                Producto(pk=pk, stock=inicial - vendido)
+                for (pk, _, _), inicial, vendido in zip(self.productos, iniciales, vendidos)
+            ], ['stock'], batch_size=1000)
+
+    def generar(self, cantidades):
+        """Crea todo el conjunto. `cantidades` como lo devuelve volumenes()."""
+        self.crear_catalogo(cantidades['categorias'], cantidades['proveedores'], cantidades['productos'])
+        self.crear_personas(cantidades['clientes'], cantidades['vendedores'])
+        self.crear_ventas(cantidades['ventas'])
+        reconstruir_ventas_diarias(self.desde, self.hasta)
+        # Las inserciones masivas no disparan señales
+        invalidar_catalogo()
+        invalidar_contadores()
@@ -6,7 +6,9 @@ from django import forms
 # Si el modelo Venta NO existe aún en models.py, DEBES crearlo primero.
 from .models import Producto, Categoria, Proveedor, Cliente, Venta 
 from django.forms import inlineformset_factory
+from django.urls import reverse
 from .models import DetalleVenta
+from .catalogo import catalogo
 
 # ============ FORMULARIO PARA PRODUCTOS ============
 class ProductoForm(forms.ModelForm):
@@ -64,6 +66,48 @@ class ProductoForm(forms.ModelForm):
         }
 
 
+# ============ FILTROS PARA LA LISTA DE PRODUCTOS ============
+class ProductoFiltroForm(forms.Form):
+    """Filtros y orden de la lista de productos (se envía por GET)."""
+
+    ORDENES = (
+        ('nombre', 'Nombre (A-Z)'),
+        ('-nombre', 'Nombre (Z-A)'),
+        ('precio', 'Precio (menor a mayor)'),
+        ('-precio', 'Precio (mayor a menor)'),
+        ('stock', 'Stock (menor a mayor)'),
+        ('-stock', 'Stock (mayor a menor)'),
+        ('recientes', 'Más recientes'),
+    )
+    ESTADOS = (
+        ('', 'Todos'),
+        ('activos', 'Activos'),
+        ('inactivos', 'Inactivos'),
+    )
+
+    categoria = forms.ModelChoiceField(
+        queryset=Categoria.objects.only('id', 'nombre'),
+        required=False,
+        empty_label='Todas las categorías',
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
+    estado = forms.ChoiceField(choices=ESTADOS, required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+    stock_bajo = forms.BooleanField(
+        required=False,
+        label='Solo stock bajo',
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
+    )
+    precio_min = forms.DecimalField(
+        required=False, min_value=0, decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'placeholder': 'Precio mín.'}),
+    )
+    precio_max = forms.DecimalField(
+        required=False, min_value=0, decimal_places=2,
+        widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'placeholder': 'Precio máx.'}),
+    )
+    orden = forms.ChoiceField(choices=ORDENES, required=False, widget=forms.Select(attrs={'class': 'form-select'}))
+
+
 # ============ FORMULARIO PARA CATEGORÍAS ============
 class CategoriaForm(forms.ModelForm):
     """Formulario para crear y editar categorías"""
@@ -172,6 +216,48 @@ class ClienteForm(forms.ModelForm):
         }
 
 
+# ==============================
+# WIDGETS DE AUTOCOMPLETADO (productos y clientes)
+# ==============================
+class AutocompletarWidget(forms.TextInput):
+    """
+    Reemplaza a un Select con una <option> por registro: guarda el id en un campo oculto
+    y busca con autocompletado contra el endpoint JSON `url_name`. Solo consulta la base
+    para mostrar la etiqueta del registro ya elegido (al re-mostrar el formulario).
+    """
+    template_name = 'tienda/widgets/autocompletar.html'
+    url_name = None
+    placeholder = ''
+
+    def etiqueta(self, value):
+        """Texto visible del registro elegido; las subclases lo resuelven sin listar la tabla."""
+        return str(value)
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['etiqueta'] = self.etiqueta(value) if value not in (None, '') else ''
+        context['widget']['url'] = reverse(self.url_name)
+        context['widget']['placeholder'] = self.placeholder
+        return context
+
+
+class ProductoAutocompleteWidget(AutocompletarWidget):
+    url_name = 'producto_autocompletar'
+    placeholder = 'Buscar producto por nombre...'
+
+    def etiqueta(self, value):
+        return catalogo().nombre(value) or ''
+
+
+class ClienteAutocompleteWidget(AutocompletarWidget):
+    url_name = 'cliente_buscar'
+    placeholder = 'Buscar cliente por nombre, email o teléfono...'
+
+    def etiqueta(self, value):
+        cliente = Cliente.objects.filter(pk=value).only('nombre', 'apellido').first()
+        return str(cliente) if cliente else ''
+
+
 # ============ FORMULARIO PARA VENTA ============
 class VentaForm(forms.ModelForm):
     """Formulario para registrar una venta. Anteriormente daba error."""
@@ -183,7 +269,7 @@ class VentaForm(forms.ModelForm):
         
         # Widgets y Labels recomendados para la Venta
         widgets = {
-            'cliente': forms.Select(attrs={'class': 'form-control'}),
+            'cliente': ClienteAutocompleteWidget(),  # Búsqueda aproximada en lugar de listar a todos los clientes
             'total': forms.NumberInput(attrs={
                 'class': 'form-control', 
                 'step': '0.01', 
@@ -200,14 +286,29 @@ class VentaForm(forms.ModelForm):
 # ==============================
 # FORMSET para Detalle de Venta
 # ==============================
+class ProductoCatalogoField(forms.ModelChoiceField):
+    """
+    Campo de producto que resuelve el id con el catálogo en memoria en lugar de hacer
+    una consulta por línea. Si el id no está en el snapshot (producto recién creado)
+    se busca en la base como un ModelChoiceField normal.
+    """
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        producto = catalogo().producto(value)
+        return producto if producto is not None else super().to_python(value)
+
+
 DetalleVentaFormSet = inlineformset_factory(
     Venta,                        # Modelo principal
     DetalleVenta,                 # Modelo hijo
     fields=['producto', 'cantidad'],  # Campos que se llenan manualmente
+    field_classes={'producto': ProductoCatalogoField},  # Resuelve el producto sin consultar la base
     extra=1,                      # Cuántas filas vacías aparecerán
     can_delete=True,              # Permite eliminar líneas del detalle
     widgets={
-        'producto': forms.Select(attrs={'class': 'form-control'}),
+        'producto': ProductoAutocompleteWidget(),  # Autocompletado en lugar de un Select con todo el catálogo
         'cantidad': forms.NumberInput(attrs={
             'class': 'form-control',
             'min': '1',
@@ -225,7 +326,7 @@ class DetalleVentaForm(forms.ModelForm):
         model = DetalleVenta
         fields = ['producto', 'cantidad', 'precio_unitario']
         widgets = {
-            'producto': forms.Select(attrs={'class': 'form-control'}),
+            'producto': ProductoAutocompleteWidget(),
             'cantidad': forms.NumberInput(attrs={'class': 'form-control', 'min': 1, 'placeholder': 'Cantidad'}),
             'precio_unitario': forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'placeholder': '0.00'}),
         }
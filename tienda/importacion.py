@@ -0,0 +1,171 @@
+# tienda/importacion.py
+# ===================================================================
+# Importación masiva del catálogo (CSV o JSONL) con upserts por SKU.
+# Lee el archivo en streaming y escribe por bloques:
+#   - categorías y proveedores se resuelven con mapas en memoria
+#     (y se crean en bloque si no existen);
+#   - productos con bulk_create(update_conflicts=True) sobre `sku`;
+#   - enlaces producto-proveedor (M2M) reemplazados en bloque.
+# El stock del archivo solo se usa para productos nuevos (y queda en
+# el kardex como movimiento inicial); los existentes conservan su
+# stock, que se corrige con reabastecer/ajustar_stock.
+# ===================================================================
+
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+
+from .catalogo import invalidar_catalogo
+from .contadores import invalidar_contadores
+from .inventario import registrar_movimientos
+from .models import Categoria, MovimientoInventario, Producto, Proveedor
+
+TAMANO_BLOQUE_IMPORTACION = 2000
+# Columnas que el archivo puede traer además de sku, nombre, categoria y precio_venta
+CAMPOS_ACTUALIZABLES = ('nombre', 'descripcion', 'precio_venta', 'categoria', 'activo')
+SEPARADOR_PROVEEDORES = '|'
+
+_VERDADERO = {'1', 'true', 'si', 'sí', 'yes', 'activo'}
+
+
+class FilaInvalida(ValueError):
+    """Una fila del archivo no se puede importar; se omite y se informa."""
+
+
+def leer_filas(archivo, formato):
+    """Genera dicts a partir de un archivo de texto abierto, en formato 'csv' o 'jsonl'."""
+    if formato == 'csv':
+        yield from csv.DictReader(archivo)
+    else:
+        for linea in archivo:
+            if linea.strip():
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    yield None  # normalizar_fila la reporta como inválida
+
+
+def normalizar_fila(fila):
+    """Valida y convierte una fila cruda. Devuelve un dict con solo las columnas presentes."""
+    if not isinstance(fila, dict):
+        raise FilaInvalida('la línea no es un objeto JSON válido')
+    sku = str(fila.get('sku') or '').strip()
+    nombre = str(fila.get('nombre') or '').strip()
+    categoria = str(fila.get('categoria') or '').strip()
+    if not sku or len(sku) > 64:
+        raise FilaInvalida('falta el sku (máximo 64 caracteres)')
+    if not nombre or not categoria:
+        raise FilaInvalida(f'{sku}: nombre y categoria son obligatorios')
+    try:
+        precio = Decimal(str(fila.get('precio_venta'))).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        raise FilaInvalida(f'{sku}: precio_venta inválido')
+
+    normalizada = {'sku': sku, 'nombre': nombre[:200], 'categoria': categoria[:100], 'precio_venta': precio}
+    if 'descripcion' in fila:
+        normalizada['descripcion'] = str(fila['descripcion'] or '')
+    if 'activo' in fila:
+        activo = fila['activo']
+        normalizada['activo'] = activo if isinstance(activo, bool) else str(activo).strip().lower() in _VERDADERO
+    if fila.get('stock') not in (None, ''):
+        try:
+            normalizada['stock'] = int(fila['stock'])
+        except (TypeError, ValueError):
+            raise FilaInvalida(f'{sku}: stock inválido')
+    if 'proveedores' in fila:
+        proveedores = fila['proveedores'] or []
+        if isinstance(proveedores, str):
+            proveedores = proveedores.split(SEPARADOR_PROVEEDORES)
+        normalizada['proveedores'] = [str(p).strip()[:200] for p in proveedores if str(p).strip()]
+    return normalizada
+
+
+class ImportadorCatalogo:
+    """
+    Importa bloques de filas normalizadas. Conserva entre bloques los mapas
+    nombre de categoría -> id y empresa del proveedor -> id, así cada bloque
+    cuesta un número fijo de consultas sin importar cuántas filas traiga.
+    """
+
+    def __init__(self, usuario=None):
+        self.usuario = usuario
+        self.categorias = dict(Categoria.objects.values_list('nombre', 'id'))
+        self.proveedores = dict(Proveedor.objects.values_list('empresa', 'id'))
+        self.creados = 0
+        self.actualizados = 0
+        # Sin soporte de ON CONFLICT (columna) el motor decide con sus índices únicos (MySQL)
+        self.unique_fields = ['sku'] if connection.features.supports_update_conflicts_with_target else None
+
+    def _resolver_categorias(self, nombres):
+        faltantes = set(nombres) - set(self.categorias)
+        if faltantes:
+            Categoria.objects.bulk_create([Categoria(nombre=nombre) for nombre in faltantes], ignore_conflicts=True)
+            self.categorias.update(Categoria.objects.filter(nombre__in=faltantes).values_list('nombre', 'id'))
+
+    def _resolver_proveedores(self, empresas):
+        faltantes = set(empresas) - set(self.proveedores)
+        if faltantes:
+            Proveedor.objects.bulk_create(
+                [Proveedor(nombre=empresa, empresa=empresa) for empresa in faltantes], ignore_conflicts=True
+            )
+            self.proveedores.update(Proveedor.objects.filter(empresa__in=faltantes).values_list('empresa', 'id'))
+
+    def importar_bloque(self, filas):
+        """Escribe un bloque de filas normalizadas en una transacción. Si un SKU se repite gana la última."""
+        filas = list({fila['sku']: fila for fila in filas}.values())
+        if not filas:
+            return
+        campos = set().union(*filas)
+        self._resolver_categorias(fila['categoria'] for fila in filas)
+        if 'proveedores' in campos:
+            self._resolver_proveedores(empresa for fila in filas for empresa in fila.get('proveedores', []))
+
+        skus = [fila['sku'] for fila in filas]
+        with transaction.atomic():
+            existentes = set(Producto.objects.filter(sku__in=skus).values_list('sku', flat=True))
+            productos = [
+                Producto(
+                    sku=fila['sku'],
+                    nombre=fila['nombre'],
+                    descripcion=fila.get('descripcion', ''),
+                    precio_venta=fila['precio_venta'],
+                    categoria_id=self.categorias[fila['categoria']],
+                    activo=fila.get('activo', True),
+                    # El stock del archivo solo cuenta para los productos nuevos
+                    stock=fila.get('stock', 0) if fila['sku'] not in existentes else 0,
+                    creado_por=self.usuario,
+                )
+                for fila in filas
+            ]
+            actualizar = [campo for campo in CAMPOS_ACTUALIZABLES if campo in campos] + ['actualizado_en']
+            Producto.objects.bulk_create(
+                productos, update_conflicts=True, unique_fields=self.unique_fields, update_fields=actualizar,
+            )
+            ids = dict(Producto.objects.filter(sku__in=skus).values_list('sku', 'id'))
+
+            registrar_movimientos([
+                MovimientoInventario(producto_id=ids[producto.sku], tipo='inicial', cantidad=producto.stock,
+                                     usuario=self.usuario, nota='importar_catalogo')
+                for producto in productos if producto.sku not in existentes and producto.stock
+            ])
+
+            if 'proveedores' in campos:
+                # Los proveedores de cada fila reemplazan a los que tenía el producto
+                enlace = Producto.proveedores.through
+                con_proveedores = [ids[fila['sku']] for fila in filas if 'proveedores' in fila]
+                enlace.objects.filter(producto_id__in=con_proveedores).delete()
+                enlace.objects.bulk_create([
+                    enlace(producto_id=ids[fila['sku']], proveedor_id=self.proveedores[empresa])
+                    for fila in filas
+                    for empresa in set(fila.get('proveedores', []))
+                ], batch_size=1000)
+
+        self.creados += len(filas) - len(existentes)
+        self.actualizados += len(existentes)
+
+    def terminar(self):
+        """bulk_create no dispara señales: se invalidan a mano el catálogo en memoria y el dashboard."""
+        invalidar_catalogo()
+        invalidar_contadores()
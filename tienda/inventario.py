@@ -0,0 +1,128 @@
+# tienda/inventario.py
+# ===================================================================
+# Kardex de inventario: entradas y salidas de stock como movimientos
+# de solo-agregar, más snapshots periódicos por producto para poder
+# consultar "el stock a la fecha X" sin recorrer todo el historial.
+# ===================================================================
+
+from django.db import transaction
+from django.db.models import F, Max, Sum
+from django.utils import timezone
+
+from .models import Producto, MovimientoInventario, SnapshotInventario
+
+
+def sincronizar_stock_guardado(producto):
+    """Marca el stock en memoria como ya registrado, para que la señal de Producto no lo tome como ajuste."""
+    producto._stock_guardado = producto.stock
+
+
+def registrar_movimientos(movimientos):
+    """Inserta varios movimientos con una sola consulta (bulk_create)."""
+    return MovimientoInventario.objects.bulk_create(movimientos)
+
+
+def movimientos_de_venta(venta, carrito, fecha=None):
+    """
+    Construye (sin guardar) los movimientos de salida de una venta a partir del carrito agrupado.
+    `fecha` es la del movimiento (por defecto la de la venta); nunca debe quedar antes de un
+    snapshot ya compactado, porque stock_al no lo contaría.
+    """
+    return [
+        MovimientoInventario(
+            producto=producto,
+            tipo='venta',
+            cantidad=-cantidad,
+            fecha=fecha or venta.fecha_venta,
+            venta=venta,
+            usuario=venta.vendido_por,
+        )
+        for producto, cantidad in carrito.values()
+    ]
+
+
+def reabastecer(producto, cantidad, usuario=None, nota=''):
+    """Suma `cantidad` al stock del producto y deja el movimiento en el kardex."""
+    if cantidad <= 0:
+        raise ValueError('La cantidad a reabastecer debe ser positiva.')
+    with transaction.atomic():
+        Producto.objects.filter(pk=producto.pk).update(stock=F('stock') + cantidad)
+        movimiento = MovimientoInventario.objects.create(
+            producto=producto, tipo='reabastecimiento', cantidad=cantidad, usuario=usuario, nota=nota
+        )
+    producto.stock += cantidad
+    sincronizar_stock_guardado(producto)
+    return movimiento
+
+
+def ajustar_stock(producto, stock_real, usuario=None, nota=''):
+    """
+    Fija el stock del producto al valor contado físicamente y registra la diferencia
+    como ajuste. Devuelve el movimiento, o None si no había diferencia.
+    """
+    with transaction.atomic():
+        actual = Producto.objects.select_for_update().values_list('stock', flat=True).get(pk=producto.pk)
+        diferencia = stock_real - actual
+        movimiento = None
+        if diferencia:
+            Producto.objects.filter(pk=producto.pk).update(stock=stock_real)
+            movimiento = MovimientoInventario.objects.create(
+                producto=producto, tipo='ajuste', cantidad=diferencia, usuario=usuario, nota=nota
+            )
+    producto.stock = stock_real
+    sincronizar_stock_guardado(producto)
+    return movimiento
+
+
+# ============ CONSULTAS HISTÓRICAS ============
+def stock_al(producto, fecha):
+    """
+    Stock del producto al momento `fecha`: el último snapshot anterior o igual a
+    esa fecha más la suma de los movimientos posteriores al snapshot (hasta `fecha`).
+    Sin snapshot previo se suman todos los movimientos hasta `fecha`.
+    """
+    producto_id = getattr(producto, 'pk', producto)
+    snapshot = SnapshotInventario.objects.filter(
+        producto_id=producto_id, fecha__lte=fecha
+    ).order_by('-fecha').values('fecha', 'stock').first()
+
+    movimientos = MovimientoInventario.objects.filter(producto_id=producto_id, fecha__lte=fecha)
+    base = 0
+    if snapshot:
+        movimientos = movimientos.filter(fecha__gt=snapshot['fecha'])
+        base = snapshot['stock']
+    delta = movimientos.aggregate(total=Sum('cantidad'))['total'] or 0
+    return base + delta
+
+
+def compactar_inventario(corte=None):
+    """
+    Genera un snapshot por producto a la fecha `corte` (por defecto ahora), partiendo
+    del corte anterior y sumando solo los movimientos ocurridos desde entonces.
+    Devuelve el número de snapshots creados.
+    """
+    corte = corte or timezone.now()
+    corte_anterior = SnapshotInventario.objects.filter(fecha__lt=corte).aggregate(
+        fecha=Max('fecha')
+    )['fecha']
+
+    stock = {}
+    movimientos = MovimientoInventario.objects.filter(fecha__lte=corte)
+    if corte_anterior is not None:
+        stock = dict(
+            SnapshotInventario.objects.filter(fecha=corte_anterior).values_list('producto_id', 'stock')
+        )
+        movimientos = movimientos.filter(fecha__gt=corte_anterior)
+
+    for producto_id, delta in movimientos.values('producto_id').annotate(
+        total=Sum('cantidad')
+    ).values_list('producto_id', 'total'):
+        stock[producto_id] = stock.get(producto_id, 0) + delta
+
+    with transaction.atomic():
+        SnapshotInventario.objects.filter(fecha=corte).delete()
+        SnapshotInventario.objects.bulk_create(
+            [SnapshotInventario(producto_id=pk, fecha=corte, stock=valor) for pk, valor in stock.items()],
+            batch_size=1000,
+        )
+    return len(stock)
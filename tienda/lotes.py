@@ -0,0 +1,262 @@
+# tienda/lotes.py
+# ===================================================================
+# Registro de ventas en lote: las sucursales que trabajaron sin
+# conexión suben cientos de tickets de una vez (JSON o JSONL).
+# Todo el lote se procesa en una transacción con un número fijo de
+# consultas: un bloqueo de productos, un UPDATE de stock agregado por
+# producto e inserciones masivas de ventas, detalles y kardex. Cada
+# ticket se acepta o se rechaza por separado, y el folio impide
+# registrar dos veces el mismo ticket si el lote se reenvía.
+# ===================================================================
+
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+
+from .models import Cliente, DetalleVenta, Producto, Venta
+from .inventario import movimientos_de_venta, registrar_movimientos, sincronizar_stock_guardado
+from .reportes import acumular_ventas
+from .ventas import VentaError, stock_reservado
+
+# Máximo de tickets por lote (petición o bloque del comando)
+MAX_TICKETS_POR_LOTE = getattr(settings, 'TIENDA_MAX_TICKETS_LOTE', 500)
+
+REGISTRADA, DUPLICADA, RECHAZADA = 'registrada', 'duplicada', 'rechazada'
+
+
+def leer_tickets(contenido, jsonl=False):
+    """
+    Convierte el cuerpo recibido en una lista de tickets (dicts). Acepta un arreglo JSON,
+    un objeto {"tickets": [...]} o JSONL (un ticket por línea). Lanza VentaError si no se puede leer.
+    """
+    try:
+        if isinstance(contenido, bytes):
+            contenido = contenido.decode('utf-8')  # UnicodeDecodeError es un ValueError
+        if jsonl:
+            tickets = [json.loads(linea) for linea in contenido.splitlines() if linea.strip()]
+        else:
+            tickets = json.loads(contenido)
+            if isinstance(tickets, dict):
+                tickets = tickets.get('tickets')
+    except ValueError as e:
+        raise VentaError(f'El lote no es JSON válido: {e}')
+    if not isinstance(tickets, list) or not all(isinstance(ticket, dict) for ticket in tickets):
+        raise VentaError('El lote debe ser una lista de tickets.')
+    return tickets
+
+
+def _leer_ticket(crudo, ahora):
+    """Valida la forma de un ticket y devuelve (folio, fecha, cliente_id, [(producto_id, cantidad)])."""
+    folio = str(crudo.get('ticket') or '').strip()
+    if not folio or len(folio) > 64:
+        raise VentaError('Cada ticket necesita un identificador "ticket" de hasta 64 caracteres.')
+
+    fecha = ahora
+    if crudo.get('fecha'):
+        try:
+            fecha = datetime.fromisoformat(str(crudo['fecha']))
+        except ValueError:
+            raise VentaError('La fecha debe estar en formato ISO 8601.')
+        if timezone.is_naive(fecha):
+            fecha = timezone.make_aware(fecha)
+        if fecha > ahora:
+            raise VentaError('La fecha del ticket está en el futuro.')
+
+    cliente_id = crudo.get('cliente')
+    lineas = []
+    try:
+        if cliente_id is not None:
+            cliente_id = int(cliente_id)
+        for linea in crudo.get('lineas') or []:
+            lineas.append((int(linea['producto']), int(linea['cantidad'])))
+    except (KeyError, TypeError, ValueError):
+        raise VentaError('Cada línea necesita "producto" y "cantidad" numéricos.')
+    if not lineas:
+        raise VentaError('La venta debe incluir al menos un producto.')
+    if any(cantidad <= 0 for _, cantidad in lineas):
+        raise VentaError('Las cantidades deben ser positivas.')
+    return folio, fecha, cliente_id, lineas
+
+
+def _agrupar(lineas, productos):
+    """Carrito {producto_id: [producto, cantidad]} de un ticket; valida productos y precios."""
+    carrito = {}
+    for producto_id, cantidad in lineas:
+        producto = productos.get(producto_id)
+        if producto is None:
+            raise VentaError(f'El producto {producto_id} no existe.')
+        if not producto.activo:
+            raise VentaError(f'El producto {producto.nombre} no está activo.')
+        if producto.precio_venta is None:
+            raise VentaError(f'El producto {producto.nombre} no tiene precio de venta.')
+        if producto_id in carrito:
+            carrito[producto_id][1] += cantidad
+        else:
+            carrito[producto_id] = [producto, cantidad]
+    return carrito
+
+
+def registrar_lote(tickets, vendedor=None):
+    """
+    Registra una lista de tickets (dicts con "ticket", "fecha" opcional, "cliente" opcional
+    y "lineas": [{"producto": id, "cantidad": n}]) y devuelve un resultado por ticket, en
+    el mismo orden: {"ticket", "estado", "venta", "total", "error"}.
+
+    Los tickets se atienden en orden contra el stock libre; uno sin stock suficiente se
+    rechaza sin afectar a los demás. Los folios ya registrados (en la base o antes en el
+    mismo lote) se devuelven como duplicados con la venta original.
+    """
+    if len(tickets) > MAX_TICKETS_POR_LOTE:
+        raise VentaError(f'El lote excede el máximo de {MAX_TICKETS_POR_LOTE} tickets.')
+
+    ahora = timezone.now()
+    resultados = []
+    leidos = []  # (resultado, folio, fecha, cliente_id, lineas)
+    for crudo in tickets:
+        resultado = {'ticket': crudo.get('ticket'), 'estado': RECHAZADA, 'venta': None, 'total': None, 'error': None}
+        resultados.append(resultado)
+        try:
+            leidos.append((resultado, *_leer_ticket(crudo, ahora)))
+        except VentaError as e:
+            resultado['error'] = str(e)
+
+    producto_ids = {producto_id for *_, lineas in leidos for producto_id, _ in lineas}
+    cliente_ids = {cliente_id for _, _, _, cliente_id, _ in leidos if cliente_id is not None}
+
+    with transaction.atomic():
+        existentes = dict(
+            Venta.objects.filter(folio__in=[folio for _, folio, *_ in leidos]).values_list('folio', 'id')
+        )
+        clientes = set(Cliente.objects.filter(pk__in=cliente_ids).values_list('pk', flat=True))
+        # Un solo SELECT ... FOR UPDATE para todo el lote, en orden de id como el cobro normal
+        productos = {
+            producto.pk: producto
+            for producto in Producto.objects.select_for_update().filter(pk__in=producto_ids).order_by('pk').only(
+                'id', 'nombre', 'stock', 'categoria', 'precio_venta', 'activo'
+            )
+        }
+        reservado = stock_reservado(productos)
+        disponible = {pk: producto.stock - reservado.get(pk, 0) for pk, producto in productos.items()}
+
+        aceptados = []  # (resultado, venta, carrito, detalles)
+        en_lote = {}  # folio -> resultado del ticket aceptado en este lote
+        repetidos = []  # (resultado, folio) de folios repetidos dentro del lote
+        for resultado, folio, fecha, cliente_id, lineas in leidos:
+            if folio in existentes:
+                resultado.update(estado=DUPLICADA, venta=existentes[folio])
+                continue
+            if folio in en_lote:
+                repetidos.append((resultado, folio))
+                continue
+            try:
+                if cliente_id is not None and cliente_id not in clientes:
+                    raise VentaError(f'El cliente {cliente_id} no existe.')
+                carrito = _agrupar(lineas, productos)
+                for producto_id, (producto, cantidad) in carrito.items():
+                    if disponible[producto_id] < cantidad:
+                        raise VentaError(
+                            f'Stock insuficiente para {producto.nombre} '
+                            f'(solicitado {cantidad}, disponible {max(disponible[producto_id], 0)}).'
+                        )
+            except VentaError as e:
+                resultado['error'] = str(e)
+                continue
+
+            en_lote[folio] = resultado
+            detalles = []
+            total = Decimal('0.00')
+            for producto_id, (producto, cantidad) in carrito.items():
+                disponible[producto_id] -= cantidad
+                subtotal = producto.precio_venta * cantidad
+                total += subtotal
+                detalles.append(DetalleVenta(
+                    producto=producto, cantidad=cantidad, precio_unitario=producto.precio_venta, subtotal=subtotal
+                ))
+            venta = Venta(folio=folio, fecha_venta=fecha, cliente_id=cliente_id, vendido_por=vendedor, total=total)
+            aceptados.append((resultado, venta, carrito, detalles))
+
+        while aceptados:
+            try:
+                # Punto de guardado: si otro envío del mismo lote registró un folio mientras se
+                # esperaban los bloqueos, el INSERT choca con el índice único y se deshace solo esto
+                with transaction.atomic():
+                    descuentos = _escribir_aceptados(aceptados, ahora)
+            except IntegrityError:
+                # Lectura con bloqueo: en REPEATABLE READ un SELECT normal seguiría viendo el snapshot
+                registrados = dict(Venta.objects.select_for_update().filter(
+                    folio__in=[venta.folio for _, venta, _, _ in aceptados]
+                ).values_list('folio', 'id'))
+                if not registrados:
+                    raise
+                pendientes = []
+                for aceptado in aceptados:
+                    resultado, venta, _, _ = aceptado
+                    if venta.folio in registrados:
+                        resultado.update(estado=DUPLICADA, venta=registrados[venta.folio])
+                    else:
+                        venta.pk = None  # el INSERT fallido pudo haberle asignado id
+                        pendientes.append(aceptado)
+                aceptados = pendientes
+                continue
+            for producto_id, cantidad in descuentos.items():
+                productos[producto_id].stock -= cantidad
+                sincronizar_stock_guardado(productos[producto_id])
+            break
+
+        for resultado, folio in repetidos:
+            resultado.update(estado=DUPLICADA, venta=en_lote[folio]['venta'])
+
+    return resultados
+
+
+def _escribir_aceptados(aceptados, ahora):
+    """
+    Descuenta el stock e inserta ventas, detalles, kardex y acumulado de los tickets aceptados.
+    Devuelve lo descontado por producto.
+    """
+    descuentos = {}
+    for _, _, carrito, _ in aceptados:
+        for producto_id, (_, cantidad) in carrito.items():
+            descuentos[producto_id] = descuentos.get(producto_id, 0) + cantidad
+    # Un único UPDATE con CASE descuenta el total del lote de cada producto
+    Producto.objects.filter(pk__in=list(descuentos)).update(stock=F('stock') - Case(
+        *[When(pk=pk, then=Value(cantidad)) for pk, cantidad in descuentos.items()],
+        output_field=IntegerField(),
+    ))
+
+    ventas = Venta.objects.bulk_create([venta for _, venta, _, _ in aceptados])
+    if any(venta.pk is None for venta in ventas):
+        # MySQL no devuelve los ids del INSERT masivo: se recuperan por folio
+        ids = dict(Venta.objects.filter(folio__in=[v.folio for v in ventas]).values_list('folio', 'id'))
+        for venta in ventas:
+            venta.pk = ids[venta.folio]
+
+    detalles = []
+    movimientos = []
+    for _, venta, carrito, detalles_venta in aceptados:
+        for detalle in detalles_venta:
+            detalle.venta = venta
+        detalles += detalles_venta
+        # El kardex registra la salida al recibir el lote; la hora del ticket queda en la venta.
+        # Con la fecha del ticket caería antes de un snapshot ya compactado y stock_al no la vería
+        movimientos += movimientos_de_venta(venta, carrito, fecha=ahora)
+    DetalleVenta.objects.bulk_create(detalles, batch_size=1000)
+    registrar_movimientos(movimientos)
+    acumular_ventas([(venta, detalles_venta) for _, venta, _, detalles_venta in aceptados])
+
+    for resultado, venta, _, _ in aceptados:
+        resultado.update(estado=REGISTRADA, venta=venta.pk, total=venta.total)
+    return descuentos
+
+
+def resumen_lote(resultados):
+    """Cuenta los resultados por estado: {'registrada': n, 'duplicada': n, 'rechazada': n}."""
+    resumen = {REGISTRADA: 0, DUPLICADA: 0, RECHAZADA: 0}
+    for resultado in resultados:
+        resumen[resultado['estado']] += 1
+    return resumen
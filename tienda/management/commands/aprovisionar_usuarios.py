@@ -0,0 +1,59 @@
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.aprovisionamiento import TAMANO_BLOQUE_USUARIOS, Aprovisionador, RegistroInvalido, normalizar_registro
+from tienda.importacion import leer_filas
+
+
+class Command(BaseCommand):
+    help = (
+        'Da de alta usuarios en bloque desde un padrón CSV o JSONL, hasheando las contraseñas en paralelo. '
+        'Columnas: username, rol (vendedor, gerente, administrador o cliente) y opcionales password, email, '
+        'first_name, last_name, telefono y departamento. Los usuarios existentes se conservan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .jsonl.')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Por defecto se deduce de la extensión.')
+        parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE_USUARIOS, help='Usuarios por transacción.')
+        parser.add_argument('--procesos', type=int, help='Procesos para hashear contraseñas; por defecto, uno por CPU.')
+
+    def handle(self, *args, **options):
+        ruta = Path(options['archivo'])
+        if not ruta.is_file():
+            raise CommandError(f'No existe el archivo {ruta}.')
+        formato = options['formato'] or ('csv' if ruta.suffix.lower() == '.csv' else 'jsonl')
+        if options['bloque'] < 1 or (options['procesos'] is not None and options['procesos'] < 1):
+            raise CommandError('--bloque y --procesos deben ser mayores que cero.')
+
+        omitidos = 0
+        inicio = time.monotonic()
+        with Aprovisionador(procesos=options['procesos']) as aprovisionador, \
+                ruta.open(encoding='utf-8', newline='') as archivo:
+            numeradas = enumerate(leer_filas(archivo, formato), start=2 if formato == 'csv' else 1)
+            while True:
+                crudas = list(islice(numeradas, options['bloque']))
+                if not crudas:
+                    break
+                bloque = []
+                for numero, fila in crudas:
+                    try:
+                        bloque.append(normalizar_registro(fila))
+                    except RegistroInvalido as e:
+                        omitidos += 1
+                        self.stderr.write(f'Línea {numero} omitida: {e}')
+                for error in aprovisionador.aprovisionar_bloque(bloque):
+                    omitidos += 1
+                    self.stderr.write(f'Registro omitido: {error}')
+                procesados = aprovisionador.creados + aprovisionador.existentes
+                self.stdout.write(f'{procesados} usuarios ({procesados / max(time.monotonic() - inicio, 1e-6):.0f}/s)')
+            aprovisionador.terminar()
+
+        segundos = max(time.monotonic() - inicio, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'{aprovisionador.creados} usuarios creados, {aprovisionador.existentes} existentes, {omitidos} omitidos '
+            f'en {segundos:.1f} s.'
+        ))
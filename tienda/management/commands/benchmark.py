@@ -0,0 +1,102 @@
+import json
+import platform
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from tienda.benchmarks import ESCALAS, ESCENARIOS, TOLERANCIA, comparar, ejecutar, generar_escala, preparar_contexto, urls_sin_escenario
+from tienda.routers import ALIAS_REPLICA, replica_configurada
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia (p50/p90/p99) y consultas de cada vista de la tienda contra un conjunto sintético '
+        'de 1k, 100k o 1M ventas, en una base de datos aparte. Guarda el resultado en JSON (--salida) '
+        'y lo compara contra una línea base (--comparar); con regresiones termina con error.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--escala', nargs='+', choices=list(ESCALAS), default=['1k'])
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--solo', nargs='+', metavar='ESCENARIO', help='Medir solo estos escenarios.')
+        parser.add_argument('--salida', help='Archivo JSON donde guardar los resultados.')
+        parser.add_argument('--comparar', help='Línea base JSON contra la que se comparan los resultados.')
+        parser.add_argument('--tolerancia', type=float, default=TOLERANCIA,
+                            help='Aumento relativo de latencia tolerado (0.25 = 25%%).')
+        parser.add_argument('--mantener', action='store_true',
+                            help='Conserva la base de benchmark y sus datos para la siguiente corrida (las ventas '
+                                 'registradas por los escenarios se acumulan).')
+
+    def handle(self, *args, **options):
+        escenarios = ESCENARIOS
+        if options['solo']:
+            escenarios = [escenario for escenario in ESCENARIOS if escenario.nombre in options['solo']]
+            desconocidos = set(options['solo']) - {escenario.nombre for escenario in escenarios}
+            if desconocidos:
+                raise CommandError(f'Escenarios desconocidos: {", ".join(sorted(desconocidos))}.')
+        if options['repeticiones'] < 1:
+            raise CommandError('--repeticiones debe ser mayor que cero.')
+        base = None
+        if options['comparar']:
+            try:
+                base = json.loads(Path(options['comparar']).read_text(encoding='utf-8'))['escalas']
+            except (OSError, ValueError, KeyError) as e:
+                raise CommandError(f'No se pudo leer la línea base: {e}')
+        for nombre in urls_sin_escenario():
+            self.stderr.write(f'Aviso: la URL "{nombre}" no tiene escenario de benchmark.')
+
+        resultados = {}
+        setup_test_environment()
+        try:
+            for escala in options['escala']:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'Escala {escala}'))
+                resultados[escala] = self.medir_escala(escala, escenarios, options)
+        finally:
+            teardown_test_environment()
+
+        documento = {
+            'fecha': timezone.now().isoformat(),
+            'motor': connection.vendor,
+            'python': platform.python_version(),
+            'repeticiones': options['repeticiones'],
+            'escalas': resultados,
+        }
+        if options['salida']:
+            Path(options['salida']).write_text(json.dumps(documento, indent=2, ensure_ascii=False), encoding='utf-8')
+            self.stdout.write(f'Resultados guardados en {options["salida"]}.')
+
+        if base is not None:
+            regresiones = comparar(base, resultados, tolerancia=options['tolerancia'])
+            for regresion in regresiones:
+                self.stderr.write(f'REGRESIÓN {regresion}')
+            if regresiones:
+                raise CommandError(f'{len(regresiones)} regresiones contra {options["comparar"]}.')
+            self.stdout.write(self.style.SUCCESS('Sin regresiones contra la línea base.'))
+
+    def medir_escala(self, escala, escenarios, options):
+        """Crea (o reutiliza) la base de la escala, genera los datos y mide los escenarios."""
+        ajustes = connection.settings_dict
+        nombre_original = ajustes['NAME']
+        # Una base por escala, aparte de la de trabajo; en SQLite es un archivo junto al original
+        ajustes['TEST'] = {**ajustes.get('TEST', {}), 'NAME': f'{nombre_original}_benchmark_{escala}'}
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['mantener'], serialize=False)
+        # Si hay réplica, durante la medición apunta a la misma base de benchmark
+        replica = connections[ALIAS_REPLICA] if replica_configurada() else None
+        if replica is not None:
+            ajustes_replica = replica.settings_dict
+            replica.close()
+            replica.creation.set_as_test_mirror(connection.settings_dict)
+        try:
+            generar_escala(escala, progreso=lambda mensaje: self.stdout.write(f'  {mensaje}'))
+            contexto = preparar_contexto()
+            medicion = ejecutar(contexto, escenarios, options['repeticiones'],
+                                progreso=lambda mensaje: self.stdout.write(f'  {mensaje}'))
+            return {'ventas': ESCALAS[escala], 'escenarios': medicion}
+        finally:
+            if replica is not None:
+                replica.close()
+                replica.settings_dict = ajustes_replica
+            connection.creation.destroy_test_db(nombre_original, verbosity=0, keepdb=options['mantener'])
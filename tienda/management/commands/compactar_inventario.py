@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from tienda.inventario import compactar_inventario
+
+
+class Command(BaseCommand):
+    help = 'Genera snapshots de stock por producto para acelerar las consultas de stock histórico.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--corte',
+            help='Fecha y hora de corte (YYYY-MM-DD o "YYYY-MM-DD HH:MM"). Por defecto, ahora.',
+        )
+
+    def handle(self, *args, **options):
+        corte = None
+        if options['corte']:
+            for formato in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+                try:
+                    corte = timezone.make_aware(datetime.strptime(options['corte'], formato))
+                    break
+                except ValueError:
+                    continue
+            else:
+                raise CommandError('Formato de --corte inválido.')
+
+        creados = compactar_inventario(corte)
+        self.stdout.write(self.style.SUCCESS(f'{creados} snapshots de inventario generados.'))
@@ -0,0 +1,44 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.datos_sinteticos import VOLUMENES_BASE, GeneradorDatos, volumenes
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera un conjunto de datos sintético y determinista (misma semilla y misma fecha final, mismos datos) '
+        'para pruebas de carga y benchmarks: catálogo, clientes, vendedores y ventas con estacionalidad. '
+        f'Con --escala 1: {", ".join(f"{valor} {nombre}" for nombre, valor in VOLUMENES_BASE.items())}.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--semilla', type=int, default=1)
+        parser.add_argument('--escala', type=float, default=1.0, help='Multiplica todos los volúmenes base.')
+        for nombre in VOLUMENES_BASE:
+            parser.add_argument(f'--{nombre}', type=int, help=f'Número exacto de {nombre} (ignora --escala).')
+        parser.add_argument('--dias', type=int, default=365, help='Días del periodo de ventas.')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Último día del periodo (AAAA-MM-DD); por defecto hoy.')
+
+    def handle(self, *args, **options):
+        if options['escala'] <= 0 or options['dias'] < 1:
+            raise CommandError('--escala y --dias deben ser mayores que cero.')
+        cantidades = volumenes(options['escala'], **{nombre: options[nombre] for nombre in VOLUMENES_BASE})
+        if any(valor < 1 for valor in cantidades.values()):
+            raise CommandError('Todos los volúmenes deben ser mayores que cero.')
+
+        generador = GeneradorDatos(
+            semilla=options['semilla'], dias=options['dias'], hasta=options['hasta'],
+            progreso=lambda mensaje: self.stdout.write(f'  {mensaje}'),
+        )
+        if generador.ya_generado():
+            raise CommandError(f'Ya existen datos generados con la semilla {options["semilla"]}.')
+
+        inicio = time.monotonic()
+        generador.generar(cantidades)
+        segundos = max(time.monotonic() - inicio, 1e-6)
+        self.stdout.write(self.style.SUCCESS(
+            f'Datos generados (semilla {options["semilla"]}, {generador.desde} a {generador.hasta}) en {segundos:.1f} s '
+            f'({cantidades["ventas"] / segundos:.0f} ventas/s).'
+        ))
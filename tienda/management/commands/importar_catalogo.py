@@ -0,0 +1,64 @@
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.importacion import TAMANO_BLOQUE_IMPORTACION, FilaInvalida, ImportadorCatalogo, leer_filas, normalizar_fila
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa o actualiza el catálogo de productos desde un CSV o JSONL (upsert por sku). '
+        'Columnas: sku, nombre, categoria, precio_venta y opcionales descripcion, activo, '
+        'stock (solo productos nuevos) y proveedores (empresas separadas por "|").'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo .csv o .jsonl.')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], help='Por defecto se deduce de la extensión.')
+        parser.add_argument('--bloque', type=int, default=TAMANO_BLOQUE_IMPORTACION, help='Filas por transacción.')
+        parser.add_argument('--usuario', help='Usuario que queda como creador de los productos nuevos.')
+
+    def handle(self, *args, **options):
+        ruta = Path(options['archivo'])
+        if not ruta.is_file():
+            raise CommandError(f'No existe el archivo {ruta}.')
+        formato = options['formato'] or ('csv' if ruta.suffix.lower() == '.csv' else 'jsonl')
+        if options['bloque'] < 1:
+            raise CommandError('--bloque debe ser mayor que cero.')
+
+        usuario = None
+        if options['usuario']:
+            usuario = User.objects.filter(username=options['usuario']).first()
+            if usuario is None:
+                raise CommandError(f'No existe el usuario {options["usuario"]}.')
+
+        importador = ImportadorCatalogo(usuario=usuario)
+        omitidas = 0
+        inicio = time.monotonic()
+        with ruta.open(encoding='utf-8', newline='') as archivo:
+            numeradas = enumerate(leer_filas(archivo, formato), start=2 if formato == 'csv' else 1)
+            while True:
+                crudas = list(islice(numeradas, options['bloque']))
+                if not crudas:
+                    break
+                bloque = []
+                for numero, fila in crudas:
+                    try:
+                        bloque.append(normalizar_fila(fila))
+                    except FilaInvalida as e:
+                        omitidas += 1
+                        self.stderr.write(f'Línea {numero} omitida: {e}')
+                importador.importar_bloque(bloque)
+                procesadas = importador.creados + importador.actualizados
+                self.stdout.write(f'{procesadas} filas ({procesadas / max(time.monotonic() - inicio, 1e-6):.0f} filas/s)')
+        importador.terminar()
+
+        segundos = max(time.monotonic() - inicio, 1e-6)
+        procesadas = importador.creados + importador.actualizados
+        self.stdout.write(self.style.SUCCESS(
+            f'{importador.creados} productos creados, {importador.actualizados} actualizados, {omitidas} omitidos '
+            f'en {segundos:.1f} s ({procesadas / segundos:.0f} filas/s).'
+        ))
@@ -0,0 +1,52 @@
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.lotes import MAX_TICKETS_POR_LOTE, RECHAZADA, leer_tickets, registrar_lote, resumen_lote
+from tienda.ventas import VentaError
+
+
+class Command(BaseCommand):
+    help = 'Registra las ventas de un archivo de tickets (JSON o JSONL) exportado por una sucursal.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Archivo .json (arreglo de tickets) o .jsonl (un ticket por línea).')
+        parser.add_argument('--vendedor', help='Usuario al que se atribuyen las ventas.')
+        parser.add_argument(
+            '--lote', type=int, default=MAX_TICKETS_POR_LOTE,
+            help=f'Tickets por transacción (máximo {MAX_TICKETS_POR_LOTE}).',
+        )
+
+    def handle(self, *args, **options):
+        ruta = Path(options['archivo'])
+        if not ruta.is_file():
+            raise CommandError(f'No existe el archivo {ruta}.')
+        tamano = options['lote']
+        if not 0 < tamano <= MAX_TICKETS_POR_LOTE:
+            raise CommandError(f'--lote debe estar entre 1 y {MAX_TICKETS_POR_LOTE}.')
+
+        vendedor = None
+        if options['vendedor']:
+            vendedor = User.objects.filter(username=options['vendedor']).first()
+            if vendedor is None:
+                raise CommandError(f'No existe el usuario {options["vendedor"]}.')
+
+        try:
+            tickets = leer_tickets(ruta.read_bytes(), jsonl=ruta.suffix.lower() in ('.jsonl', '.ndjson'))
+        except VentaError as e:
+            raise CommandError(str(e))
+
+        totales = resumen_lote([])
+        for inicio in range(0, len(tickets), tamano):
+            resultados = registrar_lote(tickets[inicio:inicio + tamano], vendedor=vendedor)
+            for estado, cantidad in resumen_lote(resultados).items():
+                totales[estado] += cantidad
+            for resultado in resultados:
+                if resultado['estado'] == RECHAZADA:
+                    self.stderr.write(f'Ticket {resultado["ticket"]} rechazado: {resultado["error"]}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{totales["registrada"]} ventas registradas, {totales["duplicada"]} duplicadas, '
+            f'{totales["rechazada"]} rechazadas.'
+        ))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from tienda.sincronizacion import limpiar_registros_eliminados
+from tienda.ventas import limpiar_claves_vencidas, limpiar_reservas_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Borra reservas de stock, claves de idempotencia y bajas de sincronización caducadas (pensado para cron).'
+
+    def handle(self, *args, **options):
+        reservas = limpiar_reservas_vencidas()
+        claves = limpiar_claves_vencidas()
+        bajas = limpiar_registros_eliminados()
+        self.stdout.write(self.style.SUCCESS(
+            f'{reservas} reservas, {claves} claves de idempotencia y {bajas} bajas de sincronización eliminadas.'
+        ))
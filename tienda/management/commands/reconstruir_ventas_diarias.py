@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tienda.reportes import reconstruir_ventas_diarias
+
+
+class Command(BaseCommand):
+    help = 'Regenera el acumulado diario de ventas (VentaDiaria) a partir de Venta y DetalleVenta.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Primer día a reconstruir (YYYY-MM-DD).')
+        parser.add_argument('--hasta', help='Último día a reconstruir (YYYY-MM-DD).')
+
+    def handle(self, *args, **options):
+        try:
+            desde, hasta = (
+                datetime.strptime(options[campo], '%Y-%m-%d').date() if options[campo] else None
+                for campo in ('desde', 'hasta')
+            )
+        except ValueError:
+            raise CommandError('Las fechas deben tener el formato YYYY-MM-DD.')
+
+        filas = reconstruir_ventas_diarias(desde, hasta)
+        self.stdout.write(self.style.SUCCESS(f'{filas} filas de VentaDiaria generadas.'))
@@ -0,0 +1,281 @@
+# tienda/middleware.py
+import json
+import logging
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from .models import PerfilUsuario, Cliente
+from .perfilador import perfilar, solicita_perfil
+from .routers import CLAVE_SESION_PRIMARIA, VISTAS_REPLICA, estado_actual, estado_de_peticion, replica_disponible
+
+# Roles de empleado (PerfilUsuario.ROLES) más el rol de los clientes con cuenta
+ROL_CLIENTE = 'cliente'
+
+
+def _clave_version_rol(user_id):
+    return f'tienda:rol_version:{user_id}'
+
+
+def _duracion_version_rol():
+    # Finita: si una invalidación se pierde, el rol viejo dura a lo sumo este tiempo
+    return getattr(settings, 'TIENDA_ROL_VERSION_SEGUNDOS', 300)
+
+
+def invalidar_rol(user_id):
+    """Cambia el sello de versión del rol del usuario; su sesión lo volverá a resolver."""
+    if user_id:
+        cache.set(_clave_version_rol(user_id), uuid.uuid4().hex, _duracion_version_rol())
+
+
+def resolver_rol(user):
+    """Rol del usuario: el de su PerfilUsuario, 'cliente' si tiene Cliente asociado, o None."""
+    if not user.is_authenticated:
+        return None
+    rol = PerfilUsuario.objects.filter(user_id=user.pk).values_list('rol', flat=True).first()
+    if rol is None and Cliente.objects.filter(usuario_id=user.pk).exists():
+        rol = ROL_CLIENTE
+    return rol
+
+
+class RolMiddleware:
+    """
+    Resuelve el rol del usuario una sola vez y lo guarda en la sesión junto con un sello
+    de versión. Mientras el sello en caché no cambie (las señales de PerfilUsuario y Cliente
+    lo renuevan) ni caduque, las siguientes peticiones leen `request.rol` sin consultar la
+    base. El caché debe ser compartido entre workers (ver tienda.checks).
+    Con DatabaseCache leer el sello también es una consulta: las lecturas (GET/HEAD) confían
+    en la sesión durante TIENDA_ROL_REVISION_SEGUNDOS sin mirar el caché; las escrituras
+    siempre comparan el sello, así que un rol retirado no puede volver a escribir.
+    Debe ir después de SessionMiddleware y AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.rol = self.rol_de_la_peticion(request)
+        return self.get_response(request)
+
+    def rol_de_la_peticion(self, request):
+        user = request.user
+        if not user.is_authenticated:
+            return None
+
+        sesion = request.session
+        ahora = time.time()
+        propia = sesion.get('rol_usuario') == user.pk
+        if propia and request.method in ('GET', 'HEAD') and ahora < sesion.get('rol_revisar_en', 0):
+            return sesion.get('rol')
+
+        clave = _clave_version_rol(user.pk)
+        version = cache.get(clave)
+        if version is None:
+            version = uuid.uuid4().hex
+            cache.set(clave, version, _duracion_version_rol())
+
+        revisar_en = ahora + getattr(settings, 'TIENDA_ROL_REVISION_SEGUNDOS', 15)
+        if propia and sesion.get('rol_version') == version:
+            sesion['rol_revisar_en'] = revisar_en
+            return sesion.get('rol')
+
+        rol = resolver_rol(user)
+        sesion['rol'] = rol
+        sesion['rol_usuario'] = user.pk
+        sesion['rol_version'] = version
+        sesion['rol_revisar_en'] = revisar_en
+        return rol
+
+
+# ============ MEDICIÓN POR PETICIÓN ============
+logger_rendimiento = logging.getLogger('tienda.rendimiento')
+
+# Máximo de consultas SQL por vista (nombre de la URL); se sobreescribe con TIENDA_PRESUPUESTO_CONSULTAS.
+# Incluyen las de sesión y autenticación, las del caché en base (DatabaseCache) y el caso con
+# cachés frías (rol y contadores sin calcular).
+PRESUPUESTO_CONSULTAS = {
+    'home': 20,
+    'dashboard': 12,
+    'producto_lista': 14,
+    'producto_buscar': 12,
+    'producto_autocompletar': 8,
+    'cliente_buscar': 8,
+    'sincronizar_catalogo': 12,
+    'registrar_venta': 30,
+    'registrar_ventas_lote': 25,
+    'reporte_ventas': 12,
+}
+
+_medicion_actual = ContextVar('medicion_actual', default=None)
+_SENTENCIAS_SAVEPOINT = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+
+
+def _tablas_de_cache():
+    """Tablas de los cachés DatabaseCache, para reportar aparte las consultas que les tocan."""
+    return tuple(
+        ajustes['LOCATION'] for ajustes in settings.CACHES.values()
+        if ajustes.get('BACKEND') == 'django.core.cache.backends.db.DatabaseCache'
+    )
+
+
+class PresupuestoExcedido(AssertionError):
+    """Una vista hizo más consultas que su presupuesto (solo con TIENDA_PRESUPUESTO_ESTRICTO)."""
+
+
+class Medicion:
+    """
+    Acumuladores de una petición: consultas y segundos en la base y en plantillas.
+    Los SAVEPOINT de los atomic() anidados se cronometran pero no cuentan como consultas:
+    dependen de la transacción que envuelve la petición (en las pruebas, la de TestCase).
+    `consultas` incluye las del caché en base (DatabaseCache), que además se reportan aparte
+    en `consultas_cache`: son viajes a la base como cualquier otro y con Redis desaparecen.
+    """
+    __slots__ = ('consultas', 'consultas_cache', 'tablas_cache', 'tiempo_db', 'tiempo_plantillas', 'en_plantilla')
+
+    def __init__(self, tablas_cache=()):
+        self.consultas = 0
+        self.consultas_cache = 0
+        self.tablas_cache = tablas_cache
+        self.tiempo_db = 0.0
+        self.tiempo_plantillas = 0.0
+        self.en_plantilla = False
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper de cada conexión
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.tiempo_db += time.perf_counter() - inicio
+            if not sql.startswith(_SENTENCIAS_SAVEPOINT):
+                self.consultas += 1
+                if self.tablas_cache and any(tabla in sql for tabla in self.tablas_cache):
+                    self.consultas_cache += 1
+
+
+@contextmanager
+def medir_plantilla():
+    """
+    Cronometra un render de plantilla dentro de la petición medida (lo usa el backend
+    tienda.plantillas.DjangoTemplatesMedidas). Un render anidado cuenta dentro del principal.
+    """
+    medicion = _medicion_actual.get()
+    if medicion is None or medicion.en_plantilla:
+        yield
+        return
+    medicion.en_plantilla = True
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        medicion.tiempo_plantillas += time.perf_counter() - inicio
+        medicion.en_plantilla = False
+
+
+class MedicionMiddleware:
+    """
+    Mide cada petición: número de consultas SQL y tiempo en la base, tiempo de render de
+    plantillas (con el backend tienda.plantillas.DjangoTemplatesMedidas) y tiempo total de la vista (incluye los anteriores y el resto del middleware).
+    - Escribe una línea JSON en el logger 'tienda.rendimiento' (nivel INFO).
+    - Agrega la cabecera Server-Timing si TIENDA_SERVER_TIMING (por defecto, con DEBUG).
+    - Compara las consultas con el presupuesto de la vista: si lo excede registra un WARNING,
+      o lanza PresupuestoExcedido si TIENDA_PRESUPUESTO_ESTRICTO (pensado para las pruebas).
+    Debe ir primero en MIDDLEWARE para abarcar las consultas de sesión y autenticación.
+    Las respuestas en streaming se miden hasta que empiezan a enviarse.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.tablas_cache = _tablas_de_cache()
+
+    def __call__(self, request):
+        medicion = Medicion(self.tablas_cache)
+        marca = _medicion_actual.set(medicion)
+        inicio = time.perf_counter()
+        try:
+            with ExitStack() as pila:
+                for alias in connections:
+                    pila.enter_context(connections[alias].execute_wrapper(medicion))
+                response = self.get_response(request)
+        finally:
+            _medicion_actual.reset(marca)
+        tiempo_vista = time.perf_counter() - inicio
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.url_name if coincidencia else None
+        registro = {
+            'vista': vista,
+            'metodo': request.method,
+            'ruta': request.path,
+            'estado': response.status_code,
+            'consultas': medicion.consultas,
+            'consultas_cache': medicion.consultas_cache,
+            'db_ms': round(medicion.tiempo_db * 1000, 2),
+            'plantillas_ms': round(medicion.tiempo_plantillas * 1000, 2),
+            'vista_ms': round(tiempo_vista * 1000, 2),
+        }
+        logger_rendimiento.info(json.dumps(registro))
+
+        if getattr(settings, 'TIENDA_SERVER_TIMING', settings.DEBUG):
+            response['Server-Timing'] = (
+                f'db;dur={registro["db_ms"]};desc="{medicion.consultas} consultas", '
+                f'plantillas;dur={registro["plantillas_ms"]}, vista;dur={registro["vista_ms"]}'
+            )
+
+        presupuesto = getattr(settings, 'TIENDA_PRESUPUESTO_CONSULTAS', PRESUPUESTO_CONSULTAS).get(vista)
+        if presupuesto is not None and medicion.consultas > presupuesto:
+            mensaje = f'La vista {vista} hizo {medicion.consultas} consultas (presupuesto {presupuesto}).'
+            if getattr(settings, 'TIENDA_PRESUPUESTO_ESTRICTO', False):
+                raise PresupuestoExcedido(mensaje)
+            logger_rendimiento.warning(json.dumps({**registro, 'presupuesto': presupuesto, 'mensaje': mensaje}))
+        return response
+
+
+class PerfiladorMiddleware:
+    """
+    Perfila bajo demanda la petición de un usuario staff (?perfilar=1 o cabecera X-Perfilar)
+    cuando TIENDA_PERFILADOR está activo; ver tienda.perfilador. Va al final de MIDDLEWARE
+    (después de AuthenticationMiddleware) para que el perfil sea el de la vista.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if solicita_perfil(request):
+            return perfilar(request, self.get_response)
+        return self.get_response(request)
+
+
+class ReplicaMiddleware:
+    """
+    Manda a la réplica de lectura las lecturas de las vistas de VISTAS_REPLICA (GET/HEAD),
+    salvo que la sesión haya escrito hace menos de TIENDA_REPLICA_RETRASO_SEGUNDOS; ver
+    tienda.routers. Debe ir después de SessionMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with estado_de_peticion() as estado:
+            response = self.get_response(request)
+        if estado.escribio and hasattr(request, 'session'):
+            # Lectura tras escritura: esta sesión lee de la primaria hasta que la réplica se ponga al día
+            request.session[CLAVE_SESION_PRIMARIA] = time.time() + getattr(settings, 'TIENDA_REPLICA_RETRASO_SEGUNDOS', 10)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or request.resolver_match.url_name not in VISTAS_REPLICA:
+            return None
+        sesion = getattr(request, 'session', None)
+        if sesion is not None and sesion.get(CLAVE_SESION_PRIMARIA, 0) > time.time():
+            return None
+        if replica_disponible():
+            estado_actual().usar_replica = True
+        return None
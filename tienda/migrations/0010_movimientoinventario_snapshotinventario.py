@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def registrar_inventario_inicial(apps, schema_editor):
+    """Abre el kardex con el stock actual de cada producto como movimiento 'inicial'."""
+    Producto = apps.get_model('tienda', 'Producto')
+    MovimientoInventario = apps.get_model('tienda', 'MovimientoInventario')
+    ahora = django.utils.timezone.now()
+    MovimientoInventario.objects.bulk_create(
+        [
+            MovimientoInventario(producto_id=pk, tipo='inicial', cantidad=stock, fecha=ahora)
+            for pk, stock in Producto.objects.exclude(stock=0).values_list('pk', 'stock').iterator()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0009_reservastock'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('inicial', 'Inventario inicial'), ('venta', 'Venta'), ('reabastecimiento', 'Reabastecimiento'), ('ajuste', 'Ajuste')], max_length=20)),
+                ('cantidad', models.IntegerField()),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('nota', models.CharField(blank=True, max_length=200)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='tienda.producto')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_inventario', to=settings.AUTH_USER_MODEL)),
+                ('venta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos', to='tienda.venta')),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Inventario',
+                'verbose_name_plural': 'Movimientos de Inventario',
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='tienda_movi_product_e675a5_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SnapshotInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.IntegerField()),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='tienda.producto')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de Inventario',
+                'verbose_name_plural': 'Snapshots de Inventario',
+                'unique_together': {('producto', 'fecha')},
+            },
+        ),
+        migrations.RunPython(registrar_inventario_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 03:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from tienda.reportes import filas_ventas_diarias
+
+
+def acumular_ventas_existentes(apps, schema_editor):
+    """Genera los acumulados diarios de las ventas ya registradas."""
+    Venta = apps.get_model('tienda', 'Venta')
+    DetalleVenta = apps.get_model('tienda', 'DetalleVenta')
+    VentaDiaria = apps.get_model('tienda', 'VentaDiaria')
+    filas = filas_ventas_diarias(Venta.objects.all(), DetalleVenta.objects.all(), VentaDiaria)
+    VentaDiaria.objects.bulk_create(filas, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0010_movimientoinventario_snapshotinventario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('num_ventas', models.IntegerField(default=0)),
+                ('unidades', models.IntegerField(default=0)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='ventas_diarias', to='tienda.categoria')),
+                ('vendedor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ventas_diarias', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Venta Diaria',
+                'verbose_name_plural': 'Ventas Diarias',
+                'indexes': [models.Index(fields=['fecha', 'categoria', 'vendedor'], name='tienda_vent_fecha_e9e094_idx')],
+            },
+        ),
+        migrations.RunPython(acumular_ventas_existentes, migrations.RunPython.noop),
+    ]
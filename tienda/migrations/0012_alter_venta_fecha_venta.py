@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0011_ventadiaria'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='venta',
+            name='fecha_venta',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+    ]
@@ -0,0 +1,76 @@
+from django.db import migrations
+
+
+# --- SQLite: tabla virtual FTS5 sincronizada con tienda_producto mediante triggers ---
+SQLITE_CREAR = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tienda_producto_fts USING fts5(
+        nombre, descripcion,
+        content='tienda_producto', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tienda_producto_fts_ai AFTER INSERT ON tienda_producto BEGIN
+        INSERT INTO tienda_producto_fts(rowid, nombre, descripcion)
+        VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tienda_producto_fts_ad AFTER DELETE ON tienda_producto BEGIN
+        INSERT INTO tienda_producto_fts(tienda_producto_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tienda_producto_fts_au AFTER UPDATE OF nombre, descripcion ON tienda_producto BEGIN
+        INSERT INTO tienda_producto_fts(tienda_producto_fts, rowid, nombre, descripcion)
+        VALUES ('delete', old.id, old.nombre, old.descripcion);
+        INSERT INTO tienda_producto_fts(rowid, nombre, descripcion)
+        VALUES (new.id, new.nombre, new.descripcion);
+    END
+    """,
+    "INSERT INTO tienda_producto_fts(tienda_producto_fts) VALUES ('rebuild')",
+]
+SQLITE_BORRAR = [
+    "DROP TRIGGER IF EXISTS tienda_producto_fts_ai",
+    "DROP TRIGGER IF EXISTS tienda_producto_fts_ad",
+    "DROP TRIGGER IF EXISTS tienda_producto_fts_au",
+    "DROP TABLE IF EXISTS tienda_producto_fts",
+]
+
+# --- MySQL: índice FULLTEXT de InnoDB ---
+MYSQL_CREAR = ["CREATE FULLTEXT INDEX tienda_producto_ft ON tienda_producto (nombre, descripcion)"]
+MYSQL_BORRAR = ["DROP INDEX tienda_producto_ft ON tienda_producto"]
+
+
+def _ejecutar(schema_editor, sentencias):
+    for sentencia in sentencias:
+        schema_editor.execute(sentencia)
+
+
+def crear_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_CREAR)
+    elif vendor == 'mysql':
+        _ejecutar(schema_editor, MYSQL_CREAR)
+
+
+def borrar_indice(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        _ejecutar(schema_editor, SQLITE_BORRAR)
+    elif vendor == 'mysql':
+        _ejecutar(schema_editor, MYSQL_BORRAR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0013_producto_indices'),
+    ]
+
+    operations = [
+        migrations.RunPython(crear_indice, borrar_indice),
+    ]
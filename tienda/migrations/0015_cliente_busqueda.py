@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from tienda.texto import clave_de_busqueda, trigramas
+
+
+def indexar_clientes_existentes(apps, schema_editor):
+    """Calcula la clave de búsqueda y los trigramas de los clientes ya registrados."""
+    Cliente = apps.get_model('tienda', 'Cliente')
+    ClienteTrigrama = apps.get_model('tienda', 'ClienteTrigrama')
+    filas = []
+    for cliente in Cliente.objects.only('id', 'nombre', 'apellido', 'email', 'telefono').iterator():
+        clave = clave_de_busqueda(cliente.nombre, cliente.apellido, cliente.email, cliente.telefono)
+        Cliente.objects.filter(pk=cliente.pk).update(clave_busqueda=clave)
+        filas += [ClienteTrigrama(cliente_id=cliente.pk, trigrama=t) for t in trigramas(clave.split())]
+        if len(filas) >= 5000:
+            ClienteTrigrama.objects.bulk_create(filas)
+            filas = []
+    ClienteTrigrama.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0014_producto_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='clave_busqueda',
+            field=models.CharField(blank=True, default='', editable=False, max_length=400),
+        ),
+        migrations.CreateModel(
+            name='ClienteTrigrama',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigrama', models.CharField(max_length=3)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigramas', to='tienda.cliente')),
+            ],
+            options={
+                'verbose_name': 'Trigrama de Cliente',
+                'verbose_name_plural': 'Trigramas de Clientes',
+                'indexes': [models.Index(fields=['trigrama', 'cliente'], name='tienda_clie_trigram_685a9e_idx')],
+                'unique_together': {('cliente', 'trigrama')},
+            },
+        ),
+        migrations.RunPython(indexar_clientes_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:14
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0015_cliente_busqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venta',
+            name='folio',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='fecha_venta',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:18
+
+from importlib import import_module
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+busqueda = import_module('tienda.migrations.0014_producto_busqueda')
+
+
+def recrear_triggers_fts(apps, schema_editor):
+    """
+    En SQLite, agregar una columna NOT NULL reconstruye tienda_producto y se pierden los
+    triggers que mantienen tienda_producto_fts (0014). Se vuelven a crear y se reindexa.
+    """
+    if schema_editor.connection.vendor == 'sqlite':
+        for sentencia in busqueda.SQLITE_CREAR:
+            schema_editor.execute(sentencia)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0017_claveidempotencia'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Al revertir, RemoveField también reconstruye la tabla: este paso corre al final
+        migrations.RunPython(migrations.RunPython.noop, recrear_triggers_fts),
+        migrations.CreateModel(
+            name='RegistroEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('producto', 'Producto'), ('categoria', 'Categoría'), ('proveedor', 'Proveedor')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('eliminado_en', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'verbose_name': 'Registro Eliminado',
+                'verbose_name_plural': 'Registros Eliminados',
+            },
+        ),
+        migrations.AddField(
+            model_name='categoria',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='proveedor',
+            name='actualizado_en',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='categoria',
+            index=models.Index(fields=['actualizado_en', 'id'], name='tienda_cate_actuali_3c0a68_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['actualizado_en', 'id'], name='tienda_prod_actuali_10015b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proveedor',
+            index=models.Index(fields=['actualizado_en', 'id'], name='tienda_prov_actuali_fc999f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='registroeliminado',
+            index=models.Index(fields=['eliminado_en', 'id'], name='tienda_regi_elimina_cfe3ba_idx'),
+        ),
+        migrations.RunPython(recrear_triggers_fts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:20
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+busqueda = import_module('tienda.migrations.0014_producto_busqueda')
+
+
+def recrear_triggers_fts(apps, schema_editor):
+    """Agregar una columna única reconstruye tienda_producto en SQLite: se recrean los triggers de 0014."""
+    if schema_editor.connection.vendor == 'sqlite':
+        for sentencia in busqueda.SQLITE_CREAR:
+            schema_editor.execute(sentencia)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tienda', '0018_sincronizacion_catalogo'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, recrear_triggers_fts),
+        migrations.AddField(
+            model_name='producto',
+            name='sku',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(recrear_triggers_fts, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,52 @@
 import os
+import threading
+from contextlib import contextmanager
 from django.db import models 
 from django.contrib.auth.models import User 
 from django.db.models import Sum # Importado para calcular el total
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from decimal import Decimal # Importado para manejar valores decimales
+from .texto import clave_de_busqueda
+
+
+# ============ TOTALES DE VENTA DIFERIDOS ============
+# Guarda, por hilo, el conjunto de ventas cuyo total hay que recalcular al cerrar el bloque.
+_estado_totales = threading.local()
+
+
+def _totales_en_diferido():
+    """Devuelve el conjunto de ventas pendientes si hay un bloque totales_diferidos() activo."""
+    return getattr(_estado_totales, 'pendientes', None)
+
+
+@contextmanager
+def totales_diferidos():
+    """
+    Agrupa el mantenimiento de Venta.total: dentro del bloque, Venta.save() y
+    DetalleVenta.save() no recalculan nada; al salir se recalcula una sola vez el
+    total de cada venta afectada con Venta.recalcular_totales().
+    Se puede anidar; solo el bloque exterior hace el recálculo.
+    Produce el conjunto de ids pendientes para marcar ventas a mano (p. ej. tras borrar detalles).
+
+        with totales_diferidos() as pendientes:
+            for detalle in detalles:
+                detalle.save()
+    """
+    pendientes = _totales_en_diferido()
+    if pendientes is not None:
+        yield pendientes
+        return
+
+    pendientes = set()
+    _estado_totales.pendientes = pendientes
+    try:
+        yield pendientes
+    finally:
+        _estado_totales.pendientes = None
+    # Solo se llega aquí si el bloque terminó sin excepción
+    Venta.recalcular_totales(pendientes)
 
 # ============ MODELO PERFIL DE USUARIO ============
 class PerfilUsuario(models.Model):
@@ -53,6 +97,7 @@ class Categoria(models.Model):
     nombre = models.CharField(max_length=100, unique=True)
     descripcion = models.TextField(blank=True, null=True)
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)  # Cursor de la sincronización de terminales
 
     def __str__(self):
         return self.nombre
@@ -61,6 +106,7 @@ class Categoria(models.Model):
         verbose_name = "Categoría"
         verbose_name_plural = "Categorías"
         ordering = ['nombre']
+        indexes = [models.Index(fields=['actualizado_en', 'id'])]
 
 # ============ MODELO PROVEEDOR ============
 class Proveedor(models.Model):
@@ -71,6 +117,7 @@ class Proveedor(models.Model):
     email = models.EmailField(max_length=191, unique=True, null=True, blank=True) 
     direccion = models.TextField(blank=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True)  # Cursor de la sincronización de terminales
     
     def __str__(self):
         return f"{self.nombre} - {self.empresa}" 
@@ -78,11 +125,14 @@ class Proveedor(models.Model):
     class Meta:
         verbose_name = "Proveedor"
         verbose_name_plural = "Proveedores"
+        indexes = [models.Index(fields=['actualizado_en', 'id'])]
         ordering = ['empresa']
 
 # ============ MODELO PRODUCTO ============
 class Producto(models.Model):
     """Artículo que se vende en la tienda."""
+    # Clave del producto en el catálogo del proveedor; importar_catalogo actualiza por esta clave
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     nombre = models.CharField(max_length=200)
     descripcion = models.TextField()
     precio_venta = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
@@ -92,13 +142,117 @@ class Producto(models.Model):
     creado_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='productos_creados') 
     fecha_creacion = models.DateTimeField(auto_now_add=True) 
     activo = models.BooleanField(default=True) 
+    # Cursor de la sincronización de terminales. Los UPDATE masivos de stock no lo tocan a propósito:
+    # las terminales no sincronizan stock
+    actualizado_en = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.nombre 
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instancia = super().from_db(db, field_names, values)
+        # Stock tal como se leyó de la base; las señales lo usan para registrar ajustes
+        instancia._stock_guardado = instancia.__dict__.get('stock')
+        return instancia
     
     class Meta:
         verbose_name = "Producto"
         verbose_name_plural = "Productos"
+        # Índices para ordenar la lista de productos sin recorrer todo el catálogo
+        indexes = [
+            models.Index(fields=['nombre', 'id']),
+            models.Index(fields=['precio_venta', 'id']),
+            models.Index(fields=['actualizado_en', 'id']),
+        ]
+
+
+# ============ BAJAS PARA LA SINCRONIZACIÓN ============
+class RegistroEliminado(models.Model):
+    """
+    Lápida (tombstone) de un producto, categoría o proveedor eliminado, para que las
+    terminales que sincronizan por cambios sepan que deben borrarlo. Se conservan
+    TIENDA_SYNC_RETENCION_DIAS; un cursor más viejo obliga a descargar el catálogo completo.
+    """
+    MODELOS = [
+        ('producto', 'Producto'),
+        ('categoria', 'Categoría'),
+        ('proveedor', 'Proveedor'),
+    ]
+    modelo = models.CharField(max_length=20, choices=MODELOS)
+    objeto_id = models.BigIntegerField()
+    eliminado_en = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.modelo} #{self.objeto_id} eliminado"
+
+    class Meta:
+        verbose_name = "Registro Eliminado"
+        verbose_name_plural = "Registros Eliminados"
+        indexes = [models.Index(fields=['eliminado_en', 'id'])]
+
+
+# ============ MODELO RESERVA DE STOCK ============
+class ReservaStock(models.Model):
+    """Apartado temporal de stock mientras un cobro está en curso. Caduca sola en `expira_en`."""
+    token = models.CharField(max_length=32, db_index=True)
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='reservas')
+    cantidad = models.PositiveIntegerField()
+    creada_en = models.DateTimeField(auto_now_add=True)
+    expira_en = models.DateTimeField()
+
+    def __str__(self):
+        return f"Reserva {self.token}: {self.cantidad} x {self.producto_id}"
+
+    class Meta:
+        verbose_name = "Reserva de Stock"
+        verbose_name_plural = "Reservas de Stock"
+        indexes = [models.Index(fields=['producto', 'expira_en'])]
+
+
+# ============ KARDEX: MOVIMIENTOS DE INVENTARIO ============
+class MovimientoInventario(models.Model):
+    """
+    Registro de solo-agregar (append-only) de cada entrada o salida de stock.
+    `cantidad` lleva signo: positiva para entradas, negativa para salidas.
+    """
+    TIPOS = (
+        ('inicial', 'Inventario inicial'),
+        ('venta', 'Venta'),
+        ('reabastecimiento', 'Reabastecimiento'),
+        ('ajuste', 'Ajuste'),
+    )
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='movimientos')
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    cantidad = models.IntegerField()
+    fecha = models.DateTimeField(default=timezone.now)
+    venta = models.ForeignKey('Venta', on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos')
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='movimientos_inventario')
+    nota = models.CharField(max_length=200, blank=True)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad:+d} x {self.producto_id}"
+
+    class Meta:
+        verbose_name = "Movimiento de Inventario"
+        verbose_name_plural = "Movimientos de Inventario"
+        indexes = [models.Index(fields=['producto', 'fecha'])]
+
+
+class SnapshotInventario(models.Model):
+    """Foto del stock de un producto en una fecha de corte (incluye los movimientos hasta `fecha`)."""
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='snapshots')
+    fecha = models.DateTimeField()
+    stock = models.IntegerField()
+
+    def __str__(self):
+        return f"{self.producto_id} @ {self.fecha:%Y-%m-%d %H:%M}: {self.stock}"
+
+    class Meta:
+        verbose_name = "Snapshot de Inventario"
+        verbose_name_plural = "Snapshots de Inventario"
+        unique_together = ('producto', 'fecha')
 
 
 # ============ MODELO CLIENTE ============
@@ -116,9 +270,21 @@ class Cliente(models.Model):
     telefono = models.CharField(max_length=15) 
     direccion = models.TextField() 
     fecha_registro = models.DateTimeField(auto_now_add=True) 
+    # Nombre, apellido, email y teléfono normalizados (sin acentos, minúsculas) para las búsquedas
+    clave_busqueda = models.CharField(max_length=400, blank=True, default='', editable=False)
     
     def __str__(self):
         return f"{self.nombre} {self.apellido}" 
+
+    CAMPOS_BUSQUEDA = ('nombre', 'apellido', 'email', 'telefono')
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or set(update_fields) & set(self.CAMPOS_BUSQUEDA):
+            self.clave_busqueda = clave_de_busqueda(self.nombre, self.apellido, self.email, self.telefono)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'clave_busqueda'}
+        super().save(*args, **kwargs)
     
     @property
     def nombre_completo(self):
@@ -130,10 +296,23 @@ class Cliente(models.Model):
         ordering = ['apellido', 'nombre'] 
 
 
+class ClienteTrigrama(models.Model):
+    """Índice de trigramas de la clave de búsqueda de cada cliente (búsqueda aproximada)."""
+    cliente = models.ForeignKey(Cliente, on_delete=models.CASCADE, related_name='trigramas')
+    trigrama = models.CharField(max_length=3)
+
+    class Meta:
+        verbose_name = "Trigrama de Cliente"
+        verbose_name_plural = "Trigramas de Clientes"
+        unique_together = ('cliente', 'trigrama')
+        indexes = [models.Index(fields=['trigrama', 'cliente'])]
+
+
 # ============ MODELO VENTA (Transacción) - CORREGIDO ============
 class Venta(models.Model):
     """Registro de una transacción de venta."""
-    fecha_venta = models.DateTimeField(auto_now_add=True) 
+    # default en lugar de auto_now_add: las ventas recibidas en lote conservan la hora del ticket
+    fecha_venta = models.DateTimeField(default=timezone.now, editable=False, db_index=True) 
     total = models.DecimalField(
         max_digits=10, 
         decimal_places=2,
@@ -142,20 +321,53 @@ class Venta(models.Model):
     ) 
     cliente = models.ForeignKey(Cliente, on_delete=models.SET_NULL, null=True, blank=True, related_name='ventas') 
     vendido_por = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='ventas_realizadas') 
+    # Identificador del ticket en la sucursal (ventas recibidas en lote); impide registrarlo dos veces
+    folio = models.CharField(max_length=64, null=True, blank=True, unique=True, editable=False)
     
     def calcular_total(self):
         """Calcula el total sumando los subtotales de los detalles."""
         # Se usa self.detalles, que es el related_name del ForeignKey en DetalleVenta
         total_calculado = self.detalles.aggregate(total=Sum('subtotal'))['total']
         return total_calculado if total_calculado is not None else Decimal('0.00')
-    
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        # Recalcula el total después de guardar, en caso de que haya detalles
+
+    def actualizar_total(self):
+        """Recalcula el total y lo guarda con un UPDATE directo (sin volver a llamar save())."""
         total_calculado = self.calcular_total()
         if self.total != total_calculado:
+            Venta.objects.filter(pk=self.pk).update(total=total_calculado)
             self.total = total_calculado
-            super().save(update_fields=['total'])
+        return total_calculado
+
+    @classmethod
+    def recalcular_totales(cls, venta_ids):
+        """
+        Recalcula el total de varias ventas con un único UPDATE usando una subconsulta
+        correlacionada sobre DetalleVenta. Útil después de un bulk_create de detalles.
+        """
+        venta_ids = [pk for pk in set(venta_ids) if pk is not None]
+        if not venta_ids:
+            return 0
+        suma = DetalleVenta.objects.filter(venta=OuterRef('pk')).values('venta').annotate(
+            suma=Sum('subtotal')
+        ).values('suma')
+        return cls.objects.filter(pk__in=venta_ids).update(
+            total=Coalesce(Subquery(suma), Value(Decimal('0.00')), output_field=models.DecimalField())
+        )
+
+    def save(self, *args, **kwargs):
+        es_nueva = self._state.adding
+        super().save(*args, **kwargs)
+        # Con update_fields el llamador decide qué se escribe; en modo diferido el total
+        # se recalcula una sola vez al cerrar el bloque totales_diferidos()
+        if kwargs.get('update_fields') is not None or _totales_en_diferido() is not None:
+            return
+        if es_nueva:
+            # Una venta recién insertada todavía no tiene detalles: no hace falta el SUM
+            if self.total != Decimal('0.00'):
+                Venta.objects.filter(pk=self.pk).update(total=Decimal('0.00'))
+                self.total = Decimal('0.00')
+        else:
+            self.actualizar_total()
 
     def __str__(self):
         # Muestra el total si no es None, si es None muestra N/A
@@ -165,6 +377,30 @@ class Venta(models.Model):
         verbose_name = "Venta"
         verbose_name_plural = "Ventas"
 
+# ============ ACUMULADO DIARIO DE VENTAS (ROLLUP) ============
+class VentaDiaria(models.Model):
+    """
+    Totales de venta pre-agregados por día y vendedor.
+    Las filas con `categoria` vacía son el resumen del día (total, número de ventas);
+    las filas con categoría desglosan el mismo día por categoría de producto.
+    Los reportes siempre suman filas, así que un día puede repartirse en varias.
+    """
+    fecha = models.DateField()
+    vendedor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='ventas_diarias')
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE, null=True, blank=True, related_name='ventas_diarias')
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    num_ventas = models.IntegerField(default=0)
+    unidades = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.fecha} - {self.total}"
+
+    class Meta:
+        verbose_name = "Venta Diaria"
+        verbose_name_plural = "Ventas Diarias"
+        indexes = [models.Index(fields=['fecha', 'categoria', 'vendedor'])]
+
+
 # ============ MODELO DETALLE DE VENTA ============
 class DetalleVenta(models.Model):
     """Artículos incluidos en una venta específica."""
@@ -182,10 +418,19 @@ class DetalleVenta(models.Model):
         
         # 🛑 CRÍTICO: Recalcula y actualiza el total de la Venta principal después de guardar el detalle
         if self.venta_id:
-            self.venta.total = self.venta.calcular_total()
-            # Se usa update_fields para evitar recursividad y ahorrar llamadas a la base de datos
-            self.venta.save(update_fields=['total']) 
+            pendientes = _totales_en_diferido()
+            if pendientes is not None:
+                pendientes.add(self.venta_id)
+            else:
+                self.venta.actualizar_total()
 
+    def clean_fields(self, exclude=None):
+        # Si el producto ya es una instancia (el formulario de venta la toma del catálogo en
+        # memoria) validar el FK volvería a consultarlo: una consulta por línea. El cobro
+        # bloquea las filas de todos modos y rechaza los productos que ya no existan.
+        if DetalleVenta.producto.is_cached(self) and self.producto is not None:
+            exclude = {*(exclude or ()), 'producto'}
+        super().clean_fields(exclude=exclude)
 
     def __str__(self):
         return f"{self.cantidad} x {self.producto.nombre} en Venta #{self.venta.id}"
@@ -193,4 +438,25 @@ class DetalleVenta(models.Model):
     class Meta:
         verbose_name = "Detalle de Venta"
         verbose_name_plural = "Detalles de Venta"
-        unique_together = ('venta', 'producto')
\ No newline at end of file
+        unique_together = ('venta', 'producto')
+
+# ============ CLAVES DE IDEMPOTENCIA DEL COBRO ============
+class ClaveIdempotencia(models.Model):
+    """
+    Clave que envía la terminal con cada cobro (cabecera Idempotency-Key o campo del formulario).
+    Si la petición se reintenta con la misma clave se devuelve la venta ya registrada en lugar
+    de cobrar otra vez. Caduca en `expira_en`; limpiar_vencidos borra las viejas.
+    """
+    clave = models.CharField(max_length=64)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='claves_idempotencia')
+    venta = models.ForeignKey(Venta, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    creada_en = models.DateTimeField(auto_now_add=True)
+    expira_en = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.clave} -> Venta #{self.venta_id}"
+
+    class Meta:
+        verbose_name = "Clave de Idempotencia"
+        verbose_name_plural = "Claves de Idempotencia"
+        unique_together = ('usuario', 'clave')
@@ -0,0 +1,146 @@
+# tienda/perfilador.py
+# ===================================================================
+# Captura de perfiles bajo demanda en producción. Con TIENDA_PERFILADOR
+# activo, un usuario staff agrega ?perfilar=1 (o la cabecera
+# X-Perfilar: 1) a una petición y la vista corre bajo cProfile (o
+# pyinstrument, un perfilador por muestreo, si está instalado y se
+# elige con TIENDA_PERFILADOR_MOTOR). El perfil se guarda como
+# <vista>-<fecha>.prof (o .html) en TIENDA_PERFILES_DIR, donde solo se
+# conservan los TIENDA_PERFILES_MAX más recientes. Se consultan en el
+# admin (/admin/perfiles/) o se abren con snakeviz / pstats.
+# ===================================================================
+
+import cProfile
+import io
+import logging
+import pstats
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES = {'cprofile': '.prof', 'pyinstrument': '.html'}
+_NOMBRE_VALIDO = re.compile(r'^[\w.-]+\.(prof|html)$')
+# cProfile admite un solo perfilador activo por proceso: las peticiones concurrentes no se perfilan
+_en_uso = threading.Lock()
+
+
+def perfilador_activo():
+    return getattr(settings, 'TIENDA_PERFILADOR', False)
+
+
+def directorio_perfiles():
+    return Path(getattr(settings, 'TIENDA_PERFILES_DIR', settings.BASE_DIR / 'perfiles'))
+
+
+def solicita_perfil(request):
+    """¿Hay que perfilar esta petición? Requiere el ajuste activo, usuario staff y el parámetro o cabecera."""
+    if not perfilador_activo():
+        return False
+    pedido = request.GET.get('perfilar') or request.headers.get('X-Perfilar')
+    user = getattr(request, 'user', None)
+    return bool(pedido) and pedido != '0' and user is not None and user.is_staff
+
+
+def _motor():
+    motor = getattr(settings, 'TIENDA_PERFILADOR_MOTOR', 'cprofile')
+    if motor == 'pyinstrument':
+        try:
+            import pyinstrument  # noqa: F401
+        except ImportError:
+            logger.warning('pyinstrument no está instalado; se usa cProfile.')
+            return 'cprofile'
+    return motor
+
+
+def perfilar(request, get_response):
+    """Ejecuta get_response(request) bajo el perfilador y guarda el resultado. Devuelve la respuesta."""
+    if not _en_uso.acquire(blocking=False):
+        response = get_response(request)
+        response['X-Perfil'] = 'ocupado'
+        return response
+    try:
+        motor = _motor()
+        if motor == 'pyinstrument':
+            from pyinstrument import Profiler
+            perfilador = Profiler()
+            perfilador.start()
+            try:
+                response = get_response(request)
+            finally:
+                perfilador.stop()
+            contenido = perfilador.output_html().encode()
+        else:
+            perfilador = cProfile.Profile()
+            perfilador.enable()
+            try:
+                response = get_response(request)
+            finally:
+                perfilador.disable()
+            contenido = None
+
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = re.sub(r'[^\w-]', '_', (coincidencia.url_name if coincidencia else None) or 'sin_vista')
+        nombre = f'{vista}-{timezone.localtime():%Y%m%d-%H%M%S-%f}{EXTENSIONES[motor]}'
+        directorio = directorio_perfiles()
+        directorio.mkdir(parents=True, exist_ok=True)
+        if contenido is None:
+            perfilador.dump_stats(directorio / nombre)
+        else:
+            (directorio / nombre).write_bytes(contenido)
+        rotar_perfiles()
+    finally:
+        _en_uso.release()
+    response['X-Perfil'] = nombre
+    return response
+
+
+def rotar_perfiles():
+    """Borra los perfiles más viejos por encima de TIENDA_PERFILES_MAX."""
+    maximo = getattr(settings, 'TIENDA_PERFILES_MAX', 50)
+    for perfil in listar_perfiles()[maximo:]:
+        (directorio_perfiles() / perfil['nombre']).unlink(missing_ok=True)
+
+
+def listar_perfiles():
+    """Perfiles guardados, del más reciente al más viejo: [{'nombre', 'vista', 'fecha', 'tamano'}]."""
+    directorio = directorio_perfiles()
+    if not directorio.is_dir():
+        return []
+    perfiles = []
+    for ruta in directorio.iterdir():
+        if not _NOMBRE_VALIDO.match(ruta.name):
+            continue
+        estado = ruta.stat()
+        perfiles.append({
+            'nombre': ruta.name,
+            'vista': ruta.name.split('-', 1)[0],
+            'fecha': datetime.fromtimestamp(estado.st_mtime, tz=timezone.get_current_timezone()),
+            'tamano': estado.st_size,
+            'mtime': estado.st_mtime,
+        })
+    return sorted(perfiles, key=lambda perfil: (perfil['mtime'], perfil['nombre']), reverse=True)
+
+
+def ruta_de_perfil(nombre):
+    """Ruta del perfil `nombre` dentro del directorio; None si el nombre no es válido o no existe."""
+    if not _NOMBRE_VALIDO.match(nombre):
+        return None
+    ruta = directorio_perfiles() / nombre
+    return ruta if ruta.is_file() else None
+
+
+def resumen_perfil(nombre, limite=40, orden='cumulative'):
+    """Texto de pstats con las `limite` funciones de mayor tiempo acumulado de un perfil .prof."""
+    ruta = ruta_de_perfil(nombre)
+    if ruta is None or ruta.suffix != '.prof':
+        return None
+    salida = io.StringIO()
+    estadisticas = pstats.Stats(str(ruta), stream=salida)
+    estadisticas.strip_dirs().sort_stats(orden).print_stats(limite)
+    return salida.getvalue()
@@ -0,0 +1,28 @@
+# tienda/plantillas.py
+# ===================================================================
+# Backend de plantillas de Django con cronómetro: cada render cuenta en
+# el tiempo de plantillas de la petición que mide MedicionMiddleware.
+# Fuera de una petición medida (comandos, pruebas) no hace nada extra.
+# ===================================================================
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from .middleware import medir_plantilla
+
+
+class PlantillaMedida(Template):
+    """Plantilla del backend cuyo render se cronometra."""
+
+    def render(self, context=None, request=None):
+        with medir_plantilla():
+            return super().render(context, request)
+
+
+class DjangoTemplatesMedidas(DjangoTemplates):
+    """DjangoTemplates que devuelve PlantillaMedida; se configura en TEMPLATES['BACKEND']."""
+
+    def from_string(self, template_code):
+        return PlantillaMedida(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return PlantillaMedida(super().get_template(template_name).template, self)
@@ -0,0 +1,270 @@
+# tienda/reportes.py
+# ===================================================================
+# Acumulados diarios de ventas (VentaDiaria). El cobro los actualiza
+# de forma incremental y `reconstruir_ventas_diarias` los regenera a
+# partir de Venta/DetalleVenta. El dashboard y el reporte leen de aquí
+# para que su costo no crezca con la tabla de ventas.
+# ===================================================================
+
+import base64
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Venta, DetalleVenta, VentaDiaria
+
+# Filas de detalle por página en el reporte de ventas
+TAMANO_PAGINA_REPORTE = 50
+# Filas leídas por consulta al exportar el detalle de ventas
+TAMANO_LOTE_EXPORTACION = 2000
+
+COLUMNAS_EXPORTACION = (
+    'venta', 'fecha', 'producto', 'cliente', 'vendedor', 'cantidad', 'precio_unitario', 'subtotal',
+)
+
+
+def _acumular_fila(fecha, vendedor_id, categoria_id, total, num_ventas, unidades):
+    """Suma a la fila del acumulado con un UPDATE; si aún no existe, la crea."""
+    filtro = {'fecha': fecha, 'vendedor_id': vendedor_id, 'categoria_id': categoria_id}
+    actualizadas = VentaDiaria.objects.filter(**filtro).update(
+        total=F('total') + total,
+        num_ventas=F('num_ventas') + num_ventas,
+        unidades=F('unidades') + unidades,
+    )
+    if not actualizadas:
+        # Si dos cobros crean la misma fila a la vez quedan dos filas; las lecturas suman, así que da igual
+        VentaDiaria.objects.create(total=total, num_ventas=num_ventas, unidades=unidades, **filtro)
+
+
+def acumular_venta(venta, detalles):
+    """
+    Suma una venta recién registrada a los acumulados de su día: una fila de resumen
+    y una fila por cada categoría presente en sus detalles.
+    """
+    acumular_ventas([(venta, detalles)])
+
+
+def acumular_ventas(ventas):
+    """
+    Suma varias ventas recién registradas (pares (venta, detalles)) a los acumulados.
+    Agrupa primero en memoria por día, vendedor y categoría, así un lote de cientos de
+    tickets cuesta un UPDATE por fila de acumulado y no uno por ticket.
+    """
+    # (fecha, vendedor_id, categoria_id) -> [total, num_ventas, unidades]; categoria None = resumen
+    grupos = defaultdict(lambda: [Decimal('0.00'), 0, 0])
+    for venta, detalles in ventas:
+        fecha = timezone.localdate(venta.fecha_venta)
+        por_categoria = defaultdict(lambda: [Decimal('0.00'), 0])
+        unidades = 0
+        for detalle in detalles:
+            acumulado = por_categoria[detalle.producto.categoria_id]
+            acumulado[0] += detalle.subtotal
+            acumulado[1] += detalle.cantidad
+            unidades += detalle.cantidad
+
+        resumen = grupos[(fecha, venta.vendido_por_id, None)]
+        resumen[0] += venta.total
+        resumen[1] += 1
+        resumen[2] += unidades
+        for categoria_id, (total, cantidad) in por_categoria.items():
+            grupo = grupos[(fecha, venta.vendido_por_id, categoria_id)]
+            grupo[0] += total
+            grupo[1] += 1
+            grupo[2] += cantidad
+
+    for (fecha, vendedor_id, categoria_id), (total, num_ventas, unidades) in grupos.items():
+        _acumular_fila(fecha, vendedor_id, categoria_id, total, num_ventas, unidades)
+
+
+def rango_de_dias(desde, hasta=None):
+    """Devuelve (inicio, fin) como datetimes conscientes de zona horaria que cubren los días [desde, hasta]."""
+    hasta = hasta or desde
+    inicio = timezone.make_aware(datetime.combine(desde, time.min))
+    fin = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min))
+    return inicio, fin
+
+
+def resumen_ventas(desde, hasta=None, vendedor=None):
+    """
+    Total vendido y número de ventas entre los días `desde` y `hasta` (incluidos),
+    leído del acumulado diario con una sola consulta.
+    """
+    filas = VentaDiaria.objects.filter(fecha__range=(desde, hasta or desde), categoria__isnull=True)
+    if vendedor is not None:
+        filas = filas.filter(vendedor=vendedor)
+    resumen = filas.aggregate(total=Sum('total'), num_ventas=Sum('num_ventas'))
+    return {
+        'total': resumen['total'] or Decimal('0.00'),
+        'num_ventas': resumen['num_ventas'] or 0,
+    }
+
+
+# ============ PAGINACIÓN POR CURSOR (KEYSET) ============
+def codificar_cursor(fecha, pk):
+    """Convierte la posición (fecha_venta, id) de la última fila en un token apto para la URL."""
+    return base64.urlsafe_b64encode(f'{fecha.isoformat()}|{pk}'.encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """Devuelve (fecha_venta, id) a partir del token, o None si viene vacío o alterado."""
+    if not cursor:
+        return None
+    try:
+        fecha, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(fecha), int(pk)
+    except (ValueError, UnicodeError):
+        return None
+
+
+def detalles_del_periodo(desde, hasta=None):
+    """Detalles de venta cuyas ventas caen entre los días `desde` y `hasta` (incluidos)."""
+    inicio, fin = rango_de_dias(desde, hasta)
+    return DetalleVenta.objects.filter(venta__fecha_venta__gte=inicio, venta__fecha_venta__lt=fin)
+
+
+def detalles_para_reporte(desde, hasta=None):
+    """
+    Detalles del periodo listos para la tabla del reporte: une venta, cliente, vendedor y
+    producto en la misma consulta y solo trae las columnas que muestra la plantilla.
+    """
+    return detalles_del_periodo(desde, hasta).select_related(
+        'venta', 'venta__cliente', 'venta__vendido_por', 'producto'
+    ).only(
+        'cantidad', 'precio_unitario', 'subtotal',
+        'venta__fecha_venta',
+        'venta__cliente__nombre',
+        'venta__vendido_por__username',
+        'producto__nombre',
+    )
+
+
+def pagina_de_detalles(detalles, cursor=None, tamano=TAMANO_PAGINA_REPORTE):
+    """
+    Devuelve una página de detalles, de la venta más reciente a la más antigua, usando
+    paginación por cursor sobre (venta.fecha_venta, id): en lugar de OFFSET se filtra
+    "después de la última fila vista", así el costo de cada página no depende de su posición.
+    Regresa (filas, cursor_siguiente); cursor_siguiente es None en la última página.
+    """
+    posicion = decodificar_cursor(cursor)
+    if posicion:
+        fecha, pk = posicion
+        detalles = detalles.filter(
+            Q(venta__fecha_venta__lt=fecha) | Q(venta__fecha_venta=fecha, id__lt=pk)
+        )
+    filas = list(detalles.order_by('-venta__fecha_venta', '-id')[:tamano + 1])
+
+    siguiente = None
+    if len(filas) > tamano:
+        filas = filas[:tamano]
+        ultima = filas[-1]
+        siguiente = codificar_cursor(ultima.venta.fecha_venta, ultima.pk)
+    return filas, siguiente
+
+
+# ============ EXPORTACIÓN DEL DETALLE DE VENTAS ============
+def iterar_exportacion(detalles, tamano_lote=TAMANO_LOTE_EXPORTACION):
+    """
+    Genera las filas del detalle de ventas (en el orden de COLUMNAS_EXPORTACION), de la más
+    antigua a la más reciente, leyendo lotes de `tamano_lote` con paginación por cursor.
+    Cada lote es una consulta independiente de tuplas (values_list), así la memoria se
+    mantiene constante sin importar el tamaño del rango, incluso en MySQL, cuyo driver
+    guarda en el cliente el resultado completo de cada consulta.
+    """
+    consulta = detalles.order_by('venta__fecha_venta', 'id').values_list(
+        'id', 'venta_id', 'venta__fecha_venta', 'producto__nombre',
+        'venta__cliente__nombre', 'venta__cliente__apellido', 'venta__vendido_por__username',
+        'cantidad', 'precio_unitario', 'subtotal',
+    )
+    ultima = None
+    while True:
+        lote = consulta
+        if ultima:
+            fecha, pk = ultima
+            lote = lote.filter(Q(venta__fecha_venta__gt=fecha) | Q(venta__fecha_venta=fecha, id__gt=pk))
+        filas = list(lote[:tamano_lote])
+
+        for (pk, venta_id, fecha, producto, nombre, apellido, vendedor,
+             cantidad, precio_unitario, subtotal) in filas:
+            yield (
+                venta_id,
+                timezone.localtime(fecha).isoformat(timespec='seconds'),
+                producto,
+                f'{nombre} {apellido}' if nombre else '',
+                vendedor or '',
+                cantidad,
+                precio_unitario,
+                subtotal,
+            )
+
+        if len(filas) < tamano_lote:
+            return
+        ultima = (filas[-1][2], filas[-1][0])
+
+
+def reconstruir_ventas_diarias(desde=None, hasta=None):
+    """
+    Regenera los acumulados a partir de las ventas. Sin fechas reconstruye todo el histórico.
+    Devuelve el número de filas generadas.
+    """
+    ventas = Venta.objects.all()
+    detalles = DetalleVenta.objects.all()
+    acumulados = VentaDiaria.objects.all()
+    if desde or hasta:
+        inicio, fin = rango_de_dias(desde or hasta, hasta or desde)
+        ventas = ventas.filter(fecha_venta__gte=inicio, fecha_venta__lt=fin)
+        detalles = detalles.filter(venta__fecha_venta__gte=inicio, venta__fecha_venta__lt=fin)
+        acumulados = acumulados.filter(fecha__range=(desde or hasta, hasta or desde))
+
+    filas = filas_ventas_diarias(ventas, detalles, VentaDiaria)
+    with transaction.atomic():
+        acumulados.delete()
+        VentaDiaria.objects.bulk_create(filas, batch_size=1000)
+    return len(filas)
+
+
+def filas_ventas_diarias(ventas, detalles, modelo):
+    """
+    Calcula (sin guardar) las filas de acumulado de las ventas y detalles dados.
+    Recibe el modelo para que la migración 0011 pueda usar el histórico.
+    """
+    # Unidades por día y vendedor (para la fila de resumen)
+    unidades = {
+        (fila['dia'], fila['venta__vendido_por']): fila['unidades']
+        for fila in detalles.annotate(dia=TruncDate('venta__fecha_venta')).values(
+            'dia', 'venta__vendido_por'
+        ).annotate(unidades=Sum('cantidad')).order_by()
+    }
+
+    filas = [
+        modelo(
+            fecha=fila['dia'],
+            vendedor_id=fila['vendido_por'],
+            total=fila['total'] or Decimal('0.00'),
+            num_ventas=fila['num_ventas'],
+            unidades=unidades.get((fila['dia'], fila['vendido_por'])) or 0,
+        )
+        for fila in ventas.annotate(dia=TruncDate('fecha_venta')).values('dia', 'vendido_por').annotate(
+            total=Sum('total'), num_ventas=Count('id')
+        ).order_by()
+    ]
+    filas += [
+        modelo(
+            fecha=fila['dia'],
+            vendedor_id=fila['venta__vendido_por'],
+            categoria_id=fila['producto__categoria'],
+            total=fila['total'] or Decimal('0.00'),
+            num_ventas=fila['num_ventas'],
+            unidades=fila['unidades'] or 0,
+        )
+        for fila in detalles.annotate(dia=TruncDate('venta__fecha_venta')).values(
+            'dia', 'venta__vendido_por', 'producto__categoria'
+        ).annotate(
+            total=Sum('subtotal'), num_ventas=Count('venta', distinct=True), unidades=Sum('cantidad')
+        ).order_by()
+    ]
+    return filas
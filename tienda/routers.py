@@ -0,0 +1,121 @@
+# tienda/routers.py
+# ===================================================================
+# Réplica de lectura para las vistas de reportes y listados.
+# ReplicaMiddleware marca la petición cuando la vista está en
+# VISTAS_REPLICA y es GET/HEAD; mientras dure, RouterReplica manda las
+# lecturas al alias 'replica'. Las escrituras siempre van a 'default'.
+#
+# - Lectura tras escritura: si la sesión escribió algo, sus siguientes
+#   peticiones leen de la primaria durante TIENDA_REPLICA_RETRASO_SEGUNDOS
+#   (más que el retraso de replicación esperado), así el usuario ve
+#   enseguida lo que acaba de guardar.
+# - Respaldo: si la réplica no responde se usa la primaria y no se
+#   vuelve a intentar hasta pasados TIENDA_REPLICA_REINTENTO_SEGUNDOS.
+# - Sin alias 'replica' en DATABASES todo va a la primaria.
+# ===================================================================
+
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+ALIAS_REPLICA = 'replica'
+# Nombres de URL de solo lectura que pueden leer de la réplica
+VISTAS_REPLICA = frozenset({
+    'home', 'home_redirect', 'dashboard', 'reporte_ventas', 'cliente_dashboard',
+    'producto_lista', 'categoria_lista', 'proveedor_lista', 'cliente_lista',
+})
+CLAVE_SESION_PRIMARIA = 'primaria_hasta'
+# Escrituras que no cuentan para la lectura tras escritura (la propia sesión se guarda en cada petición)
+APPS_SIN_PEGAJOSIDAD = frozenset({'sessions', 'django_cache'})
+# Siempre de la primaria: el caché en base (DatabaseCache) guarda sellos que se invalidan al escribir
+APPS_SOLO_PRIMARIA = frozenset({'django_cache'})
+
+
+class EstadoPeticion:
+    """Estado de enrutamiento de la petición en curso."""
+    __slots__ = ('usar_replica', 'escribio')
+
+    def __init__(self):
+        self.usar_replica = False
+        self.escribio = False
+
+
+_estado = ContextVar('estado_replica', default=None)
+_replica_caida_hasta = 0.0
+
+
+def replica_configurada():
+    return ALIAS_REPLICA in connections.settings
+
+
+def estado_actual():
+    return _estado.get()
+
+
+def replica_disponible():
+    """Comprueba (o abre) la conexión a la réplica; si falla la marca caída por un tiempo."""
+    global _replica_caida_hasta
+    if not replica_configurada() or time.monotonic() < _replica_caida_hasta:
+        return False
+    try:
+        connections[ALIAS_REPLICA].ensure_connection()
+        return True
+    except DatabaseError as e:
+        _replica_caida_hasta = time.monotonic() + getattr(settings, 'TIENDA_REPLICA_REINTENTO_SEGUNDOS', 30)
+        logger.warning('Réplica de lectura no disponible, se usa la primaria: %s', e)
+        return False
+
+
+@contextmanager
+def estado_de_peticion():
+    """Abre el estado de enrutamiento de una petición (lo usa ReplicaMiddleware)."""
+    estado = EstadoPeticion()
+    marca = _estado.set(estado)
+    try:
+        yield estado
+    finally:
+        _estado.reset(marca)
+
+
+@contextmanager
+def usar_primaria():
+    """
+    Lee de la primaria dentro del bloque aunque la petición use la réplica. Para lo que se
+    guarda en caché compartida (contadores, catálogo): leído de una réplica atrasada quedaría
+    desactualizado aunque ya se hubiera invalidado.
+    """
+    estado = _estado.get()
+    if estado is None or not estado.usar_replica:
+        yield
+        return
+    estado.usar_replica = False
+    try:
+        yield
+    finally:
+        estado.usar_replica = True
+
+
+class RouterReplica:
+    """Router de DATABASE_ROUTERS: lecturas a la réplica solo en las peticiones marcadas."""
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None and estado.usar_replica and model._meta.app_label not in APPS_SOLO_PRIMARIA:
+            return ALIAS_REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None and model._meta.app_label not in APPS_SIN_PEGAJOSIDAD:
+            estado.escribio = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Misma base replicada: los objetos de una y otra se pueden relacionar
+        return True
@@ -0,0 +1,101 @@
+# tienda/signals.py
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .busqueda import indexar_clientes
+from .catalogo import CAMPOS_CATALOGO, invalidar_catalogo
+from .contadores import MODELOS_CONTADOS, invalidar_contadores
+from .middleware import invalidar_rol
+from .models import Producto, Categoria, Proveedor, MovimientoInventario, PerfilUsuario, Cliente
+from .sincronizacion import marcar_productos_actualizados, registrar_baja
+
+
+@receiver(post_save, sender=Producto)
+def registrar_cambio_de_stock(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """
+    Lleva al kardex los cambios de stock hechos guardando el Producto
+    (formularios, list_editable del admin, scripts). Las ventas y los
+    reabastecimientos escriben su propio movimiento en tienda.ventas / tienda.inventario.
+    """
+    if raw or (update_fields is not None and 'stock' not in update_fields):
+        return
+
+    if created:
+        if instance.stock:
+            MovimientoInventario.objects.create(producto=instance, tipo='inicial', cantidad=instance.stock)
+    else:
+        anterior = getattr(instance, '_stock_guardado', None)
+        if anterior is not None and instance.stock != anterior:
+            MovimientoInventario.objects.create(
+                producto=instance, tipo='ajuste', cantidad=instance.stock - anterior
+            )
+    instance._stock_guardado = instance.stock
+
+
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_catalogo_de_productos(sender, instance, update_fields=None, **kwargs):
+    """
+    Cambios de precio, nombre o estado (producto_editar, list_editable del admin...) suben la
+    versión del catálogo. Se sube otra vez al confirmar la transacción: un worker que reconstruyó
+    su snapshot antes del commit todavía vio los datos viejos.
+    """
+    if update_fields is not None and not set(update_fields) & set(CAMPOS_CATALOGO):
+        return
+    invalidar_catalogo()
+    transaction.on_commit(invalidar_catalogo)
+
+
+def invalidar_contadores_dashboard(sender, instance, created=True, **kwargs):
+    """
+    Borra los contadores del dashboard al crear o eliminar registros contados.
+    Las ediciones de un Producto también invalidan porque el dashboard muestra los más recientes.
+    """
+    if created or sender is Producto:
+        invalidar_contadores()
+
+
+for modelo in set(MODELOS_CONTADOS.values()):
+    post_save.connect(invalidar_contadores_dashboard, sender=modelo, dispatch_uid=f'contadores_{modelo.__name__}_save')
+    post_delete.connect(invalidar_contadores_dashboard, sender=modelo, dispatch_uid=f'contadores_{modelo.__name__}_delete')
+
+
+@receiver([post_save, post_delete], sender=PerfilUsuario)
+def invalidar_rol_de_empleado(sender, instance, **kwargs):
+    """Un cambio en el perfil (rol) obliga a resolver de nuevo el rol guardado en la sesión."""
+    invalidar_rol(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Cliente)
+def invalidar_rol_de_cliente(sender, instance, **kwargs):
+    invalidar_rol(instance.usuario_id)
+
+
+@receiver(post_save, sender=Cliente)
+def indexar_cliente(sender, instance, update_fields=None, raw=False, **kwargs):
+    """Mantiene al día los trigramas de búsqueda del cliente cuando cambian sus datos."""
+    if raw or (update_fields is not None and 'clave_busqueda' not in update_fields):
+        return
+    indexar_clientes([instance])
+
+
+# ============ SINCRONIZACIÓN DE TERMINALES ============
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Categoria)
+@receiver(post_delete, sender=Proveedor)
+def registrar_baja_de_catalogo(sender, instance, **kwargs):
+    """Deja la baja (tombstone) para que las terminales borren el registro en su próxima sincronización."""
+    registrar_baja(sender._meta.model_name, instance.pk)
+
+
+@receiver(m2m_changed, sender=Producto.proveedores.through)
+def marcar_cambio_de_proveedores(sender, instance, action, reverse, pk_set, **kwargs):
+    """Cambiar los proveedores de un producto no pasa por Producto.save(): se mueve su actualizado_en a mano."""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        marcar_productos_actualizados([instance.pk])
+    elif action == 'pre_clear':
+        marcar_productos_actualizados(instance.productos_suministrados.values_list('pk', flat=True))
+    else:
+        marcar_productos_actualizados(pk_set)
@@ -0,0 +1,157 @@
+# tienda/sincronizacion.py
+# ===================================================================
+# Sincronización del catálogo por cambios para las terminales (POS).
+# En vez de descargar todo el catálogo en cada consulta, la terminal
+# envía el cursor de su última sincronización y recibe solo las altas
+# y ediciones (upserts) y las bajas (tombstones, RegistroEliminado)
+# posteriores, en páginas. El costo de cada consulta depende de los
+# cambios, no del tamaño del catálogo.
+#
+# El cursor guarda una posición (actualizado_en, id) por cada flujo:
+# productos, categorías, proveedores y eliminados. Solo se entregan
+# cambios con más de MARGEN_SEGUNDOS de antigüedad, para no saltarse
+# filas de transacciones que aún no confirmaban cuando se leyó.
+# ===================================================================
+
+import base64
+import json
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Categoria, Producto, Proveedor, RegistroEliminado
+
+TAMANO_PAGINA_SYNC = 500
+MARGEN_SEGUNDOS = getattr(settings, 'TIENDA_SYNC_MARGEN_SEGUNDOS', 5)
+# Días que se guardan las bajas; una terminal con un cursor más viejo debe descargar todo de nuevo
+RETENCION_DIAS = getattr(settings, 'TIENDA_SYNC_RETENCION_DIAS', 30)
+
+# Flujo -> (modelo, campos que recibe la terminal)
+ENTIDADES = {
+    'productos': (Producto, ('id', 'nombre', 'descripcion', 'precio_venta', 'activo', 'categoria_id')),
+    'categorias': (Categoria, ('id', 'nombre', 'descripcion')),
+    'proveedores': (Proveedor, ('id', 'nombre', 'empresa', 'telefono', 'email')),
+}
+# Valor de RegistroEliminado.modelo -> flujo
+FLUJO_DE_MODELO = {'producto': 'productos', 'categoria': 'categorias', 'proveedor': 'proveedores'}
+
+
+class CursorInvalido(ValueError):
+    """El cursor no se pudo leer (alterado o de otra versión)."""
+
+
+class CursorVencido(Exception):
+    """El cursor es más viejo que la retención de bajas: hay que descargar el catálogo completo."""
+
+
+def codificar_cursor(posiciones):
+    """{flujo: (fecha, id) o None} -> token apto para la URL."""
+    datos = {
+        flujo: [posicion[0].isoformat(), posicion[1]] if posicion else None
+        for flujo, posicion in posiciones.items()
+    }
+    return base64.urlsafe_b64encode(json.dumps(datos, separators=(',', ':')).encode()).decode()
+
+
+def decodificar_cursor(cursor):
+    """Token -> {flujo: (fecha, id) o None}. Sin cursor devuelve {} (sincronización completa)."""
+    if not cursor:
+        return {}
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return {
+            flujo: (datetime.fromisoformat(datos[flujo][0]), int(datos[flujo][1])) if datos.get(flujo) else None
+            for flujo in (*ENTIDADES, 'eliminados')
+        }
+    except (ValueError, TypeError, KeyError, IndexError, AttributeError):
+        raise CursorInvalido('Cursor de sincronización inválido.')
+
+
+def _despues_de(consulta, campo, posicion):
+    """Filtro keyset: filas posteriores a (fecha, id) en el orden (campo, id)."""
+    if not posicion:
+        return consulta
+    fecha, pk = posicion
+    return consulta.filter(Q(**{f'{campo}__gt': fecha}) | Q(**{campo: fecha, 'id__gt': pk}))
+
+
+def _pagina(consulta, campo, posicion, limite):
+    filas = list(_despues_de(consulta, campo, posicion).order_by(campo, 'id')[:limite + 1])
+    return filas[:limite], len(filas) > limite
+
+
+def cambios_desde(cursor=None, limite=TAMANO_PAGINA_SYNC):
+    """
+    Devuelve una página de cambios del catálogo posteriores a `cursor`:
+    {'productos': [...], 'categorias': [...], 'proveedores': [...],
+     'eliminados': {'productos': [ids], ...}, 'cursor': token, 'hay_mas': bool}
+    Sin cursor entrega el catálogo completo (paginado) y ninguna baja.
+    La terminal vuelve a llamar con el cursor devuelto mientras `hay_mas` sea verdadero.
+    """
+    posiciones = decodificar_cursor(cursor)
+    ahora = timezone.now()
+    hasta = ahora - timedelta(seconds=MARGEN_SEGUNDOS)
+
+    if not posiciones:
+        # Descarga completa: las bajas anteriores a este momento no le interesan a la terminal
+        posiciones = {flujo: None for flujo in ENTIDADES}
+        posiciones['eliminados'] = (hasta, 0)
+    elif posiciones['eliminados'] and posiciones['eliminados'][0] < ahora - timedelta(days=RETENCION_DIAS):
+        raise CursorVencido('El cursor es demasiado viejo; descarga el catálogo completo.')
+
+    resultado = {'eliminados': {flujo: [] for flujo in ENTIDADES}, 'hay_mas': False}
+    for flujo, (modelo, campos) in ENTIDADES.items():
+        filas, hay_mas = _pagina(
+            modelo.objects.filter(actualizado_en__lte=hasta).only('actualizado_en', *campos),
+            'actualizado_en', posiciones[flujo], limite,
+        )
+        resultado[flujo] = [{campo: getattr(fila, campo) for campo in campos} for fila in filas]
+        resultado['hay_mas'] |= hay_mas
+        if filas:
+            posiciones[flujo] = (filas[-1].actualizado_en, filas[-1].pk)
+
+    _agregar_proveedores(resultado['productos'])
+
+    bajas, hay_mas = _pagina(
+        RegistroEliminado.objects.filter(eliminado_en__lte=hasta), 'eliminado_en', posiciones['eliminados'], limite
+    )
+    for baja in bajas:
+        resultado['eliminados'][FLUJO_DE_MODELO[baja.modelo]].append(baja.objeto_id)
+    resultado['hay_mas'] |= hay_mas
+    if hay_mas:
+        posiciones['eliminados'] = (bajas[-1].eliminado_en, bajas[-1].pk)
+    else:
+        # Ya se entregaron todas las bajas hasta `hasta`: el cursor avanza aunque no hubiera ninguna,
+        # así una terminal al día nunca cae en la retención
+        posiciones['eliminados'] = (hasta, 0)
+
+    resultado['cursor'] = codificar_cursor(posiciones)
+    return resultado
+
+
+def _agregar_proveedores(productos):
+    """Agrega la lista de ids de proveedores a cada producto con una sola consulta."""
+    por_producto = {producto['id']: producto for producto in productos}
+    for producto in productos:
+        producto['proveedores'] = []
+    enlaces = Producto.proveedores.through.objects.filter(producto_id__in=list(por_producto)).order_by('proveedor_id')
+    for producto_id, proveedor_id in enlaces.values_list('producto_id', 'proveedor_id'):
+        por_producto[producto_id]['proveedores'].append(proveedor_id)
+
+
+# ============ MANTENIMIENTO ============
+def registrar_baja(modelo, objeto_id):
+    RegistroEliminado.objects.create(modelo=modelo, objeto_id=objeto_id)
+
+
+def marcar_productos_actualizados(producto_ids):
+    """Mueve el cursor de productos cuyo cambio no pasó por save() (p. ej. sus proveedores)."""
+    return Producto.objects.filter(pk__in=list(producto_ids)).update(actualizado_en=timezone.now())
+
+
+def limpiar_registros_eliminados():
+    """Borra las bajas más viejas que la retención."""
+    limite = timezone.now() - timedelta(days=RETENCION_DIAS)
+    return RegistroEliminado.objects.filter(eliminado_en__lt=limite).delete()[0]
@@ -1,3 +1,1266 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from datetime import date, timedelta
+from decimal import Decimal
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, close_old_connections, connection, connections
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .benchmarks import ESCENARIOS, HASTA_BENCHMARK, comparar, medir, preparar_contexto, urls_sin_escenario
+from .busqueda import buscar_clientes, buscar_productos
+from .catalogo import CLAVE_VERSION, catalogo
+from .forms import DetalleVentaFormSet
+from .datos_sinteticos import GeneradorDatos, volumenes
+from .importacion import ImportadorCatalogo
+from .lotes import registrar_lote
+from .middleware import PRESUPUESTO_CONSULTAS, PresupuestoExcedido
+from .inventario import compactar_inventario, reabastecer, stock_al
+from .models import _totales_en_diferido, totales_diferidos
+from .models import Categoria, ClaveIdempotencia, Cliente, Proveedor, PerfilUsuario, Producto, ReservaStock, Venta, DetalleVenta, MovimientoInventario, VentaDiaria
+from . import routers
+from .reportes import (
+    detalles_del_periodo,
+    iterar_exportacion,
+    pagina_de_detalles,
+    reconstruir_ventas_diarias,
+    resumen_ventas,
+)
+from .ventas import (
+    StockInsuficiente,
+    VentaError,
+    procesar_venta,
+    procesar_venta_idempotente,
+    reservar_stock,
+)
+
+
+def crear_producto(categoria, nombre, stock, precio='10.00'):
+    return Producto.objects.create(
+        nombre=nombre, descripcion='', precio_venta=Decimal(precio), stock=stock, categoria=categoria
+    )
+
+
+# ============ COBRO ============
+class ProcesarVentaTests(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='General')
+        self.productos = [crear_producto(categoria, f'Producto {i}', stock=100, precio=f'{i + 1}.50') for i in range(6)]
+
+    def test_update_condicional_fallido_revierte_todo(self):
+        primero, segundo = self.productos[:2]
+        Producto.objects.filter(pk=segundo.pk).update(stock=1)
+        segundo.refresh_from_db()
+        # Sin la revisión previa, otro cobro se llevó el stock entre la validación y el UPDATE
+        with mock.patch('tienda.ventas.verificar_disponibilidad'):
+            with self.assertRaises(StockInsuficiente):
+                procesar_venta([(primero, 2), (segundo, 3)])
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(DetalleVenta.objects.exists())
+        self.assertEqual(
+            list(Producto.objects.filter(pk__in=[primero.pk, segundo.pk]).order_by('pk').values_list('stock', flat=True)),
+            [100, 1],
+        )
+
+    def test_detalles_en_una_insercion_con_subtotales(self):
+        with CaptureQueriesContext(connection) as consultas:
+            venta = procesar_venta([(producto, i + 1) for i, producto in enumerate(self.productos)])
+        inserciones = [c for c in consultas.captured_queries if c['sql'].startswith('INSERT INTO "tienda_detalleventa"')]
+        self.assertEqual(len(inserciones), 1)
+        for detalle in venta.detalles.select_related('producto'):
+            self.assertEqual(detalle.precio_unitario, detalle.producto.precio_venta)
+            self.assertEqual(detalle.subtotal, detalle.precio_unitario * detalle.cantidad)
+        self.assertEqual(venta.total, sum(detalle.subtotal for detalle in venta.detalles.all()))
+        self.assertEqual(Venta.objects.get(pk=venta.pk).total, Decimal('101.50'))
+
+    def test_consultas_no_crecen_con_las_lineas(self):
+        procesar_venta([(self.productos[0], 1), (self.productos[1], 1)])  # Crea las filas del acumulado diario
+        with CaptureQueriesContext(connection) as pocas:
+            procesar_venta([(self.productos[0], 1), (self.productos[1], 1)])
+        with CaptureQueriesContext(connection) as muchas:
+            procesar_venta([(self.productos[i % 2], 1) for i in range(20)])
+        self.assertEqual(len(pocas), len(muchas))
+        self.assertEqual(DetalleVenta.objects.filter(venta=Venta.objects.latest('pk')).count(), 2)
+
+
+# ============ TOTALES DE VENTA DIFERIDOS ============
+class TotalesDiferidosTests(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='General')
+        self.lapiz = crear_producto(categoria, 'Lápiz', stock=50, precio='5.00')
+        self.goma = crear_producto(categoria, 'Goma', stock=50, precio='2.00')
+        self.regla = crear_producto(categoria, 'Regla', stock=50, precio='1.00')
+        self.venta = Venta.objects.create()
+
+    def _detalle(self, producto, cantidad):
+        return DetalleVenta(venta=self.venta, producto=producto, cantidad=cantidad, precio_unitario=producto.precio_venta)
+
+    def _total(self):
+        return Venta.objects.values_list('total', flat=True).get(pk=self.venta.pk)
+
+    def test_un_solo_recalculo_al_salir(self):
+        with mock.patch.object(Venta, 'recalcular_totales', wraps=Venta.recalcular_totales) as recalcular:
+            with totales_diferidos():
+                self._detalle(self.lapiz, 6).save()
+                self._detalle(self.goma, 1).save()
+                self._detalle(self.regla, 4).save()
+                self.assertEqual(self._total(), Decimal('0.00'))
+            recalcular.assert_called_once_with({self.venta.pk})
+        self.assertEqual(self._total(), Decimal('36.00'))
+
+    def test_bloques_anidados_recalculan_en_el_exterior(self):
+        with mock.patch.object(Venta, 'recalcular_totales', wraps=Venta.recalcular_totales) as recalcular:
+            with totales_diferidos() as exterior:
+                with totales_diferidos() as interior:
+                    self.assertIs(interior, exterior)
+                    self._detalle(self.lapiz, 2).save()
+                recalcular.assert_not_called()
+                self._detalle(self.goma, 1).save()
+            recalcular.assert_called_once()
+        self.assertEqual(self._total(), Decimal('12.00'))
+
+    def test_excepcion_no_recalcula_ni_deja_estado(self):
+        with mock.patch.object(Venta, 'recalcular_totales') as recalcular:
+            with self.assertRaises(ValueError):
+                with totales_diferidos():
+                    self._detalle(self.lapiz, 2).save()
+                    raise ValueError('falla a mitad del bloque')
+            recalcular.assert_not_called()
+        self.assertIsNone(_totales_en_diferido())
+        # Fuera del bloque se vuelve al recálculo inmediato
+        self._detalle(self.goma, 1).save()
+        self.assertEqual(self._total(), Decimal('12.00'))
+
+    def test_guardado_suelto_fuera_del_modo_diferido(self):
+        DetalleVenta(venta=self.venta, producto=self.lapiz, cantidad=3, precio_unitario=Decimal('5.00')).save()
+        self.assertEqual(self._total(), Decimal('15.00'))
+        self.venta.refresh_from_db()
+        self.assertEqual(self.venta.total, Decimal('15.00'))
+
+    def test_inline_del_admin_agrega_y_elimina_detalles(self):
+        admin = User.objects.create_superuser('admin', 'a@tienda.com', 'x')
+        self.client.force_login(admin)
+        url = f'/admin/tienda/venta/{self.venta.pk}/change/'
+        datos = {
+            'cliente': '', 'vendido_por': admin.pk, 'detalles-INITIAL_FORMS': 0, 'detalles-TOTAL_FORMS': 2,
+            'detalles-MIN_NUM_FORMS': 0, 'detalles-MAX_NUM_FORMS': 1000,
+            'detalles-0-producto': self.lapiz.pk, 'detalles-0-cantidad': 2, 'detalles-0-precio_unitario': '5.00',
+            'detalles-0-venta': self.venta.pk,
+            'detalles-1-producto': self.goma.pk, 'detalles-1-cantidad': 3, 'detalles-1-precio_unitario': '2.00',
+            'detalles-1-venta': self.venta.pk,
+        }
+        self.assertEqual(self.client.post(url, datos).status_code, 302)
+        self.assertEqual(self._total(), Decimal('16.00'))
+
+        goma = self.venta.detalles.get(producto=self.goma)
+        lapiz = self.venta.detalles.get(producto=self.lapiz)
+        datos = {
+            'cliente': '', 'vendido_por': admin.pk, 'detalles-INITIAL_FORMS': 2, 'detalles-TOTAL_FORMS': 2,
+            'detalles-MIN_NUM_FORMS': 0, 'detalles-MAX_NUM_FORMS': 1000,
+            'detalles-0-id': lapiz.pk, 'detalles-0-producto': self.lapiz.pk, 'detalles-0-cantidad': 2,
+            'detalles-0-precio_unitario': '5.00', 'detalles-0-venta': self.venta.pk,
+            'detalles-1-id': goma.pk, 'detalles-1-producto': self.goma.pk, 'detalles-1-cantidad': 3,
+            'detalles-1-precio_unitario': '2.00', 'detalles-1-venta': self.venta.pk, 'detalles-1-DELETE': 'on',
+        }
+        self.assertEqual(self.client.post(url, datos).status_code, 302)
+        self.assertEqual(self._total(), Decimal('10.00'))
+        self.assertEqual(self.venta.detalles.count(), 1)
+
+
+# ============ RESERVAS DE STOCK ============
+class ReservaStockTests(TestCase):
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='General')
+        self.producto = crear_producto(self.categoria, 'Mouse', stock=5)
+
+    def test_reserva_vigente_bloquea_stock_para_otros(self):
+        reservar_stock([(self.producto, 4)])
+        with self.assertRaises(StockInsuficiente):
+            procesar_venta([(self.producto, 2)])
+
+    def test_venta_con_su_reserva_la_consume(self):
+        token = reservar_stock([(self.producto, 4)])
+        venta = procesar_venta([(self.producto, 4)], reserva=token)
+        self.assertEqual(venta.total, Decimal('40.00'))
+        self.assertFalse(ReservaStock.objects.filter(token=token).exists())
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 1)
+
+    def test_reserva_caducada_no_cuenta(self):
+        token = reservar_stock([(self.producto, 5)])
+        ReservaStock.objects.filter(token=token).update(expira_en=timezone.now() - timedelta(seconds=1))
+        procesar_venta([(self.producto, 5)])
+        self.producto.refresh_from_db()
+        self.assertEqual(self.producto.stock, 0)
+
+
+# ============ KARDEX DE INVENTARIO ============
+class KardexInventarioTests(TestCase):
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='General')
+        self.producto = crear_producto(self.categoria, 'Teclado', stock=10)
+
+    def test_ventas_reabastos_y_ajustes_quedan_en_el_kardex(self):
+        procesar_venta([(self.producto, 3)])
+        reabastecer(self.producto, 5)
+        producto = Producto.objects.get(pk=self.producto.pk)
+        producto.stock = 11
+        producto.save()
+
+        tipos = list(self.producto.movimientos.order_by('id').values_list('tipo', 'cantidad'))
+        self.assertEqual(tipos, [('inicial', 10), ('venta', -3), ('reabastecimiento', 5), ('ajuste', -1)])
+        self.assertEqual(stock_al(self.producto, timezone.now()), 11)
+
+    def test_stock_historico_con_snapshot(self):
+        hace_dos_dias = timezone.now() - timedelta(days=2)
+        MovimientoInventario.objects.filter(producto=self.producto).update(fecha=hace_dos_dias)
+        corte = timezone.now() - timedelta(days=1)
+        self.assertEqual(compactar_inventario(corte), 1)
+
+        procesar_venta([(self.producto, 4)])
+        self.assertEqual(stock_al(self.producto, corte), 10)
+        self.assertEqual(stock_al(self.producto, timezone.now()), 6)
+        self.assertEqual(stock_al(self.producto, hace_dos_dias - timedelta(seconds=1)), 0)
+
+
+# ============ ACUMULADO DIARIO DE VENTAS ============
+class VentaDiariaTests(TestCase):
+
+    def setUp(self):
+        self.ropa = Categoria.objects.create(nombre='Ropa')
+        self.hogar = Categoria.objects.create(nombre='Hogar')
+        self.camisa = crear_producto(self.ropa, 'Camisa', stock=10, precio='100.00')
+        self.taza = crear_producto(self.hogar, 'Taza', stock=10, precio='25.50')
+        self.vendedor = User.objects.create_user('vendedor', password='x')
+
+    def test_cobro_actualiza_acumulado_y_coincide_con_reconstruccion(self):
+        procesar_venta([(self.camisa, 2), (self.taza, 1)], vendedor=self.vendedor)
+        procesar_venta([(self.taza, 2)], vendedor=self.vendedor)
+        hoy = timezone.localdate()
+
+        resumen = resumen_ventas(hoy)
+        self.assertEqual(resumen, {'total': Decimal('276.50'), 'num_ventas': 2})
+        incremental = sorted(VentaDiaria.objects.values_list('categoria', 'total', 'num_ventas', 'unidades'), key=str)
+
+        reconstruir_ventas_diarias(hoy, hoy)
+        self.assertEqual(resumen_ventas(hoy), resumen)
+        reconstruido = sorted(VentaDiaria.objects.values_list('categoria', 'total', 'num_ventas', 'unidades'), key=str)
+        self.assertEqual(incremental, reconstruido)
+
+    def test_migracion_acumula_las_ventas_existentes(self):
+        from django.apps import apps
+        migracion = import_module('tienda.migrations.0011_ventadiaria')
+        procesar_venta([(self.camisa, 1), (self.taza, 3)], vendedor=self.vendedor)
+        procesar_venta([(self.camisa, 1)])
+        incremental = sorted(VentaDiaria.objects.values_list('categoria', 'vendedor', 'total', 'num_ventas', 'unidades'), key=str)
+
+        VentaDiaria.objects.all().delete()
+        migracion.acumular_ventas_existentes(apps, None)
+        migradas = sorted(VentaDiaria.objects.values_list('categoria', 'vendedor', 'total', 'num_ventas', 'unidades'), key=str)
+        self.assertEqual(migradas, incremental)
+
+
+# ============ REPORTE DE VENTAS ============
+class ReporteVentasTests(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='General')
+        self.productos = [crear_producto(categoria, f'Producto {i}', stock=100) for i in range(3)]
+        self.gerente = User.objects.create_superuser('gerente', 'g@tienda.com', 'x')
+        for _ in range(5):
+            procesar_venta([(p, 1) for p in self.productos], vendedor=self.gerente)
+        # Varias ventas con la misma fecha exacta para probar el desempate por id
+        Venta.objects.update(fecha_venta=timezone.now() - timedelta(days=3))
+
+    def test_paginacion_por_cursor_recorre_todo_sin_repetir(self):
+        desde = timezone.localdate() - timedelta(days=7)
+        detalles = detalles_del_periodo(desde, timezone.localdate()).select_related('venta')
+        vistos, cursor = [], None
+        while True:
+            filas, cursor = pagina_de_detalles(detalles, cursor=cursor, tamano=4)
+            vistos += [fila.pk for fila in filas]
+            if cursor is None:
+                break
+        self.assertEqual(vistos, list(DetalleVenta.objects.order_by('-venta__fecha_venta', '-id').values_list('pk', flat=True)))
+
+    def test_reporte_por_rango_de_fechas(self):
+        reconstruir_ventas_diarias()
+        self.client.force_login(self.gerente)
+        desde = (timezone.localdate() - timedelta(days=7)).isoformat()
+        respuesta = self.client.get('/reporte-ventas/', {'fecha_inicio': desde, 'fecha_fin': timezone.localdate().isoformat()})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['numero_ventas'], 5)
+        self.assertEqual(len(respuesta.context['detalles_ventas']), 15)
+
+    def test_exportacion_csv_y_jsonl_en_streaming(self):
+        self.client.force_login(self.gerente)
+        desde = (timezone.localdate() - timedelta(days=7)).isoformat()
+        hasta = timezone.localdate().isoformat()
+        respuesta = self.client.get('/reporte-ventas/', {'fecha_inicio': desde, 'fecha_fin': hasta, 'formato': 'csv'})
+        self.assertTrue(respuesta.streaming)
+        lineas = b''.join(respuesta.streaming_content).decode().splitlines()
+        self.assertEqual(lineas[0], 'venta,fecha,producto,cliente,vendedor,cantidad,precio_unitario,subtotal')
+        self.assertEqual(len(lineas), 16)
+
+        respuesta = self.client.get('/reporte-ventas/', {'fecha_inicio': desde, 'fecha_fin': hasta, 'formato': 'jsonl'})
+        filas = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).decode().splitlines()]
+        self.assertEqual(len(filas), 15)
+        self.assertEqual(filas[0]['vendedor'], 'gerente')
+
+        # Lotes pequeños: el cursor no debe saltar ni repetir filas con la misma fecha
+        lotes = list(iterar_exportacion(DetalleVenta.objects.all(), tamano_lote=4))
+        self.assertEqual(len(lotes), 15)
+
+    def _consultas_del_reporte(self, **parametros):
+        self.client.force_login(self.gerente)
+        parametros.setdefault('fecha_inicio', (timezone.localdate() - timedelta(days=7)).isoformat())
+        parametros.setdefault('fecha_fin', timezone.localdate().isoformat())
+        self.client.get('/reporte-ventas/', parametros)  # la primera petición resuelve el rol de la sesión
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get('/reporte-ventas/', parametros)
+        self.assertEqual(respuesta.status_code, 200)
+        return len(consultas), respuesta
+
+    def test_consultas_del_reporte_no_crecen_con_las_filas(self):
+        cliente = Cliente.objects.create(
+            nombre='Ana', apellido='Ruiz', email='ana@correo.com', telefono='1', direccion='-'
+        )
+        Venta.objects.update(cliente=cliente)
+        pocas, respuesta = self._consultas_del_reporte()
+        self.assertContains(respuesta, 'Ana')
+
+        for _ in range(10):
+            procesar_venta([(p, 1) for p in self.productos], cliente=cliente, vendedor=self.gerente)
+        muchas, respuesta = self._consultas_del_reporte()
+        self.assertEqual(len(respuesta.context['detalles_ventas']), 45)
+        self.assertEqual(pocas, muchas)
+
+
+# ============ LISTA DE PRODUCTOS ============
+class ProductoListaTests(TestCase):
+
+    def setUp(self):
+        self.ropa = Categoria.objects.create(nombre='Ropa')
+        hogar = Categoria.objects.create(nombre='Hogar')
+        for i in range(30):
+            crear_producto(self.ropa if i % 2 else hogar, f'Producto {i:02d}', stock=i, precio=f'{10 + i}.00')
+        self.client.force_login(User.objects.create_superuser('admin', 'a@tienda.com', 'x'))
+
+    def test_pagina_filtros_y_orden(self):
+        respuesta = self.client.get('/productos/', {'categoria': self.ropa.pk, 'stock_bajo': 'on', 'orden': '-precio'})
+        productos = list(respuesta.context['productos'])
+        self.assertEqual([p.nombre for p in productos], ['Producto 05', 'Producto 03', 'Producto 01'])
+
+        respuesta = self.client.get('/productos/', {'precio_min': '15', 'page': 2})
+        self.assertEqual(respuesta.context['pagina'].paginator.count, 25)
+        self.assertEqual(respuesta.context['pagina'].number, 1)  # solo hay una página
+        self.assertEqual(len(respuesta.context['productos']), 25)
+
+    def test_consultas_no_crecen_con_los_productos(self):
+        self.client.get('/productos/')  # la primera petición resuelve el rol de la sesión
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/productos/')
+        antes = len(consultas)
+        for i in range(30, 60):
+            crear_producto(self.ropa, f'Producto {i}', stock=1)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/productos/')
+        self.assertEqual(antes, len(consultas))
+
+
+# ============ BÚSQUEDA DE PRODUCTOS ============
+class BusquedaProductosTests(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='Electrónica')
+        self.laptop = crear_producto(categoria, 'Laptop UTH Pro', stock=5)
+        self.mouse = crear_producto(categoria, 'Mouse Óptico Inalámbrico', stock=5)
+        self.mouse.descripcion = 'Compatible con laptop'
+        self.mouse.save()
+        self.client.force_login(User.objects.create_user('cajero', password='x'))
+
+    def test_prefijo_ranking_y_endpoint(self):
+        respuesta = self.client.get('/productos/buscar/', {'q': 'lap'})
+        nombres = [r['nombre'] for r in respuesta.json()['resultados']]
+        # La coincidencia en el nombre va antes que la de la descripción
+        self.assertEqual(nombres, ['Laptop UTH Pro', 'Mouse Óptico Inalámbrico'])
+
+        self.assertEqual(
+            [p.pk for p in buscar_productos('optico inalam')], [self.mouse.pk]
+        )
+        self.assertEqual(buscar_productos('"; DROP TABLE'), [])
+
+    def test_indice_sigue_a_los_cambios(self):
+        Producto.objects.filter(pk=self.laptop.pk).update(nombre='Notebook')
+        self.assertEqual([p.pk for p in buscar_productos('notebook')], [self.laptop.pk])
+        self.laptop.delete()
+        self.assertEqual(buscar_productos('notebook'), [])
+
+
+# ============ SELECTOR DE PRODUCTOS EN LA VENTA ============
+class AutocompletarProductoTests(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='General')
+        self.lapiz = crear_producto(categoria, 'Lápiz HB', stock=10, precio='5.00')
+        crear_producto(categoria, 'Lápiz agotado', stock=0)
+        inactivo = crear_producto(categoria, 'Lápiz viejo', stock=3)
+        inactivo.activo = False
+        inactivo.save()
+        for i in range(20):
+            crear_producto(categoria, f'Cuaderno {i}', stock=5)
+        vendedor = User.objects.create_user('vendedor1', password='x')
+        PerfilUsuario.objects.create(user=vendedor, rol='vendedor')
+        self.client.force_login(vendedor)
+
+    def test_solo_activos_con_stock(self):
+        respuesta = self.client.get('/productos/autocompletar/', {'q': 'lápiz'})
+        self.assertEqual(
+            respuesta.json()['resultados'],
+            [{'id': self.lapiz.pk, 'nombre': 'Lápiz HB', 'precio': '5.00', 'stock': 10, 'detalle': '$5.00 · stock 10'}],
+        )
+
+    def test_formulario_de_venta_no_lista_el_catalogo(self):
+        respuesta = self.client.get('/registrar-venta/')
+        self.assertNotContains(respuesta, 'Cuaderno 1')
+        self.assertContains(respuesta, 'data-url="/productos/autocompletar/"')
+
+
+class BusquedaClientesTests(TestCase):
+
+    def setUp(self):
+        self.jose = Cliente.objects.create(
+            nombre='José', apellido='Pérez Núñez', email='jperez@correo.com', telefono='662-555-1234', direccion='x'
+        )
+        self.josefina = Cliente.objects.create(
+            nombre='Josefina', apellido='Ramírez', email='jramirez@correo.com', telefono='6441112233', direccion='x'
+        )
+        Cliente.objects.create(nombre='Ana', apellido='López', email='ana@correo.com', telefono='6629990000', direccion='x')
+
+    def test_prefijo_sin_acentos(self):
+        self.assertEqual(buscar_clientes('jose'), [self.jose, self.josefina])
+        self.assertEqual(buscar_clientes('jose nun')[0], self.jose)
+
+    def test_errores_de_tecleo(self):
+        self.assertEqual(buscar_clientes('Jsoe Perez')[0], self.jose)
+        self.assertEqual(buscar_clientes('ramires')[0], self.josefina)
+
+    def test_email_y_telefono(self):
+        self.assertEqual(buscar_clientes('jramirez@corr'), [self.josefina])
+        self.assertEqual(buscar_clientes('(662) 555-12'), [self.jose])
+
+    def test_edicion_reindexa(self):
+        self.jose.apellido = 'Gutiérrez'
+        self.jose.save()
+        self.assertEqual(buscar_clientes('gutierrez'), [self.jose])
+        self.assertEqual(buscar_clientes('nunez'), [])
+
+    def test_endpoint_y_formulario_de_venta(self):
+        vendedor = User.objects.create_user('vendedor1', password='x')
+        PerfilUsuario.objects.create(user=vendedor, rol='vendedor')
+        self.client.force_login(vendedor)
+        resultados = self.client.get('/clientes/buscar/', {'q': 'ana lo'}).json()['resultados']
+        self.assertEqual([r['nombre'] for r in resultados], ['Ana López'])
+        respuesta = self.client.get('/registrar-venta/')
+        self.assertContains(respuesta, 'data-url="/clientes/buscar/"')
+        self.assertNotContains(respuesta, 'Josefina')
+
+
+# ============ CATÁLOGO EN MEMORIA ============
+class CatalogoTests(TestCase):
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='General')
+        self.lapiz = crear_producto(self.categoria, 'Lápiz', stock=10, precio='5.00')
+        self.goma = crear_producto(self.categoria, 'Goma', stock=10, precio='3.50')
+
+    def test_consultas_sin_tocar_la_base(self):
+        catalogo()
+        with self.assertNumQueries(0):
+            self.assertEqual(catalogo().precio(self.goma.pk), Decimal('3.50'))
+            self.assertEqual(catalogo().nombre(self.lapiz.pk), 'Lápiz')
+            self.assertTrue(catalogo().activo(self.lapiz.pk))
+            self.assertIsNone(catalogo().producto(999999))
+
+    def test_edicion_en_otro_worker_se_ve_al_cambiar_la_version(self):
+        self.assertEqual(catalogo().precio(self.lapiz.pk), Decimal('5.00'))
+        # Otro proceso cambia el precio: aquí solo se ve la versión nueva en la caché compartida
+        Producto.objects.filter(pk=self.lapiz.pk).update(precio_venta=Decimal('6.00'))
+        cache.incr(CLAVE_VERSION)
+        with mock.patch('tienda.catalogo.REVISION_SEGUNDOS', 0):
+            self.assertEqual(catalogo().precio(self.lapiz.pk), Decimal('6.00'))
+
+    def test_list_editable_del_admin_invalida(self):
+        self.assertEqual(catalogo().precio(self.goma.pk), Decimal('3.50'))
+        self.client.force_login(User.objects.create_superuser('admin', 'a@tienda.com', 'x'))
+        datos = {'form-TOTAL_FORMS': 2, 'form-INITIAL_FORMS': 2, '_save': 'Guardar'}
+        for i, producto in enumerate(Producto.objects.order_by('-fecha_creacion', '-id')):
+            datos.update({
+                f'form-{i}-id': producto.pk, f'form-{i}-stock': producto.stock, f'form-{i}-activo': 'on',
+                f'form-{i}-precio_venta': '4.00' if producto.pk == self.goma.pk else producto.precio_venta,
+            })
+        respuesta = self.client.post('/admin/tienda/producto/', datos)
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(catalogo().precio(self.goma.pk), Decimal('4.00'))
+
+    def test_validar_las_lineas_no_consulta_la_base(self):
+        productos = [self.lapiz, self.goma] + [crear_producto(self.categoria, f'Extra {i}', 5) for i in range(4)]
+        datos = {'detalles-TOTAL_FORMS': len(productos), 'detalles-INITIAL_FORMS': 0}
+        for i, producto in enumerate(productos):
+            datos.update({f'detalles-{i}-producto': producto.pk, f'detalles-{i}-cantidad': 1})
+        catalogo()
+        with self.assertNumQueries(0):
+            formset = DetalleVentaFormSet(datos)
+            self.assertTrue(formset.is_valid())
+        self.assertEqual([form.instance.producto.pk for form in formset], [p.pk for p in productos])
+
+    def test_cobro_con_el_catalogo(self):
+        vendedor = User.objects.create_user('vendedor1', password='x')
+        PerfilUsuario.objects.create(user=vendedor, rol='vendedor')
+        self.client.force_login(vendedor)
+        catalogo()
+        respuesta = self.client.post('/registrar-venta/', {
+            'cliente': '',
+            'detalles-TOTAL_FORMS': 2, 'detalles-INITIAL_FORMS': 0,
+            'detalles-0-producto': self.lapiz.pk, 'detalles-0-cantidad': 2,
+            'detalles-1-producto': self.goma.pk, 'detalles-1-cantidad': 1,
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        venta = Venta.objects.get()
+        self.assertEqual(venta.total, Decimal('13.50'))
+        self.lapiz.refresh_from_db()
+        self.assertEqual(self.lapiz.stock, 8)
+
+
+    def test_cobro_con_snapshot_viejo_usa_la_fila_bloqueada(self):
+        snapshot = catalogo()
+        # Cambios que este worker todavía no ve (sin señales ni nueva versión)
+        Producto.objects.filter(pk=self.lapiz.pk).update(precio_venta=Decimal('7.00'))
+        Producto.objects.filter(pk=self.goma.pk).update(activo=False)
+        lapiz = snapshot.producto(self.lapiz.pk)
+        self.assertEqual(lapiz.precio_venta, Decimal('5.00'))
+
+        venta = procesar_venta([(lapiz, 2)])
+        self.assertEqual(venta.total, Decimal('14.00'))
+        self.assertEqual(venta.detalles.get().precio_unitario, Decimal('7.00'))
+        with self.assertRaisesMessage(VentaError, 'no está activo'):
+            procesar_venta([(snapshot.producto(self.goma.pk), 1)])
+        self.assertEqual(Venta.objects.count(), 1)
+
+
+# ============ COBRO IDEMPOTENTE ============
+class IdempotenciaTests(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='General')
+        self.lapiz = crear_producto(categoria, 'Lápiz', stock=10, precio='5.00')
+        vendedor = User.objects.create_user('vendedor1', password='x')
+        PerfilUsuario.objects.create(user=vendedor, rol='vendedor')
+        self.client.force_login(vendedor)
+        self.datos = {
+            'cliente': '', 'clave_idempotencia': 'terminal-1-0001',
+            'detalles-TOTAL_FORMS': 1, 'detalles-INITIAL_FORMS': 0,
+            'detalles-0-producto': self.lapiz.pk, 'detalles-0-cantidad': 2,
+        }
+
+    def test_reintento_devuelve_la_venta_original(self):
+        primera = self.client.post('/registrar-venta/', self.datos)
+        with CaptureQueriesContext(connection) as consultas:
+            segunda = self.client.post('/registrar-venta/', self.datos)
+        self.assertEqual(segunda.status_code, 302)
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertNotIn('Idempotent-Replayed', primera)
+        self.assertFalse(any(c['sql'].startswith(('INSERT', 'UPDATE')) for c in consultas.captured_queries
+                             if 'django_session' not in c['sql']))
+        self.assertEqual(Venta.objects.count(), 1)
+        self.lapiz.refresh_from_db()
+        self.assertEqual(self.lapiz.stock, 8)
+
+    def test_cabecera_y_cobro_fallido_no_consume_la_clave(self):
+        datos = dict(self.datos, clave_idempotencia='', **{'detalles-0-cantidad': 50})
+        self.client.post('/registrar-venta/', datos, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+        datos['detalles-0-cantidad'] = 1
+        self.client.post('/registrar-venta/', datos, HTTP_IDEMPOTENCY_KEY='abc')
+        self.client.post('/registrar-venta/', datos, HTTP_IDEMPOTENCY_KEY='abc')
+        self.assertEqual(Venta.objects.count(), 1)
+
+    def test_otro_integrity_error_del_cobro_no_se_disfraza(self):
+        vendedor = User.objects.get(username='vendedor1')
+        with mock.patch('tienda.ventas.acumular_venta', side_effect=IntegrityError('CHECK constraint failed')):
+            with self.assertRaisesMessage(IntegrityError, 'CHECK constraint failed'):
+                procesar_venta_idempotente('terminal-1-0002', [(self.lapiz, 1)], vendedor=vendedor)
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+        self.assertFalse(Venta.objects.exists())
+
+    def test_claves_vencidas(self):
+        self.client.post('/registrar-venta/', self.datos)
+        ClaveIdempotencia.objects.update(expira_en=timezone.now() - timedelta(seconds=1))
+        call_command('limpiar_vencidos', stdout=StringIO())
+        self.assertFalse(ClaveIdempotencia.objects.exists())
+
+
+# ============ VENTAS EN LOTE ============
+class VentasLoteTests(TestCase):
+
+    def setUp(self):
+        categoria = Categoria.objects.create(nombre='General')
+        self.lapiz = crear_producto(categoria, 'Lápiz', stock=10, precio='5.00')
+        self.goma = crear_producto(categoria, 'Goma', stock=3, precio='2.00')
+        self.vendedor = User.objects.create_user('vendedor1', password='x')
+        PerfilUsuario.objects.create(user=self.vendedor, rol='vendedor')
+
+    def _tickets(self, cantidad, inicio=0):
+        return [
+            {'ticket': f'SUC1-{i}', 'fecha': '2026-01-15T10:00:00', 'lineas': [{'producto': self.lapiz.pk, 'cantidad': 1}]}
+            for i in range(inicio, inicio + cantidad)
+        ]
+
+    def test_lote_por_endpoint_y_reenvio(self):
+        self.client.force_login(self.vendedor)
+        lote = '\n'.join(json.dumps(t) for t in [
+            {'ticket': 'A-1', 'lineas': [{'producto': self.lapiz.pk, 'cantidad': 2}, {'producto': self.goma.pk, 'cantidad': 2}]},
+            {'ticket': 'A-2', 'lineas': [{'producto': self.goma.pk, 'cantidad': 2}]},  # Solo queda 1 goma
+            {'ticket': 'A-3', 'fecha': '2026-01-15T09:30:00', 'lineas': [{'producto': self.lapiz.pk, 'cantidad': 3}]},
+            {'ticket': 'A-1', 'lineas': [{'producto': self.lapiz.pk, 'cantidad': 1}]},
+        ])
+        respuesta = self.client.post('/registrar-venta/lote/', lote, content_type='application/x-ndjson').json()
+        self.assertEqual((respuesta['registrada'], respuesta['duplicada'], respuesta['rechazada']), (2, 1, 1))
+        self.assertEqual([r['estado'] for r in respuesta['resultados']], ['registrada', 'rechazada', 'registrada', 'duplicada'])
+        self.assertEqual(respuesta['resultados'][0]['total'], '14.00')
+        self.assertEqual(respuesta['resultados'][3]['venta'], respuesta['resultados'][0]['venta'])
+
+        self.lapiz.refresh_from_db()
+        self.goma.refresh_from_db()
+        self.assertEqual((self.lapiz.stock, self.goma.stock), (5, 1))
+        self.assertEqual(timezone.localdate(Venta.objects.get(folio='A-3').fecha_venta).isoformat(), '2026-01-15')
+        self.assertEqual(
+            VentaDiaria.objects.filter(categoria__isnull=True).aggregate(total=Sum('total'))['total'], Decimal('29.00')
+        )
+
+        # Reenviar el lote completo no duplica nada
+        respuesta = self.client.post('/registrar-venta/lote/', lote, content_type='application/x-ndjson').json()
+        self.assertEqual(respuesta['duplicada'], 3)
+        self.assertEqual(Venta.objects.count(), 2)
+
+    def test_cuerpo_que_no_es_utf8(self):
+        self.client.force_login(self.vendedor)
+        lote = json.dumps([{'ticket': 'Añil-1', 'lineas': [{'producto': self.lapiz.pk, 'cantidad': 1}]}], ensure_ascii=False)
+        respuesta = self.client.post('/registrar-venta/lote/', lote.encode('latin-1'), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertIn('no es JSON válido', respuesta.json()['error'])
+        self.assertFalse(Venta.objects.exists())
+
+    def test_consultas_no_dependen_del_numero_de_tickets(self):
+        registrar_lote(self._tickets(1), vendedor=self.vendedor)  # Crea las filas del acumulado diario
+        with CaptureQueriesContext(connection) as pocos:
+            registrar_lote(self._tickets(2, inicio=1), vendedor=self.vendedor)
+        with CaptureQueriesContext(connection) as muchos:
+            registrar_lote(self._tickets(6, inicio=3), vendedor=self.vendedor)
+        self.assertEqual(len(pocos), len(muchos))
+        self.lapiz.refresh_from_db()
+        self.assertEqual(self.lapiz.stock, 1)
+        self.assertEqual(MovimientoInventario.objects.filter(tipo='venta').count(), 9)
+
+    def test_folio_registrado_por_otro_envio_mientras_se_bloquea(self):
+        from .ventas import stock_reservado as stock_reservado_real
+
+        def reenvio_simultaneo(productos):
+            # Otro envío del mismo lote confirma SUC1-1 después de la búsqueda de folios
+            Venta.objects.create(folio='SUC1-1', vendido_por=self.vendedor)
+            return stock_reservado_real(productos)
+
+        with mock.patch('tienda.lotes.stock_reservado', side_effect=reenvio_simultaneo):
+            resultados = registrar_lote(self._tickets(3), vendedor=self.vendedor)
+        self.assertEqual([r['estado'] for r in resultados], ['registrada', 'duplicada', 'registrada'])
+        self.assertEqual(resultados[1]['venta'], Venta.objects.get(folio='SUC1-1').pk)
+        self.lapiz.refresh_from_db()
+        self.assertEqual(self.lapiz.stock, 8)
+        self.assertEqual(MovimientoInventario.objects.filter(tipo='venta').count(), 2)
+
+    def test_ticket_atrasado_despues_de_compactar(self):
+        compactar_inventario()
+        ayer = (timezone.localtime() - timedelta(days=1)).replace(tzinfo=None).isoformat()
+        registrar_lote([{'ticket': 'OFF-1', 'fecha': ayer, 'lineas': [{'producto': self.lapiz.pk, 'cantidad': 3}]}],
+                       vendedor=self.vendedor)
+        self.lapiz.refresh_from_db()
+        self.assertEqual(self.lapiz.stock, 7)
+        self.assertEqual(stock_al(self.lapiz, timezone.now()), 7)
+        self.assertEqual(timezone.localtime(Venta.objects.get(folio='OFF-1').fecha_venta).isoformat()[:19], ayer[:19])
+
+    def test_comando_con_archivo_jsonl(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as archivo:
+            archivo.write('\n'.join(json.dumps(t) for t in self._tickets(3)))
+        self.addCleanup(os.remove, archivo.name)
+        salida = StringIO()
+        call_command('importar_ventas_lote', archivo.name, vendedor='vendedor1', lote=2, stdout=salida)
+        self.assertIn('3 ventas registradas', salida.getvalue())
+        self.assertEqual(Venta.objects.filter(vendido_por=self.vendedor).count(), 3)
+
+
+# ============ SINCRONIZACIÓN DE TERMINALES ============
+@mock.patch('tienda.sincronizacion.MARGEN_SEGUNDOS', 0)
+class SincronizacionCatalogoTests(TestCase):
+
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nombre='General')
+        self.productos = [crear_producto(self.categoria, f'Producto {i}', stock=1) for i in range(5)]
+        vendedor = User.objects.create_user('vendedor1', password='x')
+        PerfilUsuario.objects.create(user=vendedor, rol='vendedor')
+        self.client.force_login(vendedor)
+
+    def _sincronizar(self, cursor=None, limite=2):
+        """Pide páginas hasta agotar los cambios; devuelve (ids de productos, bajas, cursor)."""
+        ids, bajas = [], []
+        while True:
+            datos = {'limite': limite}
+            if cursor:
+                datos['cursor'] = cursor
+            pagina = self.client.get('/productos/sincronizar/', datos).json()
+            ids += [producto['id'] for producto in pagina['productos']]
+            bajas += pagina['eliminados']['productos']
+            cursor = pagina['cursor']
+            if not pagina['hay_mas']:
+                return ids, bajas, cursor
+
+    def test_descarga_completa_y_luego_solo_cambios(self):
+        ids, bajas, cursor = self._sincronizar()
+        self.assertEqual(sorted(ids), sorted(p.pk for p in self.productos))
+        self.assertEqual(bajas, [])
+
+        editado, eliminado, con_proveedor = self.productos[1], self.productos[2], self.productos[3]
+        editado.precio_venta = Decimal('12.00')
+        editado.save()
+        eliminado_id = eliminado.pk
+        eliminado.delete()
+        con_proveedor.proveedores.add(Proveedor.objects.create(nombre='Ana', empresa='Papelera'))
+
+        ids, bajas, cursor = self._sincronizar(cursor)
+        self.assertEqual(sorted(ids), sorted([editado.pk, con_proveedor.pk]))
+        self.assertEqual(bajas, [eliminado_id])
+
+        # Sin cambios la consulta no devuelve nada
+        self.assertEqual(self._sincronizar(cursor)[:2], ([], []))
+
+    def test_cursor_vencido_y_cursor_invalido(self):
+        _, _, cursor = self._sincronizar(limite=10)
+        with mock.patch('tienda.sincronizacion.RETENCION_DIAS', 0):
+            respuesta = self.client.get('/productos/sincronizar/', {'cursor': cursor})
+        self.assertEqual(respuesta.status_code, 410)
+        self.assertTrue(respuesta.json()['reiniciar'])
+        self.assertEqual(self.client.get('/productos/sincronizar/', {'cursor': 'basura'}).status_code, 400)
+
+
+# ============ IMPORTACIÓN DEL CATÁLOGO ============
+class ImportarCatalogoTests(TestCase):
+
+    def _archivo(self, sufijo, contenido):
+        with tempfile.NamedTemporaryFile('w', suffix=sufijo, delete=False, encoding='utf-8') as archivo:
+            archivo.write(contenido)
+        self.addCleanup(os.remove, archivo.name)
+        return archivo.name
+
+    def test_csv_y_luego_jsonl_con_upserts(self):
+        csv_ = self._archivo('.csv', (
+            'sku,nombre,categoria,precio_venta,stock,proveedores\n'
+            'A-1,Lápiz HB,Papelería,5.00,100,Papelera Norte|Distribuidora Sur\n'
+            'A-2,Goma,Papelería,2.50,,Papelera Norte\n'
+            'A-3,Sin precio,Papelería,abc,1,\n'
+        ))
+        salida, errores = StringIO(), StringIO()
+        call_command('importar_catalogo', csv_, stdout=salida, stderr=errores)
+        self.assertIn('2 productos creados, 0 actualizados, 1 omitidos', salida.getvalue())
+        self.assertIn('A-3: precio_venta inválido', errores.getvalue())
+        lapiz = Producto.objects.get(sku='A-1')
+        self.assertEqual((lapiz.stock, lapiz.categoria.nombre), (100, 'Papelería'))
+        self.assertEqual(sorted(lapiz.proveedores.values_list('empresa', flat=True)), ['Distribuidora Sur', 'Papelera Norte'])
+        self.assertEqual(stock_al(lapiz, timezone.now()), 100)
+
+        jsonl = self._archivo('.jsonl', '\n'.join(json.dumps(fila) for fila in [
+            {'sku': 'A-1', 'nombre': 'Lápiz HB #2', 'categoria': 'Papelería', 'precio_venta': '6.00', 'stock': 5,
+             'proveedores': ['Distribuidora Sur']},
+            {'sku': 'B-1', 'nombre': 'Cuaderno', 'categoria': 'Cuadernos', 'precio_venta': 30},
+        ]))
+        call_command('importar_catalogo', jsonl, bloque=1, stdout=StringIO())
+        lapiz.refresh_from_db()
+        self.assertEqual((lapiz.nombre, lapiz.precio_venta, lapiz.stock), ('Lápiz HB #2', Decimal('6.00'), 100))
+        self.assertEqual(list(lapiz.proveedores.values_list('empresa', flat=True)), ['Distribuidora Sur'])
+        self.assertEqual(Producto.objects.count(), 3)
+        self.assertEqual(buscar_productos('cuaderno')[0].sku, 'B-1')
+
+    def test_consultas_por_bloque_no_dependen_de_las_filas(self):
+        importador = ImportadorCatalogo()
+        fila = lambda i: {'sku': f'S-{i}', 'nombre': f'P {i}', 'categoria': 'General', 'precio_venta': Decimal('1.00'),
+                          'stock': 1, 'proveedores': ['Acme']}
+        importador.importar_bloque([fila(0)])  # Crea categoría y proveedor
+        with CaptureQueriesContext(connection) as pocas:
+            importador.importar_bloque([fila(i) for i in range(1, 3)])
+        with CaptureQueriesContext(connection) as muchas:
+            importador.importar_bloque([fila(i) for i in range(3, 60)])
+        self.assertEqual(len(pocas), len(muchas))
+
+
+class GenerarDatosTests(TestCase):
+
+    def test_genera_datos_consistentes_y_reproducibles(self):
+        opciones = dict(semilla=3, categorias=3, proveedores=4, productos=30, clientes=40, vendedores=3, ventas=400,
+                        dias=60, hasta=date(2026, 3, 31), stdout=StringIO())
+        call_command('generar_datos', **opciones)
+        self.assertEqual(Venta.objects.count(), 400)
+        self.assertEqual(Venta.objects.aggregate(t=Sum('total'))['t'], DetalleVenta.objects.aggregate(t=Sum('subtotal'))['t'])
+        # El stock final coincide con el kardex y los acumulados con las ventas
+        producto = Producto.objects.filter(sku__startswith='GEN3-').order_by('-stock').first()
+        self.assertEqual(stock_al(producto, timezone.now()), producto.stock)
+        self.assertEqual(VentaDiaria.objects.filter(categoria__isnull=True).aggregate(n=Sum('num_ventas'))['n'], 400)
+        cliente = Cliente.objects.filter(email__endswith='@gen3.example').first()
+        self.assertEqual(buscar_clientes(f'{cliente.nombre} {cliente.apellido}')[0].nombre, cliente.nombre)
+
+        firma = list(Venta.objects.order_by('folio').values_list('folio', 'fecha_venta', 'total')[:50])
+        with self.assertRaises(CommandError):
+            call_command('generar_datos', **opciones)
+        Venta.objects.all().delete()
+        Producto.objects.all().delete()
+        Categoria.objects.all().delete()
+        Proveedor.objects.all().delete()
+        Cliente.objects.all().delete()
+        User.objects.all().delete()
+        call_command('generar_datos', **opciones)
+        self.assertEqual(list(Venta.objects.order_by('folio').values_list('folio', 'fecha_venta', 'total')[:50]), firma)
+
+
+class AprovisionarUsuariosTests(TestCase):
+
+    def test_alta_en_bloque_idempotente(self):
+        filas = [
+            {'username': 'vend1', 'rol': 'vendedor', 'password': 'Secreta-123', 'departamento': 'Norte'},
+            {'username': 'ger1', 'rol': 'Gerente'},
+            {'username': 'cli1', 'rol': 'cliente', 'password': 'Otra-clave-9', 'email': 'cli1@correo.com',
+             'first_name': 'Rosa', 'last_name': 'Ortiz'},
+            {'username': 'x', 'rol': 'jefe'},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as archivo:
+            archivo.write('\n'.join(json.dumps(fila) for fila in filas))
+        self.addCleanup(os.remove, archivo.name)
+        existente = User.objects.create_user('ger1', password='previa')
+
+        errores = StringIO()
+        call_command('aprovisionar_usuarios', archivo.name, procesos=2, bloque=2, stdout=StringIO(), stderr=errores)
+        self.assertIn('rol desconocido', errores.getvalue())
+        vendedor = User.objects.get(username='vend1')
+        self.assertTrue(vendedor.check_password('Secreta-123'))
+        self.assertEqual((vendedor.perfil.rol, vendedor.perfil.departamento), ('vendedor', 'Norte'))
+        self.assertEqual(list(vendedor.groups.values_list('name', flat=True)), ['vendedor'])
+        # La cuenta existente conserva su contraseña y recibe el perfil que le faltaba
+        existente.refresh_from_db()
+        self.assertTrue(existente.check_password('previa'))
+        self.assertEqual(existente.perfil.rol, 'gerente')
+        cliente = Cliente.objects.get(usuario__username='cli1')
+        self.assertTrue(cliente.usuario.check_password('Otra-clave-9'))
+        self.assertEqual(buscar_clientes('rosa ortiz')[0], cliente)
+
+        salida = StringIO()
+        with CaptureQueriesContext(connection) as consultas:
+            call_command('aprovisionar_usuarios', archivo.name, procesos=1, stdout=salida, stderr=StringIO())
+        self.assertIn('0 usuarios creados, 3 existentes', salida.getvalue())
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(PerfilUsuario.objects.count(), 2)
+        self.assertFalse([c for c in consultas.captured_queries if c['sql'].startswith('INSERT INTO "auth_user"')])
+
+
+    def test_email_de_cliente_ocupado_no_crea_la_cuenta(self):
+        previo = User.objects.create_user('cli0', password='x')
+        Cliente.objects.create(usuario=previo, nombre='Ana', apellido='Paz', email='ana@correo.com', telefono='1', direccion='-')
+        filas = [
+            {'username': 'cli1', 'rol': 'cliente', 'password': 'Clave-123', 'email': 'ana@correo.com'},
+            {'username': 'cli2', 'rol': 'cliente', 'password': 'Clave-123', 'email': 'luis@correo.com'},
+            {'username': 'cli3', 'rol': 'cliente', 'password': 'Clave-123', 'email': 'luis@correo.com'},
+        ]
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as archivo:
+            archivo.write('\n'.join(json.dumps(fila) for fila in filas))
+        self.addCleanup(os.remove, archivo.name)
+
+        salida, errores = StringIO(), StringIO()
+        call_command('aprovisionar_usuarios', archivo.name, procesos=1, stdout=salida, stderr=errores)
+        self.assertIn('1 usuarios creados, 0 existentes, 2 omitidos', salida.getvalue())
+        self.assertIn('cli1: el email ana@correo.com ya es de otro cliente (cli0)', errores.getvalue())
+        self.assertIn('cli3: el email luis@correo.com ya es de otro cliente (cli2)', errores.getvalue())
+        self.assertFalse(User.objects.filter(username__in=['cli1', 'cli3']).exists())
+        self.assertEqual(Cliente.objects.get(email='luis@correo.com').usuario.username, 'cli2')
+
+
+class BenchmarksTests(TestCase):
+
+    def test_todas_las_urls_tienen_escenario(self):
+        self.assertEqual(urls_sin_escenario(), [])
+
+    def test_escenarios_responden_lo_esperado(self):
+        GeneradorDatos(semilla=9, dias=30, hasta=HASTA_BENCHMARK).generar(volumenes(
+            categorias=2, proveedores=2, productos=10, clientes=10, vendedores=2, ventas=60
+        ))
+        contexto = preparar_contexto()
+        resultados = {escenario.nombre: medir(escenario, contexto, repeticiones=1, calentamiento=0) for escenario in ESCENARIOS}
+        self.assertEqual(
+            {nombre: metricas['estado'] for nombre, metricas in resultados.items()},
+            {escenario.nombre: escenario.estado for escenario in ESCENARIOS},
+        )
+
+    def test_comparar_marca_regresiones(self):
+        base = {'1k': {'escenarios': {'dashboard': {'p50_ms': 10.0, 'p90_ms': 12.0, 'consultas': 3, 'estado': 200}}}}
+        ruido = {'1k': {'escenarios': {'dashboard': {'p50_ms': 11.0, 'p90_ms': 14.5, 'consultas': 3, 'estado': 200}}}}
+        self.assertEqual(comparar(base, ruido), [])
+        peor = {'1k': {'escenarios': {'dashboard': {'p50_ms': 20.0, 'p90_ms': 13.0, 'consultas': 5, 'estado': 500}}}}
+        self.assertEqual(len(comparar(base, peor)), 3)
+
+
+# ============ DASHBOARD ============
+class DashboardTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser('admin', 'a@tienda.com', 'x'))
+        self.categoria = Categoria.objects.create(nombre='General')
+
+    def test_contadores_en_cache_e_invalidados_por_senales(self):
+        self.assertEqual(self.client.get('/').context['total_productos'], 0)
+        with CaptureQueriesContext(connection) as consultas:
+            self.client.get('/')
+        # Sesión, usuario y el acumulado de ventas de hoy; ningún COUNT
+        self.assertFalse(any('COUNT' in c['sql'] for c in consultas.captured_queries))
+
+        producto = crear_producto(self.categoria, 'Nuevo', stock=1)
+        self.assertEqual(self.client.get('/').context['total_productos'], 1)
+        producto.delete()
+        self.assertEqual(self.client.get('/').context['total_productos'], 0)
+
+
+# ============ ROL POR SESIÓN ============
+class RolMiddlewareTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = User.objects.create_user('vendedor1', password='x')
+        self.perfil = PerfilUsuario.objects.create(user=self.usuario, rol='vendedor')
+        self.client.force_login(self.usuario)
+
+    def _vencer_revision(self):
+        """Simula que pasó TIENDA_ROL_REVISION_SEGUNDOS desde la última revisión del sello."""
+        sesion = self.client.session
+        sesion['rol_revisar_en'] = 0
+        sesion.save()
+
+    def test_rol_se_resuelve_una_vez_y_se_invalida_al_cambiar(self):
+        self.assertEqual(self.client.get('/proveedores/').wsgi_request.rol, 'vendedor')
+        # Sesión, usuario y el listado: ni el perfil ni el sello del caché (DatabaseCache)
+        with self.assertNumQueries(3):
+            respuesta = self.client.get('/proveedores/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertContains(respuesta, 'Clientes')  # menú de empleado en base.html
+
+        # Un vendedor no puede crear; al subir a gerente el cambio se ve al revisar el sello
+        self.assertEqual(self.client.get('/proveedores/crear/').status_code, 302)
+        self.perfil.rol = 'gerente'
+        self.perfil.save()
+        self._vencer_revision()
+        self.assertEqual(self.client.get('/proveedores/crear/').status_code, 200)
+
+    def test_administrador_degradado_pierde_el_acceso(self):
+        admin = User.objects.create_user('admin1', password='x')
+        perfil = PerfilUsuario.objects.create(user=admin, rol='administrador')
+        producto = crear_producto(Categoria.objects.create(nombre='General'), 'Lápiz', 5)
+        self.client.force_login(admin)
+        self.assertEqual(self.client.get(f'/productos/eliminar/{producto.pk}/').status_code, 200)
+
+        # Las escrituras comparan el sello siempre: la degradación aplica en la siguiente
+        perfil.rol = 'vendedor'
+        perfil.save()
+        self.assertRedirects(self.client.post(f'/productos/eliminar/{producto.pk}/'), '/dashboard/',
+                             fetch_redirect_response=False)
+        self.assertTrue(Producto.objects.filter(pk=producto.pk).exists())
+        # Las lecturas, al terminar la ventana de revisión
+        self._vencer_revision()
+        self.assertRedirects(self.client.get(f'/productos/eliminar/{producto.pk}/'), '/dashboard/',
+                             fetch_redirect_response=False)
+        perfil.delete()
+        self._vencer_revision()
+        self.assertRedirects(self.client.get(f'/productos/eliminar/{producto.pk}/'), '/dashboard/',
+                             fetch_redirect_response=False)
+
+    def test_cache_local_al_proceso_no_pasa_la_revision(self):
+        from django.core.checks import run_checks
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            self.assertIn('tienda.E001', [error.id for error in run_checks()])
+            with self.settings(TIENDA_CACHE_LOCAL_PERMITIDO=True):
+                self.assertNotIn('tienda.E001', [error.id for error in run_checks()])
+        self.assertNotIn('tienda.E001', [error.id for error in run_checks()])
+
+    def test_cliente_con_cuenta(self):
+        cliente_user = User.objects.create_user('cliente1', password='x')
+        Cliente.objects.create(usuario=cliente_user, nombre='C', apellido='P', email='c@p.com', telefono='1', direccion='-')
+        self.client.force_login(cliente_user)
+        self.assertEqual(self.client.get('/cliente/dashboard/').status_code, 200)
+        self.assertEqual(self.client.get('/proveedores/').status_code, 302)
+
+
+class MedicionMiddlewareTests(TestCase):
+
+    def setUp(self):
+        gerente = User.objects.create_user('gerente1', password='x')
+        PerfilUsuario.objects.create(user=gerente, rol='gerente')
+        self.client.force_login(gerente)
+
+    @override_settings(TIENDA_SERVER_TIMING=True)
+    def test_server_timing_y_linea_de_registro(self):
+        with self.assertLogs('tienda.rendimiento', 'INFO') as registro:
+            respuesta = self.client.get('/reporte-ventas/')
+        linea = json.loads(registro.records[0].getMessage())
+        self.assertEqual((linea['vista'], linea['estado']), ('reporte_ventas', 200))
+        self.assertGreater(linea['plantillas_ms'], 0)
+        self.assertIn(f'db;dur={linea["db_ms"]};desc="{linea["consultas"]} consultas"', respuesta['Server-Timing'])
+        self.assertIn('plantillas;dur=', respuesta['Server-Timing'])
+
+    @override_settings(TIENDA_PRESUPUESTO_ESTRICTO=True)
+    def test_consultas_del_cache_cuentan_en_el_presupuesto(self):
+        # Cachés frías: el rol y el reporte se calculan y se guardan en el DatabaseCache
+        with self.assertLogs('tienda.rendimiento', 'INFO') as registro, \
+                CaptureQueriesContext(connection) as consultas:
+            self.assertEqual(self.client.get('/reporte-ventas/').status_code, 200)
+        linea = json.loads(registro.records[0].getMessage())
+        sentencias = [c['sql'] for c in consultas.captured_queries if not c['sql'].startswith('SAVEPOINT')
+                      and not c['sql'].startswith('RELEASE SAVEPOINT')]
+        self.assertEqual(linea['consultas'], len(sentencias))
+        self.assertEqual(linea['consultas_cache'], sum('tienda_cache' in sql for sql in sentencias))
+        self.assertGreater(linea['consultas_cache'], 0)
+        self.assertLessEqual(linea['consultas'], PRESUPUESTO_CONSULTAS['reporte_ventas'])
+
+    @override_settings(TIENDA_PRESUPUESTO_CONSULTAS={'reporte_ventas': 1})
+    def test_presupuesto_excedido_avisa_o_falla(self):
+        with self.assertLogs('tienda.rendimiento', 'WARNING') as registro:
+            self.assertEqual(self.client.get('/reporte-ventas/').status_code, 200)
+        self.assertIn('presupuesto 1', registro.output[0])
+        with override_settings(TIENDA_PRESUPUESTO_ESTRICTO=True), self.assertRaises(PresupuestoExcedido):
+            self.client.get('/reporte-ventas/')
+
+
+class PerfiladorTests(TestCase):
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+        self.staff = User.objects.create_user('gerente1', password='x', is_staff=True)
+        PerfilUsuario.objects.create(user=self.staff, rol='gerente')
+        self.client.force_login(self.staff)
+
+    def test_captura_rota_y_se_lista_en_el_admin(self):
+        with override_settings(TIENDA_PERFILADOR=True, TIENDA_PERFILES_DIR=self.directorio, TIENDA_PERFILES_MAX=2):
+            nombres = [self.client.get('/reporte-ventas/', {'perfilar': 1})['X-Perfil'] for _ in range(3)]
+            self.assertTrue(all(nombre.startswith('reporte_ventas-') and nombre.endswith('.prof') for nombre in nombres))
+            self.assertEqual(sorted(os.listdir(self.directorio)), sorted(nombres[1:]))
+            self.assertNotIn('X-Perfil', self.client.get('/reporte-ventas/'))
+
+            lista = self.client.get('/admin/perfiles/')
+            self.assertContains(lista, nombres[2])
+            self.assertNotContains(lista, nombres[0])
+            self.assertContains(self.client.get(f'/admin/perfiles/{nombres[2]}/'), 'reporte_ventas')
+            self.assertEqual(self.client.get('/admin/perfiles/..%2Fdb.sqlite3/').status_code, 404)
+
+    def test_requiere_ajuste_y_usuario_staff(self):
+        with override_settings(TIENDA_PERFILES_DIR=self.directorio):
+            self.assertNotIn('X-Perfil', self.client.get('/reporte-ventas/', HTTP_X_PERFILAR='1'))
+        vendedor = User.objects.create_user('vendedor1', password='x')
+        PerfilUsuario.objects.create(user=vendedor, rol='vendedor')
+        self.client.force_login(vendedor)
+        with override_settings(TIENDA_PERFILADOR=True, TIENDA_PERFILES_DIR=self.directorio):
+            self.assertNotIn('X-Perfil', self.client.get('/reporte-ventas/', {'perfilar': 1}))
+            self.assertEqual(self.client.get('/admin/perfiles/').status_code, 302)
+        self.assertEqual(os.listdir(self.directorio), [])
+
+
+# ============ RÉPLICA DE LECTURA ============
+@skipUnless(connection.vendor == 'sqlite', 'La réplica se simula copiando el archivo SQLite')
+class ReplicaLecturaTests(TransactionTestCase):
+    """La réplica es una copia de la primaria tomada en setUp: lo creado después simula el retraso."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # El alias se agrega después de preparar las bases de prueba: no existe en DATABASES
+        cls.directorio = tempfile.mkdtemp()
+        ajustes = connections.settings['default']
+        connections.settings[routers.ALIAS_REPLICA] = {
+            **ajustes, 'NAME': os.path.join(cls.directorio, 'replica.sqlite3'),
+            # MIRROR: el flush entre pruebas no toca la réplica
+            'TEST': {**ajustes['TEST'], 'MIRROR': 'default'},
+        }
+        cls.databases = {'default', routers.ALIAS_REPLICA}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[routers.ALIAS_REPLICA].close()
+        del connections[routers.ALIAS_REPLICA]
+        del connections.settings[routers.ALIAS_REPLICA]
+        del cls.databases
+        shutil.rmtree(cls.directorio)
+        super().tearDownClass()
+
+    def setUp(self):
+        gerente = User.objects.create_user('gerente1', password='x')
+        PerfilUsuario.objects.create(user=gerente, rol='gerente')
+        Categoria.objects.create(nombre='Replicada')
+        replica = connections[routers.ALIAS_REPLICA]
+        replica.close()
+        connection.ensure_connection()
+        copia = sqlite3.connect(replica.settings_dict['NAME'])
+        connection.connection.backup(copia)
+        copia.close()
+        self.addCleanup(setattr, routers, '_replica_caida_hasta', 0.0)
+        Categoria.objects.create(nombre='Sin replicar')
+        self.client.force_login(gerente)
+
+    def test_listado_lee_de_la_replica_y_la_sesion_se_pega_tras_escribir(self):
+        respuesta = self.client.get('/categorias/')
+        self.assertContains(respuesta, 'Replicada')
+        self.assertNotContains(respuesta, 'Sin replicar')
+        # Las vistas que no están en VISTAS_REPLICA leen siempre de la primaria
+        pk = Categoria.objects.get(nombre='Sin replicar').pk
+        self.assertEqual(self.client.get(f'/categorias/editar/{pk}/').status_code, 200)
+
+        self.client.post('/categorias/crear/', {'nombre': 'Recién creada', 'descripcion': ''})
+        respuesta = self.client.get('/categorias/')
+        self.assertContains(respuesta, 'Sin replicar')
+        self.assertContains(respuesta, 'Recién creada')
+
+        with override_settings(TIENDA_REPLICA_RETRASO_SEGUNDOS=0):
+            self.client.post('/categorias/crear/', {'nombre': 'Otra', 'descripcion': ''})
+        self.assertNotContains(self.client.get('/categorias/'), 'Sin replicar')
+
+    def test_replica_caida_usa_la_primaria(self):
+        replica = connections[routers.ALIAS_REPLICA]
+        replica.close()
+        with mock.patch.dict(replica.settings_dict, NAME=os.path.join(self.directorio, 'no-existe', 'replica.sqlite3')):
+            with self.assertLogs('tienda.routers', 'WARNING'):
+                respuesta = self.client.get('/categorias/')
+            self.assertContains(respuesta, 'Sin replicar')
+            # Marcada caída: no se reintenta en cada petición
+            with mock.patch.object(replica, 'ensure_connection') as conectar:
+                self.assertContains(self.client.get('/categorias/'), 'Sin replicar')
+            conectar.assert_not_called()
+
+
+# ============ PRUEBA DE ESTRÉS: REENVÍOS CONCURRENTES DE UN LOTE ============
+class ReenvioLoteConcurrenteTests(TransactionTestCase):
+    """La sucursal reenvía el lote tras un timeout mientras el primer envío sigue en curso."""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Requiere una base de datos de pruebas accesible desde varios hilos.')
+
+    def test_dos_envios_del_mismo_lote(self):
+        producto = crear_producto(Categoria.objects.create(nombre='General'), 'Lápiz', 50)
+        vendedor = User.objects.create_user('vendedor1', password='x')
+        tickets = [{'ticket': f'SUC1-{i}', 'lineas': [{'producto': producto.pk, 'cantidad': 2}]} for i in range(5)]
+        inicio = threading.Barrier(2)
+        resultados, errores = [], []
+
+        def envio():
+            inicio.wait()
+            try:
+                for _ in range(50):  # reintentos ante bloqueos del motor (SQLite)
+                    try:
+                        resultados.append(registrar_lote(tickets, vendedor=vendedor))
+                        break
+                    except OperationalError:
+                        continue
+            except Exception as e:
+                errores.append(e)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        hilos = [threading.Thread(target=envio) for _ in range(2)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(len(resultados), 2)
+        for i in range(5):
+            estados = sorted(resultado[i]['estado'] for resultado in resultados)
+            self.assertEqual(estados, ['duplicada', 'registrada'])
+            self.assertEqual(resultados[0][i]['venta'], resultados[1][i]['venta'])
+        self.assertEqual(Venta.objects.count(), 5)
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock, 40)
+
+
+# ============ PRUEBA DE ESTRÉS: COBROS CONCURRENTES ============
+class CobroConcurrenteTests(TransactionTestCase):
+    """Varios cajeros cobran a la vez los mismos productos: nunca debe venderse más del stock."""
+
+    HILOS = 12
+    STOCK_INICIAL = 20
+
+    def setUp(self):
+        # Una base SQLite en memoria no se comparte entre hilos; MySQL o SQLite en archivo sí
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('Requiere una base de datos de pruebas accesible desde varios hilos.')
+
+    def test_sin_sobreventa_con_cobros_concurrentes(self):
+        categoria = Categoria.objects.create(nombre='General')
+        productos = [crear_producto(categoria, f'Producto {i}', self.STOCK_INICIAL) for i in range(3)]
+        vendedor = User.objects.create_user('cajero', password='x')
+        inicio = threading.Barrier(self.HILOS)
+        resultados = []
+
+        def cajero(indice):
+            # Cada hilo arma el carrito en distinto orden para provocar cruces de bloqueos
+            carrito = productos[indice % 3:] + productos[:indice % 3]
+            inicio.wait()
+            try:
+                for _ in range(4):
+                    for _ in range(20):  # reintentos ante bloqueos del motor (SQLite)
+                        try:
+                            procesar_venta([(p, 2) for p in carrito], vendedor=vendedor)
+                            resultados.append('ok')
+                            break
+                        except OperationalError:
+                            continue
+                        except VentaError:
+                            resultados.append('sin_stock')
+                            break
+            finally:
+                close_old_connections()
+                connection.close()
+
+        hilos = [threading.Thread(target=cajero, args=(i,)) for i in range(self.HILOS)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        vendidas = resultados.count('ok')
+        self.assertEqual(vendidas, self.STOCK_INICIAL // 2)
+        self.assertEqual(Venta.objects.count(), vendidas)
+        for producto in productos:
+            producto.refresh_from_db()
+            self.assertEqual(producto.stock, self.STOCK_INICIAL - 2 * vendidas)
+            self.assertEqual(
+                DetalleVenta.objects.filter(producto=producto).count(), vendidas
+            )
@@ -0,0 +1,71 @@
+# tienda/texto.py
+# ===================================================================
+# Normalización de texto y trigramas para las búsquedas aproximadas.
+# Funciones puras (sin modelos) para poder usarlas también desde las
+# migraciones.
+# ===================================================================
+
+import re
+import unicodedata
+
+_TOKEN = re.compile(r'[a-z0-9]+')
+_TELEFONO = re.compile(r'[\d\s\-.()+]+')
+
+# Relleno de inicio y fin de palabra. No se usa espacio: en MySQL las intercalaciones
+# PAD SPACE ignoran los espacios finales al comparar.
+INICIO, FIN = '^', '$'
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y solo letras/dígitos: 'José Pérez-Núñez' -> ['jose', 'perez', 'nunez']."""
+    texto = unicodedata.normalize('NFKD', texto or '')
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return _TOKEN.findall(texto)
+
+
+def solo_digitos(texto):
+    return ''.join(c for c in texto or '' if c.isdigit())
+
+
+def es_telefono(texto):
+    """True si el texto parece un teléfono (dígitos con espacios, guiones, puntos, paréntesis o +)."""
+    return bool(_TELEFONO.fullmatch(texto or '')) and len(solo_digitos(texto)) >= 2
+
+
+def clave_de_busqueda(nombre, apellido, email, telefono, largo=400):
+    """
+    Clave de búsqueda de un cliente: palabras normalizadas de nombre, apellido y email
+    y el teléfono como una sola palabra de dígitos ('662-555-1234' -> '6625551234').
+    """
+    tokens = normalizar(f'{nombre} {apellido} {email}')
+    digitos = solo_digitos(telefono)
+    if digitos:
+        tokens.append(digitos)
+    return ' '.join(tokens)[:largo]
+
+
+def trigramas(tokens, prefijo=False):
+    """
+    Conjunto de trigramas de las palabras, con marcas de inicio y fin ('^ju', 'jua', 'uan', 'an$').
+    Con `prefijo=True` la última palabra no lleva marca de fin porque el usuario aún la está escribiendo.
+    """
+    resultado = set()
+    for indice, token in enumerate(tokens):
+        final = '' if prefijo and indice == len(tokens) - 1 else FIN
+        palabra = f'{INICIO}{token}{final}'
+        resultado.update(palabra[i:i + 3] for i in range(len(palabra) - 2))
+    return resultado
+
+
+def similitud(a, b):
+    """Índice de Jaccard entre dos conjuntos de trigramas."""
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def cobertura(consulta, candidato):
+    """Fracción de los trigramas de la consulta presentes en el candidato (como word_similarity de pg_trgm)."""
+    if not consulta:
+        return 0.0
+    return len(consulta & candidato) / len(consulta)
@@ -20,6 +20,9 @@ urlpatterns = [
     # CRUD PRODUCTOS
     # ==============================
     path('productos/', views.producto_lista, name='producto_lista'),
+    path('productos/buscar/', views.producto_buscar, name='producto_buscar'),
+    path('productos/autocompletar/', views.producto_autocompletar, name='producto_autocompletar'),
+    path('productos/sincronizar/', views.sincronizar_catalogo, name='sincronizar_catalogo'),
     path('productos/crear/', views.producto_crear, name='producto_crear'),
     path('productos/editar/<int:pk>/', views.producto_editar, name='producto_editar'),
     path('productos/eliminar/<int:pk>/', views.producto_eliminar, name='producto_eliminar'),
@@ -44,6 +47,7 @@ urlpatterns = [
     # CRUD CLIENTES
     # ==============================
     path('clientes/', views.cliente_lista, name='cliente_lista'),
+    path('clientes/buscar/', views.cliente_buscar, name='cliente_buscar'),
     path('clientes/crear/', views.cliente_crear, name='cliente_crear'),
     path('clientes/editar/<int:pk>/', views.cliente_editar, name='cliente_editar'),
     path('clientes/eliminar/<int:pk>/', views.cliente_eliminar, name='cliente_eliminar'),
@@ -54,5 +58,6 @@ urlpatterns = [
     # REPORTES
     # ==============================
     path('registrar-venta/', views.registrar_venta, name='registrar_venta'),
+    path('registrar-venta/lote/', views.registrar_ventas_lote, name='registrar_ventas_lote'),
     path('reporte-ventas/', views.reporte_ventas, name='reporte_ventas'),
 ]
@@ -0,0 +1,287 @@
+# tienda/ventas.py
+# ===================================================================
+# Servicio de cobro (checkout) para registrar ventas completas.
+# Valida todo el carrito en memoria, descuenta el stock con UPDATE
+# condicionales y guarda los detalles (y su salida en el kardex) con
+# inserciones masivas.
+# ===================================================================
+
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import Producto, Venta, DetalleVenta, ReservaStock, ClaveIdempotencia, totales_diferidos
+from .inventario import movimientos_de_venta, registrar_movimientos, sincronizar_stock_guardado
+from .reportes import acumular_venta
+
+# Minutos que dura un apartado de stock si el cobro se abandona
+RESERVA_MINUTOS = getattr(settings, 'TIENDA_RESERVA_MINUTOS', 10)
+# Horas durante las que un reintento con la misma clave devuelve la venta original
+IDEMPOTENCIA_HORAS = getattr(settings, 'TIENDA_IDEMPOTENCIA_HORAS', 24)
+
+
+class VentaError(Exception):
+    """Error de negocio al registrar una venta (carrito inválido, sin precio, etc.)."""
+
+
+class StockInsuficiente(VentaError):
+    """El producto no tiene stock suficiente para cubrir la cantidad solicitada."""
+
+    def __init__(self, producto, solicitado, disponible=None):
+        self.producto = producto
+        self.solicitado = solicitado
+        self.disponible = disponible
+        super().__init__(f'Stock insuficiente para {producto.nombre}')
+
+
+def agrupar_lineas(lineas):
+    """
+    Agrupa las líneas del carrito por producto sumando sus cantidades.
+    Recibe pares (producto, cantidad) y devuelve un dict {producto_id: [producto, cantidad]}
+    conservando el orden de captura.
+    """
+    carrito = {}
+    for producto, cantidad in lineas:
+        if producto is None or not cantidad:
+            continue
+        if cantidad < 0:
+            raise VentaError(f'Cantidad inválida para {producto.nombre}')
+        if producto.pk in carrito:
+            carrito[producto.pk][1] += cantidad
+        else:
+            carrito[producto.pk] = [producto, cantidad]
+    return carrito
+
+
+def validar_carrito(carrito):
+    """Valida el carrito completo antes de escribir en la base de datos."""
+    if not carrito:
+        raise VentaError('La venta debe incluir al menos un producto.')
+
+    for producto, cantidad in carrito.values():
+        if not producto.activo:
+            raise VentaError(f'El producto {producto.nombre} no está activo.')
+        if producto.precio_venta is None:
+            raise VentaError(f'El producto {producto.nombre} no tiene precio de venta.')
+        # Chequeo rápido con el stock ya cargado (los productos del catálogo en memoria no lo traen);
+        # la garantía real la da el UPDATE condicional
+        if 'stock' in producto.__dict__ and producto.stock < cantidad:
+            raise StockInsuficiente(producto, cantidad, producto.stock)
+
+
+def descontar_stock(carrito):
+    """
+    Descuenta el stock con un UPDATE condicional por producto:
+    UPDATE producto SET stock = stock - n WHERE id = ? AND stock >= n
+    Si alguna fila no se actualiza, no había stock y se lanza StockInsuficiente.
+    Los productos se recorren en orden de id para que dos cobros concurrentes
+    tomen los bloqueos de fila siempre en el mismo orden.
+    """
+    for producto_id in sorted(carrito):
+        producto, cantidad = carrito[producto_id]
+        actualizados = Producto.objects.filter(
+            pk=producto_id, stock__gte=cantidad
+        ).update(stock=F('stock') - cantidad)
+        if not actualizados:
+            raise StockInsuficiente(producto, cantidad)
+        producto.stock -= cantidad
+        sincronizar_stock_guardado(producto)
+
+
+# ============ BLOQUEOS Y RESERVAS DE STOCK ============
+def bloquear_productos(producto_ids):
+    """
+    Bloquea las filas de los productos con SELECT ... FOR UPDATE, siempre en orden de id.
+    Como todos los cobros piden los bloqueos en el mismo orden, dos carritos concurrentes
+    con productos en común no pueden quedar en interbloqueo (deadlock).
+    Debe llamarse dentro de transaction.atomic().
+    """
+    productos = Producto.objects.select_for_update().filter(
+        pk__in=list(producto_ids)
+    ).order_by('pk').only('id', 'nombre', 'stock', 'categoria', 'precio_venta', 'activo')
+    return {producto.pk: producto for producto in productos}
+
+
+def stock_reservado(producto_ids, excluir_token=None):
+    """Suma, por producto, las reservas vigentes (no caducadas) en una sola consulta."""
+    reservas = ReservaStock.objects.filter(
+        producto_id__in=list(producto_ids), expira_en__gt=timezone.now()
+    )
+    if excluir_token:
+        reservas = reservas.exclude(token=excluir_token)
+    return dict(
+        reservas.values('producto_id').annotate(total=Sum('cantidad')).values_list('producto_id', 'total')
+    )
+
+
+def verificar_disponibilidad(carrito, excluir_token=None):
+    """
+    Bloquea los productos del carrito y comprueba que sigan activos, con precio, y que el
+    stock libre (stock menos reservas ajenas vigentes) alcance para cada línea.
+    El precio y el estado se copian de la fila bloqueada al producto del carrito: el que
+    viene del catálogo en memoria puede estar desactualizado.
+    """
+    bloqueados = bloquear_productos(carrito)
+    reservado = stock_reservado(carrito, excluir_token=excluir_token)
+    for producto_id in sorted(carrito):
+        producto, cantidad = carrito[producto_id]
+        actual = bloqueados.get(producto_id)
+        if actual is None:
+            raise VentaError(f'El producto {producto.nombre} ya no existe.')
+        if not actual.activo:
+            raise VentaError(f'El producto {producto.nombre} no está activo.')
+        if actual.precio_venta is None:
+            raise VentaError(f'El producto {producto.nombre} no tiene precio de venta.')
+        disponible = actual.stock - reservado.get(producto_id, 0)
+        if disponible < cantidad:
+            raise StockInsuficiente(producto, cantidad, max(disponible, 0))
+        # El producto del carrito puede venir del catálogo en memoria: se completa con la fila bloqueada
+        producto.stock = actual.stock
+        producto.categoria_id = actual.categoria_id
+        producto.precio_venta = actual.precio_venta
+        producto.activo = actual.activo
+        sincronizar_stock_guardado(producto)
+
+
+def reservar_stock(lineas, minutos=None, token=None):
+    """
+    Aparta stock para un carrito durante `minutos` (por defecto RESERVA_MINUTOS).
+    Devuelve el token de la reserva, que luego se pasa a procesar_venta(reserva=token).
+    Si el cobro se abandona, la reserva simplemente caduca y deja de contar.
+    Reservar de nuevo con el mismo token reemplaza la reserva anterior.
+    """
+    carrito = agrupar_lineas(lineas)
+    if not carrito:
+        raise VentaError('No hay productos que reservar.')
+    token = token or uuid.uuid4().hex
+    ahora = timezone.now()
+    expira_en = ahora + timedelta(minutes=minutos or RESERVA_MINUTOS)
+
+    with transaction.atomic():
+        verificar_disponibilidad(carrito, excluir_token=token)
+        # Limpieza oportunista: con los productos bloqueados nadie más toca sus reservas
+        ReservaStock.objects.filter(producto_id__in=list(carrito), expira_en__lte=ahora).delete()
+        ReservaStock.objects.filter(token=token).delete()
+        ReservaStock.objects.bulk_create([
+            ReservaStock(token=token, producto=producto, cantidad=cantidad, expira_en=expira_en)
+            for producto, cantidad in carrito.values()
+        ])
+    return token
+
+
+def liberar_reserva(token):
+    """Libera una reserva antes de que caduque (p. ej. si el cajero cancela la venta)."""
+    return ReservaStock.objects.filter(token=token).delete()[0]
+
+
+def limpiar_reservas_vencidas():
+    """Borra las reservas caducadas. Ya no cuentan para el stock; esto solo mantiene la tabla pequeña."""
+    return ReservaStock.objects.filter(expira_en__lte=timezone.now()).delete()[0]
+
+
+# ============ COBRO ============
+def procesar_venta(lineas, cliente=None, vendedor=None, reserva=None):
+    """
+    Registra una venta completa dentro de una transacción.
+
+    `lineas` es un iterable de pares (producto, cantidad). El precio unitario es el
+    `precio_venta` de la fila bloqueada al cobrar, no el del producto recibido. Si se indica `reserva`, ese apartado no cuenta
+    como stock ocupado y se consume al registrar la venta.
+    Devuelve la Venta creada con su total.
+    Lanza VentaError (o StockInsuficiente) y no deja nada escrito si el carrito
+    no es válido.
+    """
+    carrito = agrupar_lineas(lineas)
+    validar_carrito(carrito)
+
+    with transaction.atomic(), totales_diferidos():
+        verificar_disponibilidad(carrito, excluir_token=reserva)
+        descontar_stock(carrito)
+
+        # Precios ya tomados de las filas bloqueadas
+        detalles = []
+        total = Decimal('0.00')
+        for producto, cantidad in carrito.values():
+            subtotal = producto.precio_venta * cantidad
+            total += subtotal
+            detalles.append(DetalleVenta(
+                producto=producto,
+                cantidad=cantidad,
+                precio_unitario=producto.precio_venta,
+                subtotal=subtotal,  # bulk_create no ejecuta DetalleVenta.save()
+            ))
+
+        # En modo diferido Venta.save() no recalcula: el total calculado en memoria se inserta tal cual
+        venta = Venta(cliente=cliente, vendido_por=vendedor, total=total)
+        venta.save()
+
+        for detalle in detalles:
+            detalle.venta = venta
+        DetalleVenta.objects.bulk_create(detalles)
+        registrar_movimientos(movimientos_de_venta(venta, carrito))
+        acumular_venta(venta, detalles)
+
+        if reserva:
+            liberar_reserva(reserva)
+
+    return venta
+
+
+# ============ COBRO IDEMPOTENTE ============
+def venta_de_clave(clave, usuario):
+    """Venta ya registrada con esta clave de idempotencia (vigente), o None."""
+    registro = ClaveIdempotencia.objects.filter(
+        usuario=usuario, clave=clave, expira_en__gt=timezone.now(), venta__isnull=False
+    ).select_related('venta').first()
+    return registro.venta if registro else None
+
+
+def procesar_venta_idempotente(clave, lineas, cliente=None, vendedor=None, reserva=None):
+    """
+    Como procesar_venta, pero protegido por una clave de idempotencia del vendedor.
+    Devuelve (venta, repetida): si la clave ya registró una venta, se devuelve esa venta
+    sin volver a cobrar ni descontar stock.
+
+    La fila de la clave se inserta antes de cobrar y en la misma transacción: un reintento
+    que llega mientras el primer cobro sigue en curso espera en el índice único y, cuando
+    el primero confirma, recibe IntegrityError y devuelve la venta ya registrada. Si el
+    cobro falla, la clave se revierte con él y el reintento se procesa normalmente.
+    """
+    anterior = venta_de_clave(clave, vendedor)
+    if anterior is not None:
+        return anterior, True
+
+    ahora = timezone.now()
+    with transaction.atomic():
+        # Una clave caducada puede reutilizarse
+        ClaveIdempotencia.objects.filter(usuario=vendedor, clave=clave, expira_en__lte=ahora).delete()
+        try:
+            # Solo el choque en el índice único de la clave indica un reintento; cualquier otro
+            # IntegrityError del cobro se propaga tal cual
+            with transaction.atomic():
+                registro = ClaveIdempotencia.objects.create(
+                    usuario=vendedor, clave=clave, expira_en=ahora + timedelta(hours=IDEMPOTENCIA_HORAS)
+                )
+        except IntegrityError:
+            registro = None
+        if registro is not None:
+            venta = procesar_venta(lineas, cliente=cliente, vendedor=vendedor, reserva=reserva)
+            registro.venta = venta
+            registro.save(update_fields=['venta'])
+
+    if registro is None:
+        anterior = venta_de_clave(clave, vendedor)
+        if anterior is None:
+            raise VentaError('Ya hay un cobro en curso con la misma clave; intenta de nuevo en unos segundos.')
+        return anterior, True
+    return venta, False
+
+
+def limpiar_claves_vencidas():
+    """Borra las claves de idempotencia caducadas."""
+    return ClaveIdempotencia.objects.filter(expira_en__lte=timezone.now()).delete()[0]
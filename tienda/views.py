@@ -1,4 +1,14 @@
+import csv
+import json
+import logging
+import uuid
+from itertools import chain
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_POST
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
 from django.urls import reverse_lazy
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
@@ -13,6 +23,14 @@ from django.utils import timezone
 from django.db.models import Sum, Count
 from django.forms import inlineformset_factory
 from .models import Venta, DetalleVenta
+from .ventas import procesar_venta, procesar_venta_idempotente, venta_de_clave, VentaError
+from .lotes import leer_tickets, registrar_lote, resumen_lote
+from .reportes import detalles_del_periodo, detalles_para_reporte, pagina_de_detalles, resumen_ventas
+from .reportes import COLUMNAS_EXPORTACION, iterar_exportacion
+from .contadores import contadores_dashboard
+from .middleware import ROL_CLIENTE, resolver_rol
+from .busqueda import LIMITE_BUSQUEDA, buscar_clientes, buscar_productos
+from .sincronizacion import TAMANO_PAGINA_SYNC, CursorInvalido, CursorVencido, cambios_desde
 from .forms import DetalleVentaForm
 from .forms import VentaForm
 from django import forms
@@ -21,6 +39,7 @@ from django import forms
 from .models import Producto, Categoria, Proveedor, Cliente, PerfilUsuario, Venta, DetalleVenta 
 from .forms import (
     ProductoForm, 
+    ProductoFiltroForm,
     CategoriaForm, 
     ProveedorForm, 
     ClienteForm,
@@ -31,6 +50,8 @@ from django.db.models import Sum, Count
 from django.utils import timezone 
 from datetime import timedelta, datetime, time # <<< IMPORTACIONES AÑADIDAS
 
+logger = logging.getLogger(__name__)
+
 DetalleVentaFormSet = inlineformset_factory(
     Venta,
     DetalleVenta,
@@ -57,22 +78,22 @@ def rol_requerido(*roles_permitidos):
             if request.user.is_superuser:
                 return view_func(request, *args, **kwargs)
 
-            # Intentar obtener PerfilUsuario (empleado)
-            try:
-                perfil = request.user.perfil
-                if perfil.rol in roles_permitidos:
-                    return view_func(request, *args, **kwargs)
-                else:
-                    messages.error(request, f'Acceso denegado. Requiere rol: {", ".join(roles_permitidos)}')
-                    return redirect('dashboard')
+            # Rol resuelto por RolMiddleware (o aquí mismo si el middleware no está activo)
+            rol = request.rol if hasattr(request, 'rol') else resolver_rol(request.user)
 
-            # Si NO tiene PerfilUsuario → puede ser un CLIENTE
-            except PerfilUsuario.DoesNotExist:
-                if hasattr(request.user, 'cliente') and 'cliente' in roles_permitidos:
+            # Empleado (PerfilUsuario)
+            if rol in dict(PerfilUsuario.ROLES):
+                if rol in roles_permitidos:
                     return view_func(request, *args, **kwargs)
-                messages.error(request, 'No tienes permisos para acceder.')
+                messages.error(request, f'Acceso denegado. Requiere rol: {", ".join(roles_permitidos)}')
                 return redirect('dashboard')
 
+            # Si NO tiene PerfilUsuario → puede ser un CLIENTE
+            if rol == ROL_CLIENTE and 'cliente' in roles_permitidos:
+                return view_func(request, *args, **kwargs)
+            messages.error(request, 'No tienes permisos para acceder.')
+            return redirect('dashboard')
+
         return _wrapped_view
     return decorator
 
@@ -101,46 +122,150 @@ class CustomLogoutView(LogoutView):
 def dashboard(request):
     """Vista principal que muestra el dashboard con estadísticas y cálculo de ventas."""
     
-    # Cálculos base
-    total_productos = Producto.objects.count()
-    total_categorias = Categoria.objects.count()
-    total_proveedores = Proveedor.objects.count()
-    total_clientes = Cliente.objects.count()
+    # Cálculos base (desde caché; se invalidan con las señales de los modelos)
+    context = dict(contadores_dashboard())
     
-    # LÓGICA DE CÁLCULO DE VENTAS DE HOY USANDO RANGO
-    now = timezone.localtime(timezone.now())
-    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_of_day = start_of_day + timedelta(days=1)
-    
-    ventas_hoy_query = Venta.objects.filter(
-        fecha_venta__gte=start_of_day,
-        fecha_venta__lt=end_of_day
-    ).aggregate(
-        total_hoy=Sum('total')
-    )['total_hoy']
-    
-    total_ventas_hoy = ventas_hoy_query or 0.00
-    
-    productos_recientes = Producto.objects.order_by('-id')[:5]
-    
-    context = {
-        'total_productos': total_productos,
-        'total_categorias': total_categorias,
-        'total_proveedores': total_proveedores,
-        'total_clientes': total_clientes,
-        'productos_recientes': productos_recientes,
-        'total_ventas_hoy': total_ventas_hoy, 
-    }
+    # VENTAS DE HOY: se leen del acumulado diario (VentaDiaria), no de la tabla de ventas
+    context['total_ventas_hoy'] = resumen_ventas(timezone.localdate())['total']
     
     return render(request, 'tienda/dashboard.html', context)
 
 
 # ============ VISTAS CRUD PARA PRODUCTOS ============
+# Productos por página en la lista y umbral de "stock bajo"
+PRODUCTOS_POR_PAGINA = 25
+STOCK_BAJO = getattr(settings, 'TIENDA_STOCK_BAJO', 5)
+
+ORDEN_PRODUCTOS = {
+    'nombre': ('nombre', 'id'),
+    '-nombre': ('-nombre', '-id'),
+    'precio': ('precio_venta', 'id'),
+    '-precio': ('-precio_venta', '-id'),
+    'stock': ('stock', 'id'),
+    '-stock': ('-stock', '-id'),
+    'recientes': ('-id',),
+}
+
+
 @login_required
 def producto_lista(request):
-    """Vista que lista todos los productos"""
+    """Vista que lista los productos paginados, con filtros por categoría, estado, stock bajo y precio."""
+    filtros = ProductoFiltroForm(request.GET or None)
     productos = Producto.objects.all()
-    return render(request, 'tienda/producto_lista.html', {'productos': productos})
+    orden = 'nombre'
+
+    if filtros.is_valid():
+        datos = filtros.cleaned_data
+        if datos['categoria']:
+            productos = productos.filter(categoria=datos['categoria'])
+        if datos['estado'] == 'activos':
+            productos = productos.filter(activo=True)
+        elif datos['estado'] == 'inactivos':
+            productos = productos.filter(activo=False)
+        if datos['stock_bajo']:
+            productos = productos.filter(stock__lte=STOCK_BAJO)
+        if datos['precio_min'] is not None:
+            productos = productos.filter(precio_venta__gte=datos['precio_min'])
+        if datos['precio_max'] is not None:
+            productos = productos.filter(precio_venta__lte=datos['precio_max'])
+        orden = datos['orden'] or orden
+
+    # La página trae solo las columnas que se muestran, con la categoría en el mismo JOIN;
+    # el COUNT del Paginator ignora select_related y cuenta solo sobre la tabla de productos
+    productos = productos.select_related('categoria').only(
+        'id', 'nombre', 'descripcion', 'precio_venta', 'stock', 'activo', 'categoria__nombre'
+    ).order_by(*ORDEN_PRODUCTOS[orden])
+    pagina = Paginator(productos, PRODUCTOS_POR_PAGINA).get_page(request.GET.get('page'))
+
+    # Parámetros de filtro para conservarlos en los enlaces de paginación
+    parametros = request.GET.copy()
+    parametros.pop('page', None)
+
+    contexto = {
+        'productos': pagina,
+        'pagina': pagina,
+        'filtros': filtros,
+        'parametros': parametros.urlencode(),
+        'stock_bajo': STOCK_BAJO,
+    }
+    return render(request, 'tienda/producto_lista.html', contexto)
+
+
+@login_required
+def producto_buscar(request):
+    """Endpoint JSON de búsqueda de productos por texto (índice de texto completo, con ranking)."""
+    texto = request.GET.get('q', '').strip()
+    try:
+        limite = min(int(request.GET.get('limite', 20)), LIMITE_BUSQUEDA)
+    except ValueError:
+        limite = 20
+
+    productos = Producto.objects.select_related('categoria').only(
+        'id', 'nombre', 'precio_venta', 'stock', 'activo', 'categoria__nombre'
+    )
+    resultados = [
+        {
+            'id': producto.id,
+            'nombre': producto.nombre,
+            'precio': producto.precio_venta,
+            'stock': producto.stock,
+            'activo': producto.activo,
+            'categoria': producto.categoria.nombre,
+        }
+        for producto in buscar_productos(texto, limite=max(limite, 1), productos=productos)
+    ]
+    return JsonResponse({'q': texto, 'resultados': resultados})
+
+
+@login_required
+@rol_requerido('vendedor', 'gerente', 'administrador')
+def producto_autocompletar(request):
+    """
+    Endpoint JSON para el selector de productos de la venta: solo productos activos con stock.
+    Primero busca por prefijo del nombre (usa el índice de nombre) y, si faltan resultados,
+    completa con la búsqueda de texto completo.
+    """
+    texto = request.GET.get('q', '').strip()
+    limite = 15
+    vendibles = Producto.objects.filter(activo=True, stock__gt=0).only('id', 'nombre', 'precio_venta', 'stock')
+
+    productos = []
+    if texto:
+        productos = list(vendibles.filter(nombre__istartswith=texto).order_by('nombre', 'id')[:limite])
+        if len(productos) < limite:
+            vistos = {producto.pk for producto in productos}
+            productos += [
+                producto for producto in buscar_productos(texto, limite=limite, productos=vendibles)
+                if producto.pk not in vistos
+            ][:limite - len(productos)]
+
+    resultados = [
+        {
+            'id': p.id, 'nombre': p.nombre, 'precio': p.precio_venta, 'stock': p.stock,
+            'detalle': f'${p.precio_venta} · stock {p.stock}',
+        }
+        for p in productos
+    ]
+    return JsonResponse({'q': texto, 'resultados': resultados})
+
+
+@login_required
+@rol_requerido('vendedor', 'gerente', 'administrador')
+def sincronizar_catalogo(request):
+    """
+    Cambios del catálogo para las terminales desde `?cursor=` (sin cursor: catálogo completo).
+    Responde 410 si el cursor es más viejo que la retención de bajas y hay que empezar de cero.
+    """
+    try:
+        limite = min(max(int(request.GET.get('limite', TAMANO_PAGINA_SYNC)), 1), TAMANO_PAGINA_SYNC)
+    except ValueError:
+        limite = TAMANO_PAGINA_SYNC
+    try:
+        return JsonResponse(cambios_desde(request.GET.get('cursor'), limite=limite))
+    except CursorInvalido as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except CursorVencido as e:
+        return JsonResponse({'error': str(e), 'reiniciar': True}, status=410)
 
 
 @login_required
@@ -300,6 +425,27 @@ def proveedor_eliminar(request, pk):
 
 
 # ============ VISTAS CRUD PARA CLIENTES ============
+@login_required
+@rol_requerido('vendedor', 'gerente', 'administrador')
+def cliente_buscar(request):
+    """
+    Endpoint JSON para elegir al cliente en el cobro: búsqueda aproximada por nombre,
+    apellido, email o teléfono (tolera acentos, mayúsculas y errores de tecleo).
+    """
+    texto = request.GET.get('q', '').strip()
+    resultados = [
+        {
+            'id': cliente.id,
+            'nombre': str(cliente),
+            'email': cliente.email,
+            'telefono': cliente.telefono,
+            'detalle': f'{cliente.email} · {cliente.telefono}',
+        }
+        for cliente in buscar_clientes(texto)
+    ]
+    return JsonResponse({'q': texto, 'resultados': resultados})
+
+
 @login_required
 @rol_requerido('gerente', 'administrador','vendedor')
 def cliente_lista(request):
@@ -360,7 +506,7 @@ try:
 except ImportError:
     VentaForm = None
     DetalleVentaFormSet = None
-    print("ADVERTENCIA: No se pudieron importar VentaForm o DetalleVentaFormSet. 'registrar_venta' fallará.")
+    logger.error("No se pudieron importar VentaForm o DetalleVentaFormSet. 'registrar_venta' fallará.")
 
 
 @login_required
@@ -370,42 +516,32 @@ def registrar_venta(request):
         form = VentaForm(request.POST)
         formset = DetalleVentaFormSet(request.POST)
 
+        # Un reintento (timeout de la terminal, doble clic) con la misma clave devuelve la venta original
+        clave = clave_idempotencia(request)
+        if clave:
+            anterior = venta_de_clave(clave, request.user)
+            if anterior is not None:
+                return _venta_registrada(request, anterior, repetida=True)
+
         if form.is_valid() and formset.is_valid():
             try:
-                with transaction.atomic():
-                    venta = form.save(commit=False)
-                    venta.empleado = request.user
-
-                    # Calcular total de la venta y asignar precio_unitario
-                    total_calculado = 0
-                    detalles = formset.save(commit=False)
-                    for detalle in detalles:
-                        detalle.venta = venta
-                        detalle.precio_unitario = detalle.producto.precio_venta  # <--- asignación automática
-                        subtotal = detalle.precio_unitario * detalle.cantidad
-                        total_calculado += subtotal
-                    venta.total = total_calculado
-                    venta.save()
-
-                    # Guardar detalles y actualizar stock
-                    for detalle in detalles:
-                        detalle.save()
-                        producto = detalle.producto
-                        if producto.stock >= detalle.cantidad:
-                            producto.stock -= detalle.cantidad
-                            producto.save()
-                        else:
-                            raise Exception(f'Stock insuficiente para {producto.nombre}')
-
-                messages.success(request, f"Venta #{venta.pk} registrada con éxito.")
-                return redirect('dashboard')
+                # Solo las líneas capturadas y no marcadas para eliminar
+                lineas = [(detalle.producto, detalle.cantidad) for detalle in formset.save(commit=False)]
+                cliente = form.cleaned_data.get('cliente')
+                if clave:
+                    venta, repetida = procesar_venta_idempotente(clave, lineas, cliente=cliente, vendedor=request.user)
+                else:
+                    venta, repetida = procesar_venta(lineas, cliente=cliente, vendedor=request.user), False
+                return _venta_registrada(request, venta, repetida)
 
-            except Exception as e:
+            except VentaError as e:
                 messages.error(request, f"Error al registrar la venta: {e}")
         else:
-            # Esto mostrará errores en consola y mensaje al usuario
-            print("Errores de VentaForm:", form.errors)
-            print("Errores de DetalleVentaFormSet:", formset.errors)
+            logger.warning(
+                'Venta rechazada por el formulario: %s',
+                json.dumps({'venta': form.errors.get_json_data(), 'detalles': [f.errors.get_json_data() for f in formset]
+                            + [formset.non_form_errors().get_json_data()]}),
+            )
             messages.warning(request, "Revisa los errores del formulario o de los detalles.")
     else:
         form = VentaForm()
@@ -415,55 +551,129 @@ def registrar_venta(request):
         'titulo': 'Registrar Nueva Venta',
         'form': form,
         'detalle_formset': formset,
+        # Si el formulario se vuelve a mostrar por un error se conserva la clave: ese intento no cobró nada
+        'clave_idempotencia': clave_idempotencia(request) or uuid.uuid4().hex,
     }
     return render(request, 'tienda/registrar_venta.html', contexto)
 
 
+def clave_idempotencia(request):
+    """Clave de idempotencia del cobro: cabecera Idempotency-Key o campo oculto del formulario."""
+    clave = request.headers.get('Idempotency-Key') or request.POST.get('clave_idempotencia') or ''
+    return clave.strip()[:64]
 
 
+def _venta_registrada(request, venta, repetida=False):
+    """Redirige tras un cobro; marca Idempotent-Replayed si la venta ya existía."""
+    messages.success(request, f"Venta #{venta.pk} registrada con éxito.")
+    respuesta = redirect('dashboard')
+    if repetida:
+        # Permite a la terminal distinguir un reintento de un cobro nuevo
+        respuesta['Idempotent-Replayed'] = 'true'
+    return respuesta
+
 
 @login_required
-@rol_requerido('gerente', 'administrador','vendedor') 
-def reporte_ventas(request):
+@rol_requerido('vendedor', 'gerente', 'administrador')
+@require_POST
+def registrar_ventas_lote(request):
     """
-    Muestra el reporte de ventas y permite filtrar por una fecha específica.
-    Si no hay ventas, muestra la tabla vacía y totales en 0.
+    Recibe los tickets que una sucursal acumuló sin conexión (JSON o JSONL; ver tienda.lotes)
+    y responde con el resultado de cada uno. Reenviar el mismo lote es seguro: los tickets
+    ya registrados vuelven como duplicados.
     """
+    jsonl = request.content_type in ('application/x-ndjson', 'application/jsonl') or request.GET.get('formato') == 'jsonl'
+    try:
+        resultados = registrar_lote(leer_tickets(request.body, jsonl=jsonl), vendedor=request.user)
+    except VentaError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({**resumen_lote(resultados), 'resultados': resultados})
+
+
+class _Eco:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla."""
+    def write(self, valor):
+        return valor
 
-    now = timezone.localtime(timezone.now())
 
-    # Obtener la fecha seleccionada por GET, si no hay usar HOY
-    fecha_str = request.GET.get('fecha_inicio')
-    if fecha_str:
-        try:
-            filtro_fecha = datetime.strptime(fecha_str, '%Y-%m-%d').date()
-        except ValueError:
-            filtro_fecha = now.date()
+FORMATOS_EXPORTACION = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+
+
+def exportar_detalles(detalles, formato, fecha_inicio, fecha_fin):
+    """Responde con el detalle de ventas del periodo como CSV o JSONL sin armarlo en memoria."""
+    filas = iterar_exportacion(detalles)
+    if formato == 'csv':
+        escritor = csv.writer(_Eco())
+        contenido = (escritor.writerow(fila) for fila in chain([COLUMNAS_EXPORTACION], filas))
     else:
-        filtro_fecha = now.date()
+        contenido = (
+            json.dumps(dict(zip(COLUMNAS_EXPORTACION, fila)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+            for fila in filas
+        )
+
+    respuesta = StreamingHttpResponse(contenido, content_type=FORMATOS_EXPORTACION[formato])
+    respuesta['Content-Disposition'] = (
+        f'attachment; filename="ventas_{fecha_inicio:%Y%m%d}_{fecha_fin:%Y%m%d}.{formato}"'
+    )
+    return respuesta
+
 
-    # Definir inicio y fin del día
-    inicio_dia = timezone.make_aware(datetime.combine(filtro_fecha, time.min))
-    fin_dia = timezone.make_aware(datetime.combine(filtro_fecha, time.max))
+@login_required
+@rol_requerido('gerente', 'administrador','vendedor') 
+def reporte_ventas(request):
+    """
+    Muestra el reporte de ventas entre dos fechas (fecha_inicio y fecha_fin, por defecto HOY).
+    El detalle se pagina por cursor y los totales salen del acumulado diario.
+    Si no hay ventas, muestra la tabla vacía y totales en 0.
+    """
 
-    # Filtrar ventas y detalles
-    ventas_filtradas = Venta.objects.filter(fecha_venta__range=(inicio_dia, fin_dia))
-    detalles_ventas_filtrados = DetalleVenta.objects.filter(
-        venta__in=ventas_filtradas
-    ).select_related('venta', 'producto', 'venta__vendido_por').order_by('-venta__fecha_venta')
+    now = timezone.localtime(timezone.now())
 
-    # Totales
-    total_vendido = ventas_filtradas.aggregate(total=Sum('total'))['total'] or 0.00
-    numero_ventas = ventas_filtradas.count()
+    # Obtener el rango seleccionado por GET; si falta o es inválido se usa HOY
+    def leer_fecha(nombre, por_defecto):
+        fecha_str = request.GET.get(nombre)
+        if fecha_str:
+            try:
+                return datetime.strptime(fecha_str, '%Y-%m-%d').date()
+            except ValueError:
+                pass
+        return por_defecto
+
+    fecha_inicio = leer_fecha('fecha_inicio', now.date())
+    fecha_fin = leer_fecha('fecha_fin', fecha_inicio)
+    if fecha_fin < fecha_inicio:
+        fecha_inicio, fecha_fin = fecha_fin, fecha_inicio
+
+    # Exportación completa del periodo (CSV o JSONL), enviada por partes
+    formato = request.GET.get('formato')
+    if formato in FORMATOS_EXPORTACION:
+        return exportar_detalles(detalles_del_periodo(fecha_inicio, fecha_fin), formato, fecha_inicio, fecha_fin)
+
+    # Página de detalles (paginación por cursor sobre fecha de venta e id)
+    detalles_ventas, cursor_siguiente = pagina_de_detalles(
+        detalles_para_reporte(fecha_inicio, fecha_fin),
+        cursor=request.GET.get('despues'),
+    )
+
+    # Totales (una sola consulta al acumulado diario)
+    resumen = resumen_ventas(fecha_inicio, fecha_fin)
+    total_vendido = resumen['total']
+    numero_ventas = resumen['num_ventas']
     promedio_venta = total_vendido / numero_ventas if numero_ventas > 0 else 0.00
 
     contexto = {
         'titulo': 'Reporte de Ventas',
-        'detalles_ventas': detalles_ventas_filtrados,
+        'detalles_ventas': detalles_ventas,
+        'cursor_siguiente': cursor_siguiente,
+        'es_primera_pagina': not request.GET.get('despues'),
         'total_vendido': total_vendido,
         'numero_ventas': numero_ventas,
         'promedio_venta': promedio_venta,
-        'fecha_inicio': filtro_fecha.strftime('%Y-%m-%d'),  # Para mostrar en el input
+        'fecha_inicio': fecha_inicio.strftime('%Y-%m-%d'),  # Para mostrar en el input
+        'fecha_fin': fecha_fin.strftime('%Y-%m-%d'),
         'today_date': now.strftime('%Y-%m-%d'),            # Fecha por defecto
     }
 
@@ -498,7 +708,7 @@ def cliente_detalle_venta(request, pk):
     """Permite al cliente ver el detalle de una venta suya."""
     cliente = getattr(request.user, 'cliente', None)
     venta = get_object_or_404(Venta, pk=pk, cliente=cliente)
-    detalles = venta.detalles.all()
+    detalles = venta.detalles.select_related('producto')
     
     context = {
         'titulo': f'Detalle de Venta #{venta.pk}',